@@ -1,30 +1,32 @@
 import pandas as pd
-import numpy as np
 
-# ========= 1. 读取 CSV =========
+from pntvl_data import load_merged
+from pntvl_profile import checkpoint
+
+# ========= 1. 读取 CSV（统一日期 + 合并，带缓存） =========
+checkpoint('load')
 tvl_path = "ethereum_tvl_2023-01-01_2026-01-01.csv"
 price_path = "kline_ETHUSDT_D_20230101_20260101_spot.csv"
+# 日期区间 [start, end)，含文件名中的结束日
+start, end = "2023-01-01", "2026-01-02"
+# 日内 K 线（1h / 5m）用 join = "asof" 按时间前向填充 TVL；tvl_lag 为 TVL 的发布延迟（如 "1D"），None 表示不延迟
+join, tvl_lag = "date", None
+# source = "auto"：本地行情库（pntvl_market.py ingest）覆盖 [start, end) 时只读这一段，否则读 CSV
+source = "auto"
 
-tvl_df = pd.read_csv(tvl_path)
-price_df = pd.read_csv(price_path)
-
-# ========= 2. 统一日期 =========
-tvl_df['date'] = pd.to_datetime(tvl_df['date']).dt.date
-price_df['date'] = pd.to_datetime(price_df['datetime']).dt.date
-
-# ========= 3. 精简价格列 =========
-price_df = price_df[['date', 'close']].rename(columns={'close': 'eth_price'})
+df = load_merged(tvl_path, price_path, start=start, end=end,
+                 join=join, tvl_lag=tvl_lag, source=source)
 
-# ========= 4. 合并 TVL 与价格 =========
-df = pd.merge(tvl_df, price_df, on='date', how='inner')
 
-# ========= 5. 计算价格中性 TVL =========
+# ========= 2. 计算价格中性 TVL =========
+checkpoint('features')
 df['price_neutral_tvl'] = df['tvl_usd'] / df['eth_price']
 
-# ========= 6. 保留小数点后 2 位 =========
+# ========= 3. 保留小数点后 2 位 =========
 df['price_neutral_tvl_2dec'] = df['price_neutral_tvl'].round(2)
 
 # ========= 打印（前后截断显示） =========
+checkpoint('report')
 pd.set_option('display.max_rows', 20)
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1000)
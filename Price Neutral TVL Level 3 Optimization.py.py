@@ -1,29 +1,35 @@
-import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-import plotly.io as pio
 
-pio.renderers.default = "browser"
+from pntvl_data import bar_periods_per_year, load_merged
+from pntvl_plot import plots_enabled, render
+from pntvl_profile import checkpoint
+from pntvl_store import RESULT_DIR, ResultStore, cached_sweep
 
 # =========================================================
 # 1. 读取数据
 # =========================================================
+checkpoint('load')
 tvl_path = "ethereum_tvl_2023-01-01_2025-01-01.csv"
 price_path = "kline_ETHUSDT_D_20230101_20250101.csv"
+# 日期区间 [start, end)，含文件名中的结束日
+start, end = "2023-01-01", "2025-01-02"
+# 日内 K 线（1h / 5m）用 join = "asof" 按时间前向填充 TVL；tvl_lag 为 TVL 的发布延迟（如 "1D"），None 表示不延迟
+join, tvl_lag = "date", None
+# source = "auto"：本地行情库（pntvl_market.py ingest）覆盖 [start, end) 时只读这一段，否则读 CSV
+source = "auto"
 
-tvl_df = pd.read_csv(tvl_path)
-price_df = pd.read_csv(price_path)
+df_base = load_merged(tvl_path, price_path, start=start, end=end,
+                      join=join, tvl_lag=tvl_lag, source=source)
 
-tvl_df['date'] = pd.to_datetime(tvl_df['date']).dt.date
-price_df['date'] = pd.to_datetime(price_df['datetime']).dt.date
-
-price_df = price_df[['date', 'close']].rename(columns={'close': 'eth_price'})
-
-df_base = pd.merge(tvl_df, price_df, on='date', how='inner')
+periods_per_year = bar_periods_per_year(df_base['date'])   # 日线 365，日内按 K 线频率年化
+# 结果缓存：已算过的 (window, z) 单元从 RESULT_DIR 读取，扩大网格时只补算新增部分；False 为每次全量重算
+use_result_store = True
 
 # =========================================================
 # 2. 构造指标
 # =========================================================
+checkpoint('features')
 df_base['price_neutral_tvl'] = df_base['tvl_usd'] / df_base['eth_price']
 df_base['price_neutral_tvl_2dec'] = df_base['price_neutral_tvl'].round(2)
 
@@ -37,81 +43,39 @@ df_base['divergence_strength'] = (
 # =========================================================
 # 3. 参数范围
 # =========================================================
+checkpoint('sweep')
 z_values = np.arange(0.6, 3.0, 0.1)     # Z-score 阈值
 window_values = [30, 45, 60, 75, 90,120]    # 滑动窗口
 
-heatmap = pd.DataFrame(
-    index=window_values,
-    columns=z_values
-)
-
 # =========================================================
-# 4. 双参数扫描
+# 4. 双参数扫描（向量化：windows × z × days 一次算完）
 # =========================================================
-for window in window_values:
-
-    df_base['div_mean'] = df_base['divergence_strength'].rolling(window).mean()
-    df_base['div_std'] = df_base['divergence_strength'].rolling(window).std()
-    df_base['divergence_z'] = (
-        df_base['divergence_strength'] - df_base['div_mean']
-    ) / df_base['div_std']
-
-    for z in z_values:
-
-        df = df_base.copy()
-        df['signal'] = 0
-
-        df.loc[
-            (df['eth_return'] < 0) &
-            (df['pntvl_change'] > 0) &
-            (df['divergence_z'] < -z),
-            'signal'
-        ] = 1
-
-        df.loc[
-            (df['eth_return'] > 0) &
-            (df['pntvl_change'] < 0) &
-            (df['divergence_z'] > z),
-            'signal'
-        ] = -1
-
-        # T+1 执行
-        df['position'] = df['signal'].shift(1).fillna(0)
-
-        # 策略收益
-        df['strategy_return'] = df['position'] * df['eth_return']
-        df['strategy_return'] = df['strategy_return'].fillna(0)
-
-        # Sharpe
-        if df['strategy_return'].std() == 0:
-            sharpe = np.nan
-        else:
-            sharpe = (
-                df['strategy_return'].mean() /
-                df['strategy_return'].std()
-            ) * np.sqrt(365)
-
-        heatmap.loc[window, z] = sharpe
+store = ResultStore(RESULT_DIR) if use_result_store else None
+heatmap = cached_sweep(df_base, window_values, z_values, periods_per_year, store=store)
+if store is not None:
+    store.close()
 
 # =========================================================
 # 5. Plotly 热力图
 # =========================================================
-fig = go.Figure(
-    data=go.Heatmap(
-        z=heatmap.values.astype(float),
-        x=heatmap.columns.astype(str),
-        y=heatmap.index.astype(str),
-        colorscale='RdYlGn',
-        colorbar=dict(title='Sharpe Ratio')
+checkpoint('plot')
+if plots_enabled():
+    fig = go.Figure(
+        data=go.Heatmap(
+            z=heatmap.values.astype(float),
+            x=heatmap.columns.astype(str),
+            y=heatmap.index.astype(str),
+            colorscale='RdYlGn',
+            colorbar=dict(title='Sharpe Ratio')
+        )
     )
-)
 
-fig.update_layout(
-    title='Parameter Plateau Heatmap (Sharpe Ratio)',
-    xaxis_title='Z-Score Threshold',
-    yaxis_title='Rolling Window',
-    width=1000,
-    height=600
-)
+    fig.update_layout(
+        title='Parameter Plateau Heatmap (Sharpe Ratio)',
+        xaxis_title='Z-Score Threshold',
+        yaxis_title='Rolling Window',
+        width=1000,
+        height=600
+    )
 
-fig.show()
+    render(fig, 'level3_sweep_heatmap')
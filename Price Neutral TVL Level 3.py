@@ -1,120 +1,58 @@
 import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
-import plotly.io as pio
 
-pio.renderers.default = "browser"
+from pntvl_data import bar_periods_per_year, load_merged
+from pntvl_plot import line_trace, plots_enabled, render
+from pntvl_profile import checkpoint
+from pntvl_strategy import StrategyPipeline
 
 # =========================================================
 # 1. 读取数据
 # =========================================================
+checkpoint('load')
 tvl_path = "ethereum_tvl_2022-01-01_2025-01-01.csv"
 price_path = "kline_ETHUSDT_D_20220101_20250101.csv"
+# 日期区间 [start, end)，含文件名中的结束日
+start, end = "2022-01-01", "2025-01-02"
+# 日内 K 线（1h / 5m）用 join = "asof" 按时间前向填充 TVL；tvl_lag 为 TVL 的发布延迟（如 "1D"），None 表示不延迟
+join, tvl_lag = "date", None
+# source = "auto"：本地行情库（pntvl_market.py ingest）覆盖 [start, end) 时只读这一段，否则读 CSV
+source = "auto"
 
-tvl_df = pd.read_csv(tvl_path)
-price_df = pd.read_csv(price_path)
+df = load_merged(tvl_path, price_path, start=start, end=end,
+                 join=join, tvl_lag=tvl_lag, source=source)
 
-tvl_df['date'] = pd.to_datetime(tvl_df['date']).dt.date
-price_df['date'] = pd.to_datetime(price_df['datetime']).dt.date
-
-price_df = price_df[['date', 'close']].rename(columns={'close': 'eth_price'})
-
-df = pd.merge(tvl_df, price_df, on='date', how='inner')
-
-# =========================================================
-# 2. 构造指标
-# =========================================================
-df['price_neutral_tvl'] = df['tvl_usd'] / df['eth_price']
-df['price_neutral_tvl_2dec'] = df['price_neutral_tvl'].round(2)
-
-df['eth_return'] = df['eth_price'].pct_change()
-df['pntvl_change'] = df['price_neutral_tvl_2dec'].pct_change()
-
-# =========================================================
-# 3. 背离强度（原始）
-# =========================================================
-df['divergence_strength'] = df['eth_return'] - df['pntvl_change']
+periods_per_year = bar_periods_per_year(df['date'])   # 日线 365，日内按 K 线频率年化
+low_memory = False   # 日内 / 大样本：中间量用完即弃，df 逐列以 float32 + int8 写入，指标不变
 
 # =========================================================
-# 4. ⭐ 滑动窗口 Z-score（核心升级）
+# 2. 策略参数
 # =========================================================
 window = 75  # 推荐 30 / 60 / 90 你可以回测比较
-
-df['div_mean'] = df['divergence_strength'].rolling(window).mean()
-df['div_std'] = df['divergence_strength'].rolling(window).std()
-
-df['divergence_z'] = (
-    df['divergence_strength'] - df['div_mean']
-) / df['div_std']
-
-# =========================================================
-# 5. ⭐ 信号生成（基于 Z-score）
-# =========================================================
 z_threshold = 1.1  # ⭐ 推荐从 1.2 开始
-
-df['signal'] = 0
-
-# 做多：ETH 跌 + PNTVL 涨 + 背离极端（负）
-df.loc[
-    (df['eth_return'] < 0) &
-    (df['pntvl_change'] > 0) &
-    (df['divergence_z'] < -z_threshold),
-    'signal'
-] = 1
-
-# 做空：ETH 涨 + PNTVL 跌 + 背离极端（正）
-df.loc[
-    (df['eth_return'] > 0) &
-    (df['pntvl_change'] < 0) &
-    (df['divergence_z'] > z_threshold),
-    'signal'
-] = -1
-
-# =========================================================
-# 6. ⭐ T+1 执行
-# =========================================================
-df['position'] = df['signal'].shift(1).fillna(0)
-
-# =========================================================
-# 7. 策略收益 & 资金曲线
-# =========================================================
-df['strategy_return'] = df['position'] * df['eth_return']
-df['strategy_return'] = df['strategy_return'].fillna(0)
-
-df['equity_curve'] = (1 + df['strategy_return']).cumprod()
+params = dict(window=window, z_threshold=z_threshold, mode='compound')
 
 # =========================================================
-# 8. 回撤 & 绩效指标
+# 3. 特征 → 滑动 Z-score → 信号 → T+1 执行 → 资金曲线 → 绩效
+#    （StrategyPipeline 各阶段；交易 = 前一日有仓位且仓位变化）
 # =========================================================
-df['equity_peak'] = df['equity_curve'].cummax()
-df['drawdown'] = df['equity_curve'] / df['equity_peak'] - 1
-max_drawdown = df['drawdown'].min()
-
-total_days = (df['date'].iloc[-1] - df['date'].iloc[0]).days
-annual_return = df['equity_curve'].iloc[-1] ** (365 / total_days) - 1
-
-sharpe_ratio = (
-    df['strategy_return'].mean() /
-    df['strategy_return'].std()
-) * np.sqrt(365)
-
-calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else np.nan
-
-# =========================================================
-# 9. 交易统计
-# =========================================================
-df['prev_position'] = df['position'].shift(1)
-df['trade'] = (df['prev_position'] != df['position']) & (df['prev_position'] != 0)
-
-trade_count = df['trade'].sum()
+checkpoint('pipeline')
+pipeline = StrategyPipeline(df, periods_per_year=periods_per_year, low_memory=low_memory)
+df = pipeline.frame(trade_rule='exit', **params)
 
-df['trade_id'] = df['trade'].cumsum()
-trade_returns = df[df['trade']].groupby('trade_id')['strategy_return'].sum()
-win_rate = (trade_returns > 0).mean()
+checkpoint('metrics')
+metrics = pipeline.metrics(trade_rule='exit', **params)
+annual_return = metrics['annual_return']
+sharpe_ratio = metrics['sharpe_ratio']
+calmar_ratio = metrics['calmar_ratio']
+max_drawdown = metrics['max_drawdown']
+win_rate = metrics['win_rate']
+trade_count = metrics['trade_count']
 
 # =========================================================
-# 10. 打印结果
+# 4. 打印结果
 # =========================================================
+checkpoint('report')
 pd.set_option('display.max_rows', 40)
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1200)
@@ -135,22 +73,23 @@ print(f"Trade Count      : {trade_count}")
 print("==========================================\n")
 
 # =========================================================
-# 11. 资金曲线可视化
+# 5. 资金曲线可视化
 # =========================================================
-fig = go.Figure()
-fig.add_trace(go.Scatter(
-    x=df['date'],
-    y=df['equity_curve'],
-    mode='lines',
-    name='Equity Curve'
-))
+checkpoint('plot')
+if plots_enabled():
+    fig = go.Figure()
+    fig.add_trace(line_trace(
+        df['date'],
+        df['equity_curve'],
+        name='Equity Curve'
+    ))
 
-fig.update_layout(
-    title='Equity Curve (Rolling Z-score Divergence Strategy)',
-    xaxis_title='Date',
-    yaxis_title='Net Value',
-    width=1200,
-    height=600
-)
+    fig.update_layout(
+        title='Equity Curve (Rolling Z-score Divergence Strategy)',
+        xaxis_title='Date',
+        yaxis_title='Net Value',
+        width=1200,
+        height=600
+    )
 
-fig.show()
+    render(fig, 'level3_equity_curve')
@@ -1,143 +1,62 @@
-import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
-import plotly.io as pio
 
-pio.renderers.default = "browser"
+from pntvl_data import bar_periods_per_year, load_merged
+from pntvl_plot import line_trace, plots_enabled, render
+from pntvl_profile import checkpoint
+from pntvl_strategy import StrategyPipeline
 
 # =========================================================
 # 1. 读取数据
 # =========================================================
+checkpoint('load')
 tvl_path = "ethereum_tvl_2022-01-01_2025-01-01.csv"
 price_path = "kline_ETHUSDT_D_20220101_20250101.csv"
+# 日期区间 [start, end)，含文件名中的结束日
+start, end = "2022-01-01", "2025-01-02"
+# 日内 K 线（1h / 5m）用 join = "asof" 按时间前向填充 TVL；tvl_lag 为 TVL 的发布延迟（如 "1D"），None 表示不延迟
+join, tvl_lag = "date", None
+# source = "auto"：本地行情库（pntvl_market.py ingest）覆盖 [start, end) 时只读这一段，否则读 CSV
+source = "auto"
 
-tvl_df = pd.read_csv(tvl_path)
-price_df = pd.read_csv(price_path)
+df = load_merged(tvl_path, price_path, start=start, end=end,
+                 join=join, tvl_lag=tvl_lag, source=source)
 
-tvl_df['date'] = pd.to_datetime(tvl_df['date']).dt.date
-price_df['date'] = pd.to_datetime(price_df['datetime']).dt.date
+periods_per_year = bar_periods_per_year(df['date'])   # 日线 365，日内按 K 线频率年化
+low_memory = False   # 日内 / 大样本：中间量用完即弃，df 逐列以 float32 + int8 写入，指标不变
 
-price_df = price_df[['date', 'close']].rename(columns={'close': 'eth_price'})
-df = pd.merge(tvl_df, price_df, on='date', how='inner')
-
-# =========================================================
-# 2. 构造指标
-# =========================================================
-df['price_neutral_tvl'] = df['tvl_usd'] / df['eth_price']
-df['price_neutral_tvl_2dec'] = df['price_neutral_tvl'].round(2)
-df['eth_return'] = df['eth_price'].pct_change()
-df['pntvl_change'] = df['price_neutral_tvl_2dec'].pct_change()
-
-# =========================================================
-# 3. 背离强度
 # =========================================================
-df['divergence_strength'] = df['eth_return'] - df['pntvl_change']
-
-# =========================================================
-# 4. Z-score
+# 2. 策略参数
 # =========================================================
 window = 75
-df['div_mean'] = df['divergence_strength'].rolling(window).mean()
-df['div_std'] = df['divergence_strength'].rolling(window).std()
-df['divergence_z'] = (df['divergence_strength'] - df['div_mean']) / df['div_std']
-
-# =========================================================
-# 5. 原始信号生成（不改）
-# =========================================================
 z_threshold = 1.1
-df['raw_signal'] = 0
-
-df.loc[
-    (df['eth_return'] < 0) &
-    (df['pntvl_change'] > 0) &
-    (df['divergence_z'] < -z_threshold),
-    'raw_signal'
-] = 1
-
-df.loc[
-    (df['eth_return'] > 0) &
-    (df['pntvl_change'] < 0) &
-    (df['divergence_z'] > z_threshold),
-    'raw_signal'
-] = -1
-
-# =========================================================
-# 6. Market Regime：200 日均线
-# =========================================================
-ma_window = 200
-df['ma200'] = df['eth_price'].rolling(ma_window).mean()
-
-# regime：1 = 多头环境，-1 = 空头环境
-df['regime'] = 0
-df.loc[df['eth_price'] > df['ma200'], 'regime'] = 1
-df.loc[df['eth_price'] < df['ma200'], 'regime'] = -1
-
-# =========================================================
-# 7. Regime Filter（关键）
-# =========================================================
-df['filtered_signal'] = 0
-
-df.loc[
-    (df['raw_signal'] == 1) & (df['regime'] == 1),
-    'filtered_signal'
-] = 1
-
-df.loc[
-    (df['raw_signal'] == -1) & (df['regime'] == -1),
-    'filtered_signal'
-] = -1
-
-# =========================================================
-# 8. T+1 执行 + 仓位比例
-# =========================================================
+ma_window = 200             # Market Regime：200 日均线，只保留与 regime 同向的信号
 max_position = 0.3
-df['position'] = df['filtered_signal'].shift(1).fillna(0) * max_position
-
-# =========================================================
-# 9. 资金级回测
-# =========================================================
 initial_capital = 100000.0
 fee_rate = 0.0005
 slippage_rate = 0.0002
-cost_rate = fee_rate + slippage_rate
-
-df['prev_capital'] = df['position'].shift(1)
-df['prev_position'] = df['position'].shift(1).fillna(0)
-
-df['turnover'] = (df['position'] - df['prev_position']).abs()
-
-df['gross_pnl'] = initial_capital * df['position'] * df['eth_return']
-df['cost'] = initial_capital * df['turnover'] * cost_rate
-df['daily_pnl'] = df['gross_pnl'] - df['cost']
-
-df['capital'] = initial_capital + df['daily_pnl'].cumsum()
-df['capital'] = df['capital'].fillna(initial_capital)
-
-df['equity_curve'] = df['capital'] / initial_capital
+params = dict(window=window, z_threshold=z_threshold, ma_window=ma_window,
+              max_position=max_position, fee_rate=fee_rate, slippage_rate=slippage_rate,
+              mode='capital', initial_capital=initial_capital)
 
 # =========================================================
-# 10. 回撤
+# 3. 原始信号 → Regime Filter → T+1 执行 → 资金级回测（StrategyPipeline 各阶段）
 # =========================================================
-df['equity_peak'] = df['capital'].cummax()
-df['drawdown'] = df['capital'] / df['equity_peak'] - 1
+checkpoint('pipeline')
+pipeline = StrategyPipeline(df, periods_per_year=periods_per_year, low_memory=low_memory)
+df = pipeline.frame(**params)
 
-# =========================================================
-# 11. 绩效指标
-# =========================================================
-total_days = (df['date'].iloc[-1] - df['date'].iloc[0]).days
-annual_return = df['equity_curve'].iloc[-1] ** (365 / total_days) - 1
-
-daily_return = df['capital'].pct_change().dropna()
-sharpe_ratio = daily_return.mean() / daily_return.std() * np.sqrt(365)
-
-max_drawdown = df['drawdown'].min()
-calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else np.nan
-
-trade_count = (df['turnover'] > 0).sum()
+checkpoint('metrics')
+metrics = pipeline.metrics(**params)
+annual_return = metrics['annual_return']
+sharpe_ratio = metrics['sharpe_ratio']
+calmar_ratio = metrics['calmar_ratio']
+max_drawdown = metrics['max_drawdown']
+trade_count = metrics['trade_count']
 
 # =========================================================
-# 12. 打印结果
+# 4. 打印结果
 # =========================================================
+checkpoint('report')
 print("\n========== Regime Filter Backtest ==========")
 print(f"Initial Capital : {initial_capital:,.0f}")
 print(f"Final Capital   : {df['capital'].iloc[-1]:,.0f}")
@@ -149,20 +68,21 @@ print(f"Trade Count     : {trade_count}")
 print("===========================================\n")
 
 # =========================================================
-# 13. 资金曲线
-# =========================================================
-fig = go.Figure()
-fig.add_trace(go.Scatter(
-    x=df['date'],
-    y=df['equity_curve'],
-    mode='lines',
-    name='Equity Curve'
-))
-fig.update_layout(
-    title='Equity Curve with MA200 Regime Filter',
-    xaxis_title='Date',
-    yaxis_title='Net Value',
-    width=1200,
-    height=600
-)
-fig.show()
+# 5. 资金曲线
+# =========================================================
+checkpoint('plot')
+if plots_enabled():
+    fig = go.Figure()
+    fig.add_trace(line_trace(
+        df['date'],
+        df['equity_curve'],
+        name='Equity Curve'
+    ))
+    fig.update_layout(
+        title='Equity Curve with MA200 Regime Filter',
+        xaxis_title='Date',
+        yaxis_title='Net Value',
+        width=1200,
+        height=600
+    )
+    render(fig, 'level6_equity_curve')
@@ -0,0 +1,381 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pntvl_data import merge_tvl_price, parse_dates, read_price, read_tvl
+from pntvl_kernel import simulate_capital
+from pntvl_rolling import rolling_zscore_matrix
+from pntvl_sweep import sweep_heatmap
+from pntvl_trades import trade_ledger
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+WINDOW = 75
+Z_THRESHOLD = 1.1
+MAX_POSITION = 0.3
+COST_RATE = 0.0007
+DD_THRESHOLD = 0.15
+INITIAL_CAPITAL = 100000.0
+SWEEP_WINDOWS = [30, 45, 60, 75, 90, 120]
+SWEEP_Z = np.arange(0.6, 3.0, 0.1)
+
+
+# =========================================================
+# 1. 合成数据：分钟级时间戳（1000 万行也不会超出日期范围）
+# =========================================================
+class _Data:
+    """按需构造各阶段的输入，同一规模下共享，避免重复生成。"""
+
+    def __init__(self, n, seed=0, tmpdir=None):
+        self.n = n
+        self.tmpdir = tmpdir
+        self._cache = {}
+        rng = np.random.default_rng(seed)
+        self.dates = pd.date_range('2000-01-01', periods=n, freq='min').astype('datetime64[s]')
+        self.price = 2000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+        self.tvl = self.price * 3e7 * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+
+    def get(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def csv_paths(self):
+        def build():
+            tvl_path = os.path.join(self.tmpdir, f"tvl_{self.n}.csv")
+            price_path = os.path.join(self.tmpdir, f"kline_{self.n}.csv")
+            stamps = self.date_strings()
+            pd.DataFrame({'date': stamps, 'tvl_usd': self.tvl}).to_csv(tvl_path, index=False)
+            pd.DataFrame({'datetime': stamps, 'close': self.price}).to_csv(price_path, index=False)
+            return tvl_path, price_path
+        return self.get('csv', build)
+
+    def date_strings(self):
+        return self.get('strings', lambda: pd.Series(self.dates.strftime('%Y-%m-%d %H:%M:%S')))
+
+    def frames(self):
+        return self.get('frames', lambda: (
+            pd.DataFrame({'date': self.dates, 'tvl_usd': self.tvl}),
+            pd.DataFrame({'date': self.dates, 'eth_price': self.price}),
+        ))
+
+    def features(self):
+        return self.get('features', lambda: _features(merge_tvl_price(*self.frames())))
+
+    def zscored(self):
+        def build():
+            df = self.features().copy()
+            df['divergence_z'] = rolling_zscore_matrix(
+                df['divergence_strength'].to_numpy(), [WINDOW])[0]
+            return df
+        return self.get('zscored', build)
+
+    def executed(self):
+        def build():
+            df = _signal_numpy(self.zscored())
+            return _execution_numpy(df)
+        return self.get('executed', build)
+
+
+def _features(df):
+    df = df.copy()
+    df['price_neutral_tvl_2dec'] = (df['tvl_usd'] / df['eth_price']).round(2)
+    df['eth_return'] = df['eth_price'].pct_change()
+    df['pntvl_change'] = df['price_neutral_tvl_2dec'].pct_change()
+    df['divergence_strength'] = df['eth_return'] - df['pntvl_change']
+    return df
+
+
+# =========================================================
+# 2. 各阶段实现：reference 为原脚本写法，engine 为当前库
+# =========================================================
+def _zscore_pandas(df):
+    s = df['divergence_strength']
+    return (s - s.rolling(WINDOW).mean()) / s.rolling(WINDOW).std()
+
+
+def _signal_pandas(df):
+    df = df.copy()
+    df['signal'] = 0
+    df.loc[(df['eth_return'] < 0) & (df['pntvl_change'] > 0)
+           & (df['divergence_z'] < -Z_THRESHOLD), 'signal'] = 1
+    df.loc[(df['eth_return'] > 0) & (df['pntvl_change'] < 0)
+           & (df['divergence_z'] > Z_THRESHOLD), 'signal'] = -1
+    return df
+
+
+def _signal_numpy(df):
+    df = df.copy()
+    r = df['eth_return'].to_numpy()
+    c = df['pntvl_change'].to_numpy()
+    z = df['divergence_z'].to_numpy()
+    signal = np.zeros(len(df), dtype=np.int8)
+    signal[(r < 0) & (c > 0) & (z < -Z_THRESHOLD)] = 1
+    signal[(r > 0) & (c < 0) & (z > Z_THRESHOLD)] = -1
+    df['signal'] = signal
+    return df
+
+
+def _execution_pandas(df, cost_rate=COST_RATE):
+    df = df.copy()
+    df['position'] = df['signal'].shift(1).fillna(0)
+    df['turnover'] = (df['position'] - df['position'].shift(1).fillna(0)).abs()
+    df['strategy_return'] = (df['position'] * df['eth_return']
+                             - df['turnover'] * cost_rate).fillna(0)
+    return df
+
+
+def _execution_numpy(df, cost_rate=COST_RATE):
+    df = df.copy()
+    position = np.zeros(len(df))
+    position[1:] = df['signal'].to_numpy()[:-1]
+    turnover = np.abs(np.diff(position, prepend=0.0))
+    df['position'] = position
+    df['turnover'] = turnover
+    df['strategy_return'] = np.nan_to_num(position * df['eth_return'].to_numpy()
+                                          - turnover * cost_rate)
+    return df
+
+
+def _capital_loop(df):
+    # Level 5 的资金级回测 + 回撤减仓，按原脚本的逐行 df.loc 写法：
+    # 昨日收盘回撤超过阈值 → 今日仓位减半，资金按前一日资金复利
+    df = df.reset_index(drop=True)
+    df['position'] = df['signal'].shift(1).fillna(0) * MAX_POSITION
+    df['capital'] = INITIAL_CAPITAL
+    capital = peak = INITIAL_CAPITAL
+    prev_position = 0.0
+    for i in range(len(df)):
+        position = df.loc[i, 'position']
+        if capital / peak - 1 < -DD_THRESHOLD:
+            position *= 0.5
+            df.loc[i, 'position'] = position
+        r = df.loc[i, 'eth_return']
+        r = 0.0 if np.isnan(r) else r
+        capital *= 1 + position * r - abs(position - prev_position) * COST_RATE
+        peak = max(peak, capital)
+        df.loc[i, 'capital'] = capital
+        prev_position = position
+    return df
+
+
+def _capital_kernel(df):
+    target = np.zeros(len(df))
+    target[1:] = df['signal'].to_numpy()[:-1] * MAX_POSITION
+    return simulate_capital(target, df['eth_return'].to_numpy(), cost_rate=COST_RATE,
+                            initial_capital=INITIAL_CAPITAL, dd_threshold=DD_THRESHOLD)
+
+
+def _metrics(df):
+    equity = (1 + df['strategy_return']).cumprod()
+    drawdown = equity / equity.cummax() - 1
+    sr = df['strategy_return']
+    return equity.iloc[-1], drawdown.min(), sr.mean() / sr.std()
+
+
+def _markers_loop(df):
+    # 原 Level 4 的逐行 df.loc 循环
+    df = df.reset_index(drop=True)
+    df['trade_type'] = None
+    for i in range(1, len(df)):
+        prev_pos = df.loc[i - 1, 'position']
+        curr_pos = df.loc[i, 'position']
+        if curr_pos != prev_pos:
+            if curr_pos > 0:
+                df.loc[i, 'trade_type'] = 'Buy'
+            elif curr_pos < 0:
+                df.loc[i, 'trade_type'] = 'Sell'
+    return df
+
+
+def _sweep_loop(df_base):
+    # 原 Level 3 Optimization 的 window × z 双重循环
+    heatmap = pd.DataFrame(index=SWEEP_WINDOWS, columns=SWEEP_Z, dtype=float)
+    for window in SWEEP_WINDOWS:
+        s = df_base['divergence_strength']
+        z_score = (s - s.rolling(window).mean()) / s.rolling(window).std()
+        for z in SWEEP_Z:
+            signal = pd.Series(0, index=df_base.index)
+            signal[(df_base['eth_return'] < 0) & (df_base['pntvl_change'] > 0) & (z_score < -z)] = 1
+            signal[(df_base['eth_return'] > 0) & (df_base['pntvl_change'] < 0) & (z_score > z)] = -1
+            sr = (signal.shift(1).fillna(0) * df_base['eth_return']).fillna(0)
+            heatmap.loc[window, z] = sr.mean() / sr.std() * np.sqrt(365)
+    return heatmap
+
+
+# 阶段名 → {变体: (准备输入, 被计时函数, 最大行数)}
+STAGES = {
+    'csv_load': {
+        'engine': (lambda d: d.csv_paths(),
+                   lambda p: (read_tvl(p[0]), read_price(p[1], intraday=True)), None),
+    },
+    'date_parse': {
+        'engine': (lambda d: d.date_strings(), lambda s: parse_dates(s, normalize=False), None),
+    },
+    'merge': {
+        'engine': (lambda d: d.frames(), lambda f: merge_tvl_price(*f), None),
+    },
+    'features': {
+        'engine': (lambda d: merge_tvl_price(*d.frames()), _features, None),
+    },
+    'rolling_zscore': {
+        'reference': (lambda d: d.features(), _zscore_pandas, None),
+        'engine': (lambda d: d.features()['divergence_strength'].to_numpy(),
+                   lambda x: rolling_zscore_matrix(x, [WINDOW]), None),
+    },
+    'signal': {
+        'reference': (lambda d: d.zscored(), _signal_pandas, None),
+        'engine': (lambda d: d.zscored(), _signal_numpy, None),
+    },
+    'execution': {
+        'reference': (lambda d: _signal_numpy(d.zscored()), _execution_pandas, None),
+        'engine': (lambda d: _signal_numpy(d.zscored()), _execution_numpy, None),
+    },
+    'capital': {
+        'reference': (lambda d: _signal_numpy(d.zscored()), _capital_loop, 100_000),
+        'engine': (lambda d: _signal_numpy(d.zscored()), _capital_kernel, None),
+    },
+    'metrics': {
+        'engine': (lambda d: d.executed(), _metrics, None),
+    },
+    'trade_markers': {
+        'reference': (lambda d: d.executed(), _markers_loop, 10_000),
+        'engine': (lambda d: d.executed(),
+                   lambda df: trade_ledger(df['date'], df['eth_price'], df['position'],
+                                           df['strategy_return']), None),
+    },
+    'sweep': {
+        'reference': (lambda d: d.features(), _sweep_loop, 1_000_000),
+        'engine': (lambda d: d.features(),
+                   lambda df: sweep_heatmap(df, SWEEP_WINDOWS, SWEEP_Z), None),
+    },
+}
+
+
+# =========================================================
+# 3. 计时 / 存储 / 回归比较
+# =========================================================
+def time_call(func, arg, repeat=5, slow=1.0):
+    """先跑一次预热（含 numba 编译），再重复计时；单次超过 slow 秒时只再计一次。"""
+    start = time.perf_counter()
+    func(arg)
+    if time.perf_counter() - start > slow:
+        repeat = 1
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': float(np.median(times)), 'repeat': repeat}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, stages=None, repeat=5, seed=0, verbose=True):
+    stages = stages or list(STAGES)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            data = _Data(n, seed=seed, tmpdir=tmpdir)
+            for stage in stages:
+                for variant, (setup, func, max_rows) in STAGES[stage].items():
+                    if max_rows is not None and n > max_rows:
+                        continue
+                    arg = setup(data)
+                    stats = time_call(func, arg, repeat=repeat)
+                    stats['rows_per_sec'] = n / stats['min']
+                    results[f"{stage}/{variant}/{n}"] = stats
+                    if verbose:
+                        print(f"{stage:16s} {variant:10s} {n:>11,d}  "
+                              f"{stats['min'] * 1e3:11.3f} ms  {stats['rows_per_sec']:14,.0f} rows/s")
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'sizes': list(sizes),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def speedups(report):
+    """同一阶段、同一规模下 reference / engine 的耗时比。"""
+    results = report['results']
+    rows = []
+    for key, stats in results.items():
+        stage, variant, n = key.split('/')
+        ref = results.get(f"{stage}/reference/{n}")
+        if variant != 'reference' and ref:
+            rows.append({'stage': stage, 'variant': variant, 'rows': int(n),
+                         'speedup': ref['min'] / stats['min']})
+    return pd.DataFrame(rows)
+
+
+def compare(report, baseline, threshold=0.2):
+    """返回比基线慢 threshold 以上的条目（按最小耗时比较）。"""
+    regressions = []
+    for key, stats in report['results'].items():
+        old = baseline['results'].get(key)
+        if old is None:
+            continue
+        ratio = stats['min'] / old['min']
+        if ratio > 1 + threshold:
+            regressions.append({'benchmark': key, 'baseline': old['min'],
+                                'current': stats['min'], 'ratio': ratio})
+    return regressions
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# =========================================================
+# 4. 命令行
+# =========================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price Neutral TVL pipeline benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', default=None, help="与之比较的历史 JSON")
+    parser.add_argument('--threshold', type=float, default=0.2, help="允许的变慢比例")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.stages, repeat=args.repeat)
+    save_report(report, args.out)
+
+    table = speedups(report)
+    if len(table):
+        print("\n========== Speedup (reference / engine) ==========")
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.1f}x"))
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['benchmark']:40s} {r['baseline'] * 1e3:10.3f} ms -> "
+                      f"{r['current'] * 1e3:10.3f} ms  ({r['ratio']:.2f}x)")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
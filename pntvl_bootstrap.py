@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+METRICS = ['Annual Return', 'Sharpe Ratio', 'Calmar Ratio', 'Max Drawdown', 'Win Rate']
+PATH_ARRAYS = 3
+
+
+# =========================================================
+# 1. 重抽样下标：循环块自助法 / 随机置换，一次生成一整块 (paths × days)
+# =========================================================
+def _block_index(rng, paths, n, block_size):
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n, size=(paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)) % n
+    return idx.reshape(paths, -1)[:, :n]
+
+
+def _permute_index(rng, paths, n):
+    return rng.permuted(np.broadcast_to(np.arange(n), (paths, n)), axis=1)
+
+
+# =========================================================
+# 2. 一块路径的指标：向量化 cumprod / cummax / 回撤
+# =========================================================
+def _path_metrics(r, total_days, periods_per_year):
+    # 原地累乘 / 相除：同时存活的 (paths × days) 数组只有 r、equity、peak 三个
+    equity = np.add(r, 1.0)
+    np.cumprod(equity, axis=1, out=equity)
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.divide(equity, peak, out=peak)
+    # x - 1 单调，min(x) - 1 与 min(x - 1) 逐位相同
+    max_drawdown = peak.min(axis=1) - 1
+    final = equity[:, -1].copy()
+    del peak, equity
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annual_return = final ** (365 / total_days) - 1
+        std = r.std(axis=1, ddof=1)
+        sharpe = r.mean(axis=1) / std * np.sqrt(periods_per_year)
+        sharpe[std == 0] = np.nan
+        calmar = np.where(max_drawdown != 0, annual_return / np.abs(max_drawdown), np.nan)
+    return annual_return, sharpe, calmar, max_drawdown
+
+
+# =========================================================
+# 3. 入口
+# =========================================================
+def bootstrap_metrics(strategy_return, total_days, periods_per_year=365, trade_pnl=None,
+                      n_paths=10_000, method='block', block_size=20, alpha=0.05,
+                      seed=0, max_bytes=512 * 2**20):
+    """
+    对 strategy_return 做块自助 / 置换模拟，返回各指标的点估计与 (1 - alpha) 置信区间。
+    胜率按 trade_pnl（每笔交易盈亏，如 trade_ledger 的 pnl 列）有放回重抽样。
+    路径按 max_bytes 分块计算，10 万条路径也只占用固定内存。
+    置换法不改变收益乘积，因此 Annual Return 的区间退化为一个点。
+    """
+    r = np.nan_to_num(np.asarray(strategy_return, dtype=np.float64), nan=0.0)
+    n = len(r)
+    rng = np.random.default_rng(seed)
+
+    # 每条路径同时存活至多 3 个 8 字节的 (days,) 数组：块下标的两步中间量、下标 + 重抽样收益
+    # （取完即释放下标），或重抽样收益 + equity + peak。tracemalloc 实测峰值 ≈ max_bytes
+    # 加上结果数组（n_paths × 5 × 8 字节）；下标按行顺序生成，分块大小不影响抽样结果
+    tile = max(1, min(n_paths, max_bytes // (n * 8 * PATH_ARRAYS)))
+
+    results = {m: np.empty(n_paths) for m in METRICS}
+    for lo in range(0, n_paths, tile):
+        hi = min(lo + tile, n_paths)
+        if method == 'block':
+            idx = _block_index(rng, hi - lo, n, block_size)
+        elif method == 'permute':
+            idx = _permute_index(rng, hi - lo, n)
+        else:
+            raise ValueError(f"unknown method: {method!r}")
+
+        sample = r[idx]
+        del idx
+        annual, sharpe, calmar, mdd = _path_metrics(sample, total_days, periods_per_year)
+        del sample
+        results['Annual Return'][lo:hi] = annual
+        results['Sharpe Ratio'][lo:hi] = sharpe
+        results['Calmar Ratio'][lo:hi] = calmar
+        results['Max Drawdown'][lo:hi] = mdd
+
+    if trade_pnl is not None and len(trade_pnl):
+        wins = (np.asarray(trade_pnl, dtype=np.float64) > 0).astype(np.float64)
+        k = len(wins)
+        t_tile = max(1, min(n_paths, max_bytes // (k * 8 * 2)))
+        for lo in range(0, n_paths, t_tile):
+            hi = min(lo + t_tile, n_paths)
+            results['Win Rate'][lo:hi] = wins[rng.integers(0, k, size=(hi - lo, k))].mean(axis=1)
+    else:
+        results['Win Rate'][:] = np.nan
+
+    point = _path_metrics(r[None, :], total_days, periods_per_year)
+    point = dict(zip(METRICS[:4], (p[0] for p in point)))
+    point['Win Rate'] = (np.asarray(trade_pnl) > 0).mean() \
+        if trade_pnl is not None and len(trade_pnl) else np.nan
+
+    rows = {}
+    for m in METRICS:
+        v = results[m]
+        finite = np.isfinite(v)
+        lo_q, hi_q = (np.quantile(v[finite], [alpha / 2, 1 - alpha / 2])
+                      if finite.any() else (np.nan, np.nan))
+        rows[m] = {
+            'point': point[m],
+            'mean': v[finite].mean() if finite.any() else np.nan,
+            'ci_low': lo_q,
+            'ci_high': hi_q,
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
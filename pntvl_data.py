@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from pntvl_profile import stage
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # 没有 pyarrow 时退化为每次直接解析 CSV
+    feather = None
+
+CACHE_DIR = ".pntvl_cache"
+CACHE_VERSION = 2
+
+
+# =========================================================
+# 1. 解析：日期统一为 datetime64（按天归一），不再生成 object 型 date
+# =========================================================
+def parse_dates(values, normalize=True):
+    dt = pd.to_datetime(values)
+    if dt.dt.tz is not None:
+        dt = dt.dt.tz_localize(None)
+    if normalize:
+        dt = dt.dt.normalize()
+    return dt.astype('datetime64[s]')
+
+
+def read_tvl(tvl_path):
+    with stage('load.read_csv', file=os.path.basename(tvl_path)):
+        tvl_df = pd.read_csv(tvl_path)
+    with stage('load.parse_dates'):
+        tvl_df['date'] = parse_dates(tvl_df['date'])
+    return tvl_df
+
+
+def read_price(price_path, columns=('close',), intraday=False):
+    # 只读需要的列，控制多百万行 K 线的内存
+    with stage('load.read_csv', file=os.path.basename(price_path)):
+        price_df = pd.read_csv(price_path, usecols=['datetime', *columns])
+    return _price_frame(price_df, columns, intraday)
+
+
+def read_price_chunks(price_path, columns=('close',), intraday=False, chunksize=1_000_000):
+    """与 read_price 相同的列与解析，每次只读 chunksize 行 K 线。"""
+    for price_df in pd.read_csv(price_path, usecols=['datetime', *columns], chunksize=chunksize):
+        yield _price_frame(price_df, columns, intraday)
+
+
+def _price_frame(price_df, columns, intraday):
+    with stage('load.parse_dates'):
+        price_df['date'] = parse_dates(price_df['datetime'], normalize=not intraday)
+    price_df = price_df[['date', *columns]]
+    return price_df.rename(columns={'close': 'eth_price'})
+
+
+def merge_tvl_price(tvl_df, price_df):
+    with stage('load.merge'):
+        return pd.merge(tvl_df, price_df, on='date', how='inner')
+
+
+def asof_join(tvl_df, price_df, tvl_lag=None):
+    """
+    每根 K 线取其时间点之前（含）最近一条 TVL（前向填充），用于 1h / 5m 等日内 K 线。
+    tvl_lag 为 TVL 的发布延迟（如 pd.Timedelta(days=1) 表示当日 TVL 次日才可用）。
+    """
+    with stage('load.asof_join'):
+        return _asof_join(tvl_df, price_df, tvl_lag)
+
+
+def _asof_join(tvl_df, price_df, tvl_lag):
+    tvl_df = tvl_df.sort_values('date', kind='stable')
+    price_df = price_df.sort_values('date', kind='stable')
+
+    available = tvl_df['date'].to_numpy()
+    if tvl_lag is not None:
+        available = available + pd.Timedelta(tvl_lag).to_timedelta64()
+
+    idx = np.searchsorted(available, price_df['date'].to_numpy(), side='right') - 1
+    keep = idx >= 0
+    idx = idx[keep]
+
+    out = {'date': price_df['date'].to_numpy()[keep]}
+    for col in tvl_df.columns:
+        if col != 'date':
+            out[col] = tvl_df[col].to_numpy()[idx]
+    for col in price_df.columns:
+        if col != 'date':
+            out[col] = price_df[col].to_numpy()[keep]
+    return pd.DataFrame(out)
+
+
+def bar_periods_per_year(dates):
+    """
+    按 K 线间隔的中位数推断年化因子：日线 365，1h 8760，5m 105120。
+    重复时间戳（间隔为 0）不参与中位数；全部重复时无法推断，抛 ValueError。
+    """
+    ts = pd.Series(dates).to_numpy().astype('datetime64[s]').astype(np.int64)
+    if len(ts) < 2:
+        return 365
+    steps = np.diff(np.sort(ts))
+    steps = steps[steps > 0]
+    if not len(steps):
+        raise ValueError("cannot infer bar frequency: all timestamps are identical")
+    return int(round(365 * 86400 / np.median(steps)))
+
+
+def span_days(dates):
+    """首尾相隔的天数（日内 K 线保留小数部分）。"""
+    dates = pd.Series(dates)
+    return (dates.iloc[-1] - dates.iloc[0]) / pd.Timedelta(days=1)
+
+
+# =========================================================
+# 2. 缓存键：源文件 mtime/size 未变时复用已记录的内容哈希
+# =========================================================
+def _file_digest(path, manifest):
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    entry = manifest.get(key)
+    if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+        return entry['sha256']
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    manifest[key] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha256': h.hexdigest()}
+    return manifest[key]['sha256']
+
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, 'manifest.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, path)
+
+
+# =========================================================
+# 3. 入口：解析一次 → Feather 缓存 → 之后内存映射读取
+# =========================================================
+def _build_merged(tvl_path, price_path, price_columns, join, tvl_lag):
+    if join == 'asof':
+        return asof_join(read_tvl(tvl_path),
+                         read_price(price_path, price_columns, intraday=True), tvl_lag)
+    if join == 'date':
+        return merge_tvl_price(read_tvl(tvl_path), read_price(price_path, price_columns))
+    raise ValueError(f"unknown join: {join!r}")
+
+
+def load_merged(tvl_path, price_path, price_columns=('close',), cache_dir=CACHE_DIR,
+                use_cache=True, join='date', tvl_lag=None, start=None, end=None, source='csv'):
+    """
+    读取 TVL 与 K 线，结果列为 date + TVL 原列 + eth_price（及额外 price_columns）。
+    join='date' 按日期内连接（日线）；join='asof' 保留 K 线时间戳并前向填充 TVL（日内）。
+    start / end 只保留日期在 [start, end) 内的行（None 表示不限）。
+    source='csv'（默认）总是解析 CSV；'auto' 时若本地行情库（pntvl_market）已导入这两个文件
+    对应的序列、且首尾日期覆盖 [start, end)，只从库里读这一段，否则读 CSV；
+    'market' 必须从行情库读，未导入或未覆盖时报错。
+    """
+    if source not in ('auto', 'csv', 'market'):
+        raise ValueError(f"unknown source: {source!r}")
+    if source != 'csv':
+        # 延迟导入：pntvl_market 依赖本模块
+        from pntvl_market import load_from_market
+
+        df = load_from_market(tvl_path, price_path, start, end, price_columns, join, tvl_lag,
+                              required=source == 'market')
+        if df is not None:
+            return df
+    return clip_dates(_load_csv_merged(tvl_path, price_path, price_columns, cache_dir,
+                                       use_cache, join, tvl_lag), start, end)
+
+
+def clip_dates(df, start, end):
+    """只保留日期在 [start, end) 内的行（None 表示不限）。"""
+    if start is None and end is None:
+        return df
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= df['date'].to_numpy() >= np.datetime64(pd.Timestamp(start), 's')
+    if end is not None:
+        keep &= df['date'].to_numpy() < np.datetime64(pd.Timestamp(end), 's')
+    return df[keep].reset_index(drop=True)
+
+
+def _load_csv_merged(tvl_path, price_path, price_columns, cache_dir, use_cache, join, tvl_lag):
+    if not use_cache or feather is None:
+        return _build_merged(tvl_path, price_path, price_columns, join, tvl_lag)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+
+    key = hashlib.sha256(json.dumps([
+        CACHE_VERSION,
+        _file_digest(tvl_path, manifest),
+        _file_digest(price_path, manifest),
+        list(price_columns),
+        join,
+        None if tvl_lag is None else str(pd.Timedelta(tvl_lag)),
+    ]).encode()).hexdigest()[:24]
+    _save_manifest(cache_dir, manifest)
+
+    cache_path = os.path.join(cache_dir, f"merged_{key}.feather")
+    if os.path.exists(cache_path):
+        with stage('load.cache_read'):
+            table = feather.read_table(cache_path, memory_map=True)
+            return table.to_pandas(split_blocks=True)
+
+    df = _build_merged(tvl_path, price_path, price_columns, join, tvl_lag)
+
+    # 不压缩，才能在后续运行中直接内存映射
+    with stage('load.cache_write'):
+        tmp = cache_path + '.tmp'
+        feather.write_feather(df, tmp, compression='uncompressed')
+        os.replace(tmp, cache_path)
+    return df
@@ -0,0 +1,106 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # 没有 numba 时走下面的 NumPy 版本（按日推进、参数维度向量化）
+    njit = None
+
+
+# =========================================================
+# 1. 资金路径内核：逐日更新 capital / peak / drawdown / 风控后仓位
+# =========================================================
+def _capital_loop(target, ret, cost_rate, cap0, peak0, pos0, dd_threshold, dd_scale,
+                  position, strategy_return, capital):
+    k, n = target.shape
+    for i in range(k):
+        cap = cap0
+        peak = peak0
+        prev = pos0
+        dd = cap0 / peak0 - 1.0
+        for t in range(n):
+            # 昨日收盘回撤超过阈值 → 今日仓位按 dd_scale 缩放
+            pos = target[i, t]
+            if dd < -dd_threshold:
+                pos *= dd_scale
+            r = ret[t]
+            if r != r:
+                r = 0.0
+            sr = pos * r - abs(pos - prev) * cost_rate
+            cap *= 1.0 + sr
+            if cap > peak:
+                peak = cap
+            dd = cap / peak - 1.0
+
+            position[i, t] = pos
+            strategy_return[i, t] = sr
+            capital[i, t] = cap
+            prev = pos
+
+
+def _capital_numpy(target, ret, cost_rate, cap0, peak0, pos0, dd_threshold, dd_scale,
+                   position, strategy_return, capital):
+    k, n = target.shape
+    ret = np.nan_to_num(ret, nan=0.0)
+    cap = np.full(k, cap0)
+    peak = np.full(k, peak0)
+    prev = np.full(k, pos0)
+    for t in range(n):
+        pos = np.where(cap / peak - 1.0 < -dd_threshold, target[:, t] * dd_scale, target[:, t])
+        sr = pos * ret[t] - np.abs(pos - prev) * cost_rate
+        cap = cap * (1.0 + sr)
+        np.maximum(peak, cap, out=peak)
+
+        position[:, t] = pos
+        strategy_return[:, t] = sr
+        capital[:, t] = cap
+        prev = pos
+
+
+_capital_kernel = njit(cache=True, nogil=True)(_capital_loop) if njit else _capital_numpy
+
+
+# =========================================================
+# 2. 入口：支持 1-D（单条路径）或 2-D（参数 × 天）目标仓位
+# =========================================================
+def simulate_capital(target_position, eth_return, cost_rate=0.0, initial_capital=100000.0,
+                     dd_threshold=None, dd_scale=0.5, start_peak=None, start_position=0.0):
+    """
+    路径依赖的资金级回测：pnl 以前一日资金为基数复利，回撤风控作用于次日仓位。
+    dd_threshold=None 表示不启用回撤减仓。
+    分块续跑时用上一块最后一行的 capital / equity_peak / position 作为
+    initial_capital / start_peak / start_position，结果与整段一次跑逐位一致。
+    """
+    target = np.asarray(target_position, dtype=np.float64)
+    squeeze = target.ndim == 1
+    target = np.ascontiguousarray(np.atleast_2d(target))
+    ret = np.ascontiguousarray(eth_return, dtype=np.float64)
+    threshold = np.inf if dd_threshold is None else float(dd_threshold)
+    peak0 = initial_capital if start_peak is None else max(start_peak, initial_capital)
+
+    position = np.empty_like(target)
+    strategy_return = np.empty_like(target)
+    capital = np.empty_like(target)
+    _capital_kernel(target, ret, float(cost_rate), float(initial_capital), float(peak0),
+                    float(start_position), threshold, float(dd_scale),
+                    position, strategy_return, capital)
+
+    prev_capital = np.empty_like(capital)
+    prev_capital[:, 0] = initial_capital
+    prev_capital[:, 1:] = capital[:, :-1]
+    turnover = np.abs(np.diff(position, axis=1, prepend=float(start_position)))
+    equity_peak = np.maximum(np.maximum.accumulate(capital, axis=1), peak0)
+
+    out = {
+        'position': position,
+        'turnover': turnover,
+        'strategy_return': strategy_return,
+        'gross_pnl': prev_capital * position * np.nan_to_num(ret, nan=0.0),
+        'cost': prev_capital * turnover * cost_rate,
+        'daily_pnl': capital - prev_capital,
+        'capital': capital,
+        'equity_peak': equity_peak,
+        'drawdown': capital / equity_peak - 1,
+    }
+    if squeeze:
+        out = {k: v[0] for k, v in out.items()}
+    return out
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import csv
+import inspect
+import time
+
+import pandas as pd
+
+from pntvl_online import OnlineDivergence
+from pntvl_regime import MACrossover
+
+
+# =========================================================
+# 1. 在线 Regime Filter（Level 6 的逐 bar 版本）
+# =========================================================
+class OnlineRegimeFilter:
+    """原始背离信号只在 close 与 MA 同向时保留，T+1 乘以 max_position 得到仓位。"""
+
+    def __init__(self, window=75, z_threshold=1.1, ma_window=200, max_position=0.3):
+        self.divergence = OnlineDivergence(window, z_threshold, max_position=1.0)
+        self.crossover = MACrossover(ma_window)
+        self.ma_window = ma_window
+        self.max_position = max_position
+        self.prev_signal = 0
+
+    def update(self, tvl_usd, close):
+        row = self.divergence.update(tvl_usd, close)
+        regime = self.crossover.update(close)
+        ma = self.crossover.value
+
+        raw = row['signal']
+        signal = raw if (raw == 1 and regime == 1) or (raw == -1 and regime == -1) else 0
+
+        row['raw_signal'] = raw
+        row[f"ma{self.ma_window}"] = ma
+        row['regime'] = regime
+        row['signal'] = signal
+        row['position'] = self.prev_signal * self.max_position
+        self.prev_signal = signal
+        return row
+
+    @property
+    def next_position(self):
+        return self.prev_signal * self.max_position
+
+
+# =========================================================
+# 2. 数据源：进程内队列 / 追踪本地 CSV 文件尾部
+# =========================================================
+class QueueFeed:
+    """进程内数据源：put(date, value) 推送，close() 结束。"""
+
+    _END = object()
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    def put(self, date, value):
+        self.queue.put_nowait((date, value))
+
+    def close(self):
+        self.queue.put_nowait(self._END)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is self._END:
+            raise StopAsyncIteration
+        return item
+
+
+class FileTailFeed:
+    """
+    逐行读取一个不断追加的 CSV（如 TVL: date,tvl_usd；K 线: datetime,...,close）。
+    读到文件末尾时每 poll_interval 秒轮询一次；idle_timeout 秒没有新行则结束（None 表示一直等）。
+    """
+
+    def __init__(self, path, value_column, date_column='date', poll_interval=0.5,
+                 idle_timeout=None):
+        self.path = path
+        self.value_column = value_column
+        self.date_column = date_column
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    async def __aiter__(self):
+        with open(self.path, newline='') as f:
+            header = None
+            partial = ''
+            idle = 0.0
+            while True:
+                line = f.readline()
+                if not line.endswith('\n'):
+                    # 写入方可能只写了半行：先缓存，等下一次轮询补齐
+                    partial += line
+                    if self.idle_timeout is not None and idle >= self.idle_timeout:
+                        return
+                    await asyncio.sleep(self.poll_interval)
+                    idle += self.poll_interval
+                    continue
+                line, partial, idle = partial + line, '', 0.0
+                fields = next(csv.reader([line]))
+                if header is None:
+                    header = {name: i for i, name in enumerate(fields)}
+                    continue
+                if not fields:
+                    continue
+                date = pd.Timestamp(fields[header[self.date_column]]).normalize()
+                yield date, float(fields[header[self.value_column]])
+
+
+# =========================================================
+# 3. 运行器：两路数据按日期对齐，齐了就更新并发布次日仓位
+# =========================================================
+class LiveRunner:
+    """
+    tvl_feed / kline_feed 为异步迭代器，产出 (date, value)。
+    某日两路数据都到齐后更新策略，并调用 publish(row)（可为协程函数），
+    row['next_position'] 即下一根 bar 的目标仓位。
+    与批量脚本的内连接一致：只有一路数据的日期在更晚的日期到齐后被丢弃。
+    """
+
+    def __init__(self, tvl_feed, kline_feed, strategy=None, publish=None):
+        self.tvl_feed = tvl_feed
+        self.kline_feed = kline_feed
+        self.strategy = strategy or OnlineRegimeFilter()
+        self.publish = publish
+        self.pending = {'tvl': {}, 'kline': {}}
+        self.last_date = None
+        self.latencies = []   # 每个 bar 的 update 耗时（秒）
+
+    async def _consume(self, name, feed):
+        async for date, value in feed:
+            if self.last_date is not None and date <= self.last_date:
+                continue
+            self.pending[name][date] = value
+            other = self.pending['kline' if name == 'tvl' else 'tvl']
+            if date in other:
+                await self._on_bar(date)
+
+    async def _on_bar(self, date):
+        tvl = self.pending['tvl'].pop(date)
+        close = self.pending['kline'].pop(date)
+
+        start = time.perf_counter()
+        row = self.strategy.update(tvl, close)
+        row['next_position'] = self.strategy.next_position
+        self.latencies.append(time.perf_counter() - start)
+
+        row['date'] = date
+        self.last_date = date
+        for side in self.pending.values():
+            for stale in [d for d in side if d <= date]:
+                del side[stale]
+
+        if self.publish is not None:
+            result = self.publish(row)
+            if inspect.isawaitable(result):
+                await result
+
+    async def run(self):
+        await asyncio.gather(self._consume('tvl', self.tvl_feed),
+                             self._consume('kline', self.kline_feed))
+
+
+def replay_live(df, **strategy_params):
+    """把合并后的表拆成两路进程内数据源跑一遍，返回逐日输出（用于与 Level 6 批量结果对账）。"""
+    async def main():
+        tvl_feed, kline_feed = QueueFeed(), QueueFeed()
+        rows = []
+        runner = LiveRunner(tvl_feed, kline_feed, OnlineRegimeFilter(**strategy_params),
+                            publish=rows.append)
+        task = asyncio.create_task(runner.run())
+        for date, tvl, close in zip(df['date'], df['tvl_usd'], df['eth_price']):
+            tvl_feed.put(date, tvl)
+            kline_feed.put(date, close)
+        tvl_feed.close()
+        kline_feed.close()
+        await task
+        return pd.DataFrame(rows).set_index('date'), runner.latencies
+
+    return asyncio.run(main())
+
+
+# =========================================================
+# 4. 命令行：追踪两个本地 CSV，逐日打印下一根 bar 的目标仓位
+# =========================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Level 6 live runner (file-tail feeds)")
+    parser.add_argument('tvl_path')
+    parser.add_argument('price_path')
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--idle-timeout', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    def show(row):
+        print(f"{row['date']:%Y-%m-%d}  z={row['divergence_z']:+.2f}  "
+              f"regime={row['regime']:+d}  next_position={row['next_position']:+.2f}")
+
+    runner = LiveRunner(
+        FileTailFeed(args.tvl_path, 'tvl_usd', 'date', args.poll_interval, args.idle_timeout),
+        FileTailFeed(args.price_path, 'close', 'datetime', args.poll_interval, args.idle_timeout),
+        publish=show,
+    )
+    asyncio.run(runner.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import re
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from pntvl_data import asof_join, merge_tvl_price, parse_dates
+from pntvl_profile import stage
+
+MARKET_DIR = os.environ.get('PNTVL_MARKET_DIR', '.pntvl_market')
+PARTITIONS = {'year': 'datetime64[Y]', 'month': 'datetime64[M]'}
+
+
+# =========================================================
+# 1. 存储：每条序列一个目录，按年（或月）分区，每列一个 .npy（可内存映射）
+# =========================================================
+class MarketStore:
+    """
+    本地行情库：root/<kind>/<symbol>/<分区>/date.npy + <列>.npy，外加 index.json 记录
+    每个分区的首尾日期与行数。只追加：已有日期不会被覆盖，重复日期直接丢弃。
+    读取时先按 index 二分定位分区，再在内存映射的 date.npy 上 searchsorted，
+    只有落在 [start, end) 内的行会被读入内存。单写多读。
+    """
+
+    def __init__(self, root=MARKET_DIR, partition='year'):
+        if partition not in PARTITIONS:
+            raise ValueError(f"unknown partition: {partition!r}")
+        self.root = root
+        self.partition = partition
+
+    def _series_dir(self, kind, symbol):
+        return os.path.join(self.root, kind, symbol)
+
+    def _load_index(self, kind, symbol):
+        path = os.path.join(self._series_dir(kind, symbol), 'index.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_index(self, kind, symbol, index):
+        path = os.path.join(self._series_dir(kind, symbol), 'index.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, path)
+
+    def symbols(self, kind):
+        base = os.path.join(self.root, kind)
+        if not os.path.isdir(base):
+            return []
+        return sorted(s for s in os.listdir(base)
+                      if os.path.exists(os.path.join(base, s, 'index.json')))
+
+    def has(self, kind, symbol):
+        return os.path.exists(os.path.join(self._series_dir(kind, symbol), 'index.json'))
+
+    def info(self, kind, symbol):
+        """列、分区方式、首尾日期与总行数；序列不存在时返回 None。"""
+        index = self._load_index(kind, symbol)
+        if index is None:
+            return None
+        parts = index['partitions']
+        return {
+            'columns': list(index['columns']),
+            'partition': index['partition'],
+            'partitions': len(parts),
+            'rows': sum(p['rows'] for p in parts),
+            'first': parts[0]['first'] if parts else None,
+            'last': parts[-1]['last'] if parts else None,
+        }
+
+    def covers(self, kind, symbol, start=None, end=None):
+        """
+        序列首尾日期是否覆盖 [start, end)：first <= start，且 last 不早于 end 的前一天
+        （日线最后一根在 end 前一天 00:00）。None 表示这一侧不限；只比较首尾，不检查中间缺口。
+        """
+        meta = self.info(kind, symbol)
+        if meta is None or not meta['rows']:
+            return False
+        first, last = pd.Timestamp(meta['first']), pd.Timestamp(meta['last'])
+        if start is not None and first > pd.Timestamp(start):
+            return False
+        if end is not None and last < pd.Timestamp(end) - pd.Timedelta(days=1):
+            return False
+        return True
+
+    # =========================================================
+    # 2. 追加：按分区合并、按日期去重，逐文件原子替换
+    # =========================================================
+    def append(self, kind, symbol, df, date_column='date'):
+        """追加一批行，返回实际新增的行数（已存在的日期被跳过）。"""
+        dates = pd.Series(df[date_column]).to_numpy().astype('datetime64[s]')
+        columns = [c for c in df.columns if c != date_column]
+        non_numeric = [c for c in columns if not pd.api.types.is_numeric_dtype(df[c])]
+        if non_numeric:
+            raise ValueError(f"only numeric columns can be stored: {non_numeric}")
+
+        index = self._load_index(kind, symbol)
+        if index is None:
+            index = {'partition': self.partition,
+                     'columns': {c: str(df[c].dtype) for c in columns},
+                     'partitions': []}
+        elif set(columns) != set(index['columns']):
+            raise ValueError(f"columns {sorted(columns)} do not match stored "
+                             f"{sorted(index['columns'])}")
+        columns = list(index['columns'])
+
+        # 批内：丢弃无效日期，同一日期只保留第一条
+        keep = ~np.isnat(dates)
+        dates = dates[keep]
+        values = {c: df[c].to_numpy()[keep].astype(index['columns'][c]) for c in columns}
+        order = np.argsort(dates, kind='stable')
+        dates = dates[order]
+        first = np.concatenate(([True], dates[1:] != dates[:-1])) if len(dates) else keep[:0]
+        dates = dates[first]
+        values = {c: v[order][first] for c, v in values.items()}
+
+        keys = dates.astype(PARTITIONS[index['partition']])
+        parts = {p['key']: p for p in index['partitions']}
+        added = 0
+        for key in np.unique(keys):
+            sel = keys == key
+            name = str(key)
+            added += self._write_partition(kind, symbol, name, parts.get(name), dates[sel],
+                                           {c: v[sel] for c, v in values.items()}, columns,
+                                           parts)
+        index['partitions'] = sorted(parts.values(), key=lambda p: p['first'])
+        self._save_index(kind, symbol, index)
+        return added
+
+    def _write_partition(self, kind, symbol, name, meta, dates, values, columns, parts):
+        path = os.path.join(self._series_dir(kind, symbol), name)
+        if meta is not None:
+            old_dates = np.load(os.path.join(path, 'date.npy'))
+            new = ~np.isin(dates, old_dates)
+            if not new.any():
+                return 0
+            dates = np.concatenate((old_dates, dates[new]))
+            values = {c: np.concatenate((np.load(os.path.join(path, f"{c}.npy")), values[c][new]))
+                      for c in columns}
+            added = int(new.sum())
+            order = np.argsort(dates, kind='stable')
+            dates = dates[order]
+            values = {c: v[order] for c, v in values.items()}
+        else:
+            added = len(dates)
+
+        os.makedirs(path, exist_ok=True)
+        for col, arr in [('date', dates), *values.items()]:
+            target = os.path.join(path, f"{col}.npy")
+            tmp = target + '.tmp.npy'
+            np.save(tmp, arr)
+            os.replace(tmp, target)
+        parts[name] = {'key': name, 'first': str(dates[0]), 'last': str(dates[-1]),
+                       'rows': len(dates)}
+        return added
+
+    # =========================================================
+    # 3. 读取：[start, end) 区间，分区二分 + 分区内 searchsorted
+    # =========================================================
+    def read(self, kind, symbol, start=None, end=None, columns=None, lookback=0):
+        """
+        返回 date + columns 的 DataFrame，日期落在 [start, end)（None 表示不限）。
+        lookback=k 时额外带上 start 之前的最后 k 行（as-of 连接需要 start 前最近一条 TVL）。
+        """
+        index, columns = self._index_columns(kind, symbol, columns)
+        with stage('load.market_read', series=f"{kind}/{symbol}"):
+            pieces = self._pieces(kind, symbol, index, start, end, lookback)
+            return self._frame(kind, symbol, index, columns, pieces)
+
+    def read_chunks(self, kind, symbol, start=None, end=None, columns=None, chunksize=1_000_000):
+        """与 read 相同的区间与列，按分区顺序每次只物化 chunksize 行。"""
+        index, columns = self._index_columns(kind, symbol, columns)
+        for key, a, b in self._pieces(kind, symbol, index, start, end, 0):
+            for lo in range(a, b, chunksize):
+                with stage('load.market_read', series=f"{kind}/{symbol}"):
+                    yield self._frame(kind, symbol, index, columns,
+                                      [(key, lo, min(lo + chunksize, b))])
+
+    def _index_columns(self, kind, symbol, columns):
+        index = self._load_index(kind, symbol)
+        if index is None:
+            raise FileNotFoundError(f"no {kind} series {symbol!r} in {self.root}")
+        return index, list(index['columns']) if columns is None else list(columns)
+
+    def _pieces(self, kind, symbol, index, start, end, lookback):
+        """[start, end) 落在各分区里的 (分区, 起, 止) 行号区间，按时间顺序。"""
+        parts = index['partitions']
+        lo_ts = None if start is None else np.datetime64(pd.Timestamp(start), 's')
+        hi_ts = None if end is None else np.datetime64(pd.Timestamp(end), 's')
+
+        # 分区按时间有序且互不重叠：last >= start 且 first < end 的分区才需要读
+        lasts = [np.datetime64(p['last'], 's') for p in parts]
+        firsts = [np.datetime64(p['first'], 's') for p in parts]
+        p0 = 0 if lo_ts is None else bisect_left(lasts, lo_ts)
+        p1 = len(parts) if hi_ts is None else bisect_left(firsts, hi_ts)
+
+        pieces = []
+        for i in range(p0, p1):
+            d = self._mmap(kind, symbol, parts[i]['key'], 'date')
+            i0 = 0 if lo_ts is None else np.searchsorted(d, lo_ts, side='left')
+            i1 = len(d) if hi_ts is None else np.searchsorted(d, hi_ts, side='left')
+            if i1 > i0:
+                pieces.append((parts[i]['key'], i0, i1))
+
+        # start 之前的 lookback 行：从 p0 所在分区往前倒着取
+        need = lookback if lo_ts is not None else 0
+        i = min(p0, len(parts) - 1)
+        while need > 0 and i >= 0:
+            d = self._mmap(kind, symbol, parts[i]['key'], 'date')
+            stop = np.searchsorted(d, lo_ts, side='left')
+            take = min(need, stop)
+            if take:
+                pieces.insert(0, (parts[i]['key'], stop - take, stop))
+            need -= take
+            i -= 1
+        return pieces
+
+    def _frame(self, kind, symbol, index, columns, pieces):
+        out = {'date': _concat([self._mmap(kind, symbol, k, 'date')[a:b]
+                                for k, a, b in pieces], 'datetime64[s]')}
+        for col in columns:
+            out[col] = _concat([self._mmap(kind, symbol, k, col)[a:b] for k, a, b in pieces],
+                               index['columns'][col])
+        return pd.DataFrame(out)
+
+    def _mmap(self, kind, symbol, key, col):
+        return np.load(os.path.join(self._series_dir(kind, symbol), key, f"{col}.npy"),
+                       mmap_mode='r')
+
+
+def _concat(arrays, dtype):
+    # 切片拷贝出内存映射：返回的 DataFrame 不再依赖文件句柄
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate([np.asarray(a) for a in arrays])
+
+
+# =========================================================
+# 4. 导入 CSV 与按区间加载合并表（与 load_merged 输出一致）
+# =========================================================
+_DATE_TOKEN = re.compile(r'^(\d{8}|\d{4}-\d{2}-\d{2})$')
+
+
+def series_symbol(path):
+    """
+    由文件名得到序列名：去掉扩展名、日期区间与 kline / tvl 标记。
+    ethereum_tvl_2022-01-01_2025-01-01.csv → ethereum；
+    kline_ETHUSDT_D_20230101_20260101_spot.csv → ETHUSDT_D_spot。
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return '_'.join(t for t in name.split('_')
+                    if t not in ('kline', 'tvl') and not _DATE_TOKEN.match(t))
+
+
+def ingest_tvl_csv(store, symbol, path):
+    df = pd.read_csv(path)
+    df['date'] = parse_dates(df['date'])
+    return store.append('tvl', symbol, df)
+
+
+def ingest_kline_csv(store, symbol, path):
+    df = pd.read_csv(path)
+    # K 线保留完整时间戳（日线本来就是 00:00），日内 K 线才能按 bar 去重
+    df['date'] = parse_dates(df.pop('datetime'), normalize=False)
+    return store.append('kline', symbol, df)
+
+
+def load_merged_range(store, tvl_symbol, kline_symbol, start=None, end=None,
+                      price_columns=('close',), join='date', tvl_lag=None):
+    """
+    只读取 [start, end) 内的 TVL 与 K 线，按 load_merged 的规则合并：
+    join='date' 按日内连接（K 线按天归一）；join='asof' 保留 K 线时间戳并前向填充 TVL。
+    """
+    price = store.read('kline', kline_symbol, start, end, columns=list(price_columns))
+    price = price.rename(columns={'close': 'eth_price'})
+    if join == 'date':
+        price['date'] = price['date'].dt.normalize()
+        tvl = store.read('tvl', tvl_symbol, start, end)
+        return merge_tvl_price(tvl, price)
+    if join == 'asof':
+        # 区间起点之前最近一条（考虑发布延迟）TVL 也要读进来
+        tvl_start = None if start is None else pd.Timestamp(start) - pd.Timedelta(tvl_lag or 0)
+        tvl = store.read('tvl', tvl_symbol, tvl_start, end, lookback=1)
+        return asof_join(tvl, price, tvl_lag)
+    raise ValueError(f"unknown join: {join!r}")
+
+
+def load_merged_range_chunks(store, tvl_symbol, kline_symbol, start=None, end=None,
+                             price_columns=('close',), join='date', tvl_lag=None,
+                             chunksize=1_000_000):
+    """load_merged_range 的分块版本：TVL（日频小表）整段读入，K 线按分区每次读 chunksize 行再连接。"""
+    if join not in ('date', 'asof'):
+        raise ValueError(f"unknown join: {join!r}")
+    if join == 'date':
+        tvl = store.read('tvl', tvl_symbol, start, end)
+    else:
+        tvl_start = None if start is None else pd.Timestamp(start) - pd.Timedelta(tvl_lag or 0)
+        tvl = store.read('tvl', tvl_symbol, tvl_start, end, lookback=1)
+    for price in store.read_chunks('kline', kline_symbol, start, end,
+                                   columns=list(price_columns), chunksize=chunksize):
+        price = price.rename(columns={'close': 'eth_price'})
+        if join == 'date':
+            price['date'] = price['date'].dt.normalize()
+            yield merge_tvl_price(tvl, price)
+        else:
+            yield asof_join(tvl, price, tvl_lag)
+
+
+def _market_series(tvl_path, price_path, start, end, join, tvl_lag, root, required):
+    """
+    两条序列都已导入且首尾日期覆盖 [start, end) 时返回 (store, tvl_symbol, kline_symbol)，
+    否则返回 None（start / end 缺一侧时也返回 None，无从判断 CSV 的范围）。
+    required=True 时不退回：未导入或未覆盖直接报错，None 表示读到库的首 / 尾。
+    """
+    store = MarketStore(root or MARKET_DIR)
+    tvl_symbol, kline_symbol = series_symbol(tvl_path), series_symbol(price_path)
+    if not (store.has('tvl', tvl_symbol) and store.has('kline', kline_symbol)):
+        if required:
+            raise FileNotFoundError(f"tvl/{tvl_symbol} or kline/{kline_symbol} "
+                                    f"not ingested in {store.root}")
+        return None
+
+    # as-of 连接还需要区间起点之前（考虑发布延迟）的那条 TVL
+    tvl_start = start
+    if join == 'asof' and start is not None:
+        tvl_start = pd.Timestamp(start) - pd.Timedelta(tvl_lag or 0)
+    covered = (store.covers('tvl', tvl_symbol, tvl_start, end)
+               and store.covers('kline', kline_symbol, start, end))
+    if required and not covered:
+        raise ValueError(f"tvl/{tvl_symbol} or kline/{kline_symbol} in {store.root} "
+                         f"do not cover [{start}, {end})")
+    # 自动模式下区间不完整时无从判断库里是否有 CSV 的全部行，退回 CSV
+    if not required and (not covered or start is None or end is None):
+        return None
+    return store, tvl_symbol, kline_symbol
+
+
+def load_from_market(tvl_path, price_path, start=None, end=None, price_columns=('close',),
+                     join='date', tvl_lag=None, root=None, required=False):
+    """
+    load_merged 的行情库分支：两条序列都已导入且首尾日期覆盖 [start, end) 时只读这一段，
+    否则返回 None，由调用方退回读 CSV（start / end 缺一侧时也退回，无从判断 CSV 的范围）。
+    required=True（source='market'）时不退回：未导入或未覆盖直接报错，None 表示读到库的首 / 尾。
+    """
+    series = _market_series(tvl_path, price_path, start, end, join, tvl_lag, root, required)
+    if series is None:
+        return None
+    return load_merged_range(*series, start, end, price_columns, join, tvl_lag)
+
+
+def market_chunks(tvl_path, price_path, start=None, end=None, price_columns=('close',),
+                  join='date', tvl_lag=None, root=None, required=False, chunksize=1_000_000):
+    """load_from_market 的分块版本：返回逐块连接结果的迭代器，或 None（退回读 CSV）。"""
+    series = _market_series(tvl_path, price_path, start, end, join, tvl_lag, root, required)
+    if series is None:
+        return None
+    return load_merged_range_chunks(*series, start, end, price_columns, join, tvl_lag, chunksize)
+
+
+# =========================================================
+# 5. 命令行：导入 / 查看
+# =========================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local TVL / kline store")
+    parser.add_argument('--root', default=MARKET_DIR)
+    parser.add_argument('--partition', choices=sorted(PARTITIONS), default='year')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ingest = sub.add_parser('ingest', help="append a CSV (duplicates by date are skipped)")
+    ingest.add_argument('kind', choices=['tvl', 'kline'])
+    ingest.add_argument('paths', nargs='+')
+    ingest.add_argument('--symbol', help="series name (default: derived from the file name, "
+                                         "as load_merged does)")
+
+    sub.add_parser('info', help="list stored series")
+    args = parser.parse_args(argv)
+
+    store = MarketStore(args.root, args.partition)
+    if args.command == 'ingest':
+        ingest_csv = ingest_tvl_csv if args.kind == 'tvl' else ingest_kline_csv
+        for path in args.paths:
+            symbol = args.symbol or series_symbol(path)
+            added = ingest_csv(store, symbol, path)
+            print(f"{path}: +{added} rows -> {args.kind}/{symbol}")
+        return
+
+    for kind in ('tvl', 'kline'):
+        for symbol in store.symbols(kind):
+            meta = store.info(kind, symbol)
+            print(f"{kind}/{symbol}: {meta['rows']} rows, {meta['first']} .. {meta['last']}, "
+                  f"{meta['partitions']} {meta['partition']} partitions, "
+                  f"columns={meta['columns']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+import math
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+# =========================================================
+# 单遍、可合并的绩效统计：收益矩（Welford / Chan 合并）+ 回撤状态 + 交易段
+# =========================================================
+class MetricsAccumulator:
+    """
+    逐 bar（update）或逐块（update_many）累积 Annual Return / Sharpe / Calmar /
+    Max Drawdown / Win Rate / Trade Count，不保留净值曲线；每 bar O(1)。
+    前后相邻的两段可用 merge 合并（a 在前、b 在后），分块、流式、多进程结果可直接拼接。
+
+    trade_rule：
+      'turnover'：调用方逐 bar 给出 trade 标记与 trade_pnl（Level 3/5/6 的口径）
+      'ledger'  ：按仓位段识别交易（与 trade_ledger / Level 4 一致），需要逐 bar 的 position
+    start_peak=1.0 时回撤峰值包含起始净值（资金级回测）；None 时与 pandas cummax 一致。
+    skip_first_return=True 时第一根 bar 不计入 Sharpe（对应 capital.pct_change().dropna()）。
+    """
+
+    def __init__(self, trade_rule='turnover', start_peak=None, skip_first_return=False):
+        if trade_rule not in ('turnover', 'ledger'):
+            raise ValueError(f"unknown trade rule: {trade_rule!r}")
+        self.trade_rule = trade_rule
+        self.skip_first_return = skip_first_return
+        self.bars = 0
+        self.first_date = None
+        self.last_date = None
+        # 收益矩
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 回撤状态（相对本段起点的净值）
+        self.equity = 1.0
+        self.peak = -math.inf if start_peak is None else float(start_peak)
+        self.min_equity = math.inf
+        self.max_drawdown = 0.0
+        # 已结束的交易
+        self.trade_count = 0
+        self.wins = 0
+        # ledger：首段（可能延续上一段的交易）与末段（可能延续到下一段）
+        self.first_pos = 0.0
+        self.first_growth = 1.0
+        self.head = 1.0
+        self.head_closed = False
+        self.head_final = 1.0
+        self.last_pos = 0.0
+        self.tail = 1.0
+
+    def _empty_like(self):
+        return MetricsAccumulator(self.trade_rule)
+
+    # =========================================================
+    # 1. 逐 bar 更新
+    # =========================================================
+    def update(self, ret, date=None, position=0.0, trade=False, trade_pnl=0.0):
+        if ret != ret:
+            ret = 0.0
+        elif self.skip_first_return and self.bars == 0:
+            pass
+        else:
+            self.n += 1
+            delta = ret - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (ret - self.mean)
+
+        g = 1.0 + ret
+        self.equity *= g
+        if self.equity > self.peak:
+            self.peak = self.equity
+        self.max_drawdown = min(self.max_drawdown, self.equity / self.peak - 1.0)
+        self.min_equity = min(self.min_equity, self.equity)
+
+        if self.trade_rule == 'turnover':
+            if trade:
+                self.trade_count += 1
+                self.wins += trade_pnl > 0
+        elif self.bars == 0:
+            self.first_pos = self.last_pos = position
+            self.first_growth = self.head = self.tail = g
+        elif position == self.last_pos:
+            self.tail *= g
+            if not self.head_closed:
+                self.head = self.tail
+        else:
+            # 仓位变化：平仓到空仓时，当日的换手成本仍属于上一笔
+            final = self.tail * (g if position == 0 else 1.0)
+            if not self.head_closed:
+                self.head_closed = True
+                self.head_final = final
+            elif self.last_pos != 0:
+                self._close(final)
+            self.last_pos = position
+            self.tail = g
+
+        if self.bars == 0:
+            self.first_date = date
+        self.last_date = date
+        self.bars += 1
+        return self
+
+    def _close(self, growth):
+        self.trade_count += 1
+        self.wins += growth > 1.0
+
+    # =========================================================
+    # 2. 逐块更新：块内向量化得到摘要，再与已有状态合并
+    # =========================================================
+    def update_many(self, returns, dates=None, positions=None, trade=None, trade_pnl=None):
+        ret = np.asarray(returns, dtype=np.float64)
+        if len(ret) == 0:
+            return self
+        chunk = self._empty_like()
+        chunk.bars = len(ret)
+        if dates is not None:
+            chunk.first_date, chunk.last_date = dates[0], dates[-1]
+
+        moments = ret[1:] if self.skip_first_return and self.bars == 0 else ret
+        moments = moments[np.isfinite(moments)]
+        chunk.n = len(moments)
+        if chunk.n:
+            chunk.mean = moments.mean()
+            chunk.m2 = float(((moments - chunk.mean) ** 2).sum())
+
+        growth = 1.0 + np.nan_to_num(ret, nan=0.0)
+        equity = np.cumprod(growth)
+        peak = np.maximum.accumulate(equity)
+        chunk.equity = equity[-1]
+        chunk.peak = peak[-1]
+        chunk.min_equity = equity.min()
+        chunk.max_drawdown = min(0.0, (equity / peak - 1.0).min())
+
+        if self.trade_rule == 'turnover':
+            if trade is not None:
+                trade = np.asarray(trade, dtype=bool)
+                chunk.trade_count = int(trade.sum())
+                chunk.wins = int((np.asarray(trade_pnl)[trade] > 0).sum())
+        else:
+            pos = np.asarray(positions, dtype=np.float64)
+            starts = np.flatnonzero(np.concatenate(([True], pos[1:] != pos[:-1])))
+            run_growth = np.multiply.reduceat(growth, starts)
+            run_pos = pos[starts]
+            # 第 k 段在第 k+1 段起点结束；平到空仓时含当日成本
+            final = run_growth[:-1] * np.where(run_pos[1:] == 0, growth[starts[1:]], 1.0)
+            inner = slice(1, len(starts) - 1)
+            held = run_pos[inner] != 0
+            chunk.trade_count = int(held.sum())
+            chunk.wins = int((final[inner][held] > 1.0).sum())
+            chunk.first_pos, chunk.first_growth = run_pos[0], growth[0]
+            chunk.head = run_growth[0]
+            chunk.head_closed = len(starts) > 1
+            chunk.head_final = final[0] if chunk.head_closed else 1.0
+            chunk.last_pos, chunk.tail = run_pos[-1], run_growth[-1]
+
+        merged = self.merge(chunk)
+        self.__dict__.update(merged.__dict__)
+        return self
+
+    # =========================================================
+    # 3. 合并：a（在前）+ b（在后）
+    # =========================================================
+    def merge(self, other):
+        a, b = self, other
+        if b.bars == 0:
+            return a._copy()
+        if a.bars == 0:
+            out = b._copy()
+            out.skip_first_return = a.skip_first_return
+            if math.isfinite(a.peak):
+                # 起始峰值（start_peak）作用于 b 的整段
+                out.peak = max(a.peak, b.peak)
+                out.max_drawdown = min(b.max_drawdown, b.min_equity / a.peak - 1.0)
+            return out
+
+        out = a._copy()
+        out.bars = a.bars + b.bars
+        out.last_date = b.last_date
+
+        n = a.n + b.n
+        if n:
+            delta = b.mean - a.mean
+            out.mean = a.mean + delta * b.n / n
+            out.m2 = a.m2 + b.m2 + delta * delta * a.n * b.n / n
+        out.n = n
+
+        # b 段内任一时刻的回撤 = min(相对 a 的峰值, 相对 b 自身的峰值)
+        out.equity = a.equity * b.equity
+        out.peak = max(a.peak, a.equity * b.peak)
+        out.min_equity = min(a.min_equity, a.equity * b.min_equity)
+        out.max_drawdown = min(a.max_drawdown, b.max_drawdown,
+                               a.equity * b.min_equity / a.peak - 1.0)
+
+        out.trade_count = a.trade_count + b.trade_count
+        out.wins = a.wins + b.wins
+        if a.trade_rule == 'ledger':
+            _merge_runs(a, b, out)
+        return out
+
+    def _copy(self):
+        out = MetricsAccumulator.__new__(MetricsAccumulator)
+        out.__dict__.update(self.__dict__)
+        return out
+
+    # =========================================================
+    # 4. 输出（键名与 StrategyPipeline.metrics 一致）
+    # =========================================================
+    def result(self, periods_per_year=365):
+        total_days = (pd.Timestamp(self.last_date) - pd.Timestamp(self.first_date)) \
+            / pd.Timedelta(days=1)
+        annual_return = self.equity ** (365 / total_days) - 1
+
+        std = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe_ratio = np.float64(self.mean) / std * np.sqrt(periods_per_year)
+        max_drawdown = self.max_drawdown
+        calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else np.nan
+
+        trade_count, wins = self.trade_count, self.wins
+        if self.trade_rule == 'ledger' and self.bars:
+            # 首段从第 0 根开始持仓即为一笔；末段未平仓的交易也计入（exit_type = 'open'）
+            if self.first_pos != 0:
+                trade_count += 1
+                wins += (self.head_final if self.head_closed else self.head) > 1.0
+            if self.head_closed and self.last_pos != 0:
+                trade_count += 1
+                wins += self.tail > 1.0
+
+        return {
+            'annual_return': annual_return,
+            'sharpe_ratio': sharpe_ratio,
+            'calmar_ratio': calmar_ratio,
+            'max_drawdown': max_drawdown,
+            'win_rate': wins / trade_count if trade_count else np.nan,
+            'trade_count': int(trade_count),
+        }
+
+
+def _merge_runs(a, b, out):
+    """拼接交易段：a 的末段与 b 的首段同仓位则是同一笔，否则 a 的末段在 b 的第一根平仓。"""
+    same = b.first_pos == a.last_pos
+    if same:
+        growth = a.tail * (b.head_final if b.head_closed else b.head)
+        if b.head_closed and a.last_pos != 0 and a.head_closed:
+            out._close(growth)
+    else:
+        final = a.tail * (b.first_growth if b.first_pos == 0 else 1.0)
+        if a.head_closed and a.last_pos != 0:
+            out._close(final)
+        if b.head_closed and b.first_pos != 0:
+            out._close(b.head_final)
+
+    # 首段：a 只有一段时向后延伸
+    if not a.head_closed:
+        if same:
+            out.head = a.head * b.head
+            out.head_closed = b.head_closed
+            out.head_final = a.head * b.head_final if b.head_closed else 1.0
+        else:
+            out.head_closed = True
+            out.head_final = final
+
+    # 末段：b 只有一段时可能延续 a 的末段
+    out.last_pos = b.last_pos
+    if b.head_closed:
+        out.tail = b.tail
+    else:
+        out.tail = a.tail * b.head if same else b.head
+
+
+def merge_all(accumulators):
+    """按时间顺序合并多个分段的累积器。"""
+    return reduce(MetricsAccumulator.merge, accumulators)
@@ -0,0 +1,135 @@
+from collections import deque
+import math
+
+import numpy as np
+import pandas as pd
+
+from pntvl_robust import RollingMedianMAD
+
+
+# =========================================================
+# 1. 滑动窗口 Welford：O(1) 增删，维护均值与平方偏差和
+# =========================================================
+class RollingWelford:
+    """固定窗口的在线均值 / 样本标准差，窗口内含 NaN 时与 pandas 一样返回 NaN。"""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque()
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._since_resync = 0
+
+    def _add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        if self.n == 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.n -= 1
+        delta = x - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (x - self.mean)
+
+    def _resync(self):
+        # 每 window 步用缓冲区重算一次，抵消浮点漂移（摊还仍为 O(1)）
+        finite = [v for v in self.buffer if math.isfinite(v)]
+        self.n = len(finite)
+        self.mean = math.fsum(finite) / self.n if self.n else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in finite)
+        self._since_resync = 0
+
+    def update(self, x):
+        self.buffer.append(x)
+        if math.isfinite(x):
+            self._add(x)
+        if len(self.buffer) > self.window:
+            old = self.buffer.popleft()
+            if math.isfinite(old):
+                self._remove(old)
+
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self._resync()
+
+    @property
+    def ready(self):
+        return self.n == self.window
+
+    @property
+    def std(self):
+        if not self.ready or self.n < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+    def zscore(self, x):
+        if not self.ready or not math.isfinite(x):
+            return math.nan
+        std = self.std
+        if std == 0:
+            return math.nan if x == self.mean else math.copysign(math.inf, x - self.mean)
+        return (x - self.mean) / std
+
+
+# =========================================================
+# 2. 在线背离信号：每来一根 (tvl_usd, close) 只算最新一行
+# =========================================================
+class OnlineDivergence:
+    """Level 3–6 的 divergence_z / signal / T+1 position 在线版本（robust=True 用中位数 / MAD）。"""
+
+    def __init__(self, window=75, z_threshold=1.1, max_position=1.0, robust=False):
+        self.z_threshold = z_threshold
+        self.max_position = max_position
+        self.stats = RollingMedianMAD(window) if robust else RollingWelford(window)
+        self.prev_price = math.nan
+        self.prev_pntvl = math.nan
+        self.prev_signal = 0
+
+    def update(self, tvl_usd, close):
+        pntvl = np.round(tvl_usd / close, 2)
+        eth_return = close / self.prev_price - 1
+        pntvl_change = pntvl / self.prev_pntvl - 1
+        divergence = eth_return - pntvl_change
+
+        self.stats.update(divergence)
+        divergence_z = self.stats.zscore(divergence)
+
+        signal = 0
+        if eth_return < 0 and pntvl_change > 0 and divergence_z < -self.z_threshold:
+            signal = 1
+        elif eth_return > 0 and pntvl_change < 0 and divergence_z > self.z_threshold:
+            signal = -1
+
+        # T+1：今天的仓位来自昨天的信号
+        position = self.prev_signal * self.max_position
+
+        self.prev_price = close
+        self.prev_pntvl = pntvl
+        self.prev_signal = signal
+
+        return {
+            'price_neutral_tvl_2dec': pntvl,
+            'eth_return': eth_return,
+            'pntvl_change': pntvl_change,
+            'divergence_strength': divergence,
+            'divergence_z': divergence_z,
+            'signal': signal,
+            'position': position,
+        }
+
+    @property
+    def next_position(self):
+        """下一根 bar 的目标仓位。"""
+        return self.prev_signal * self.max_position
+
+
+def replay(df, window=75, z_threshold=1.1, max_position=1.0, robust=False):
+    """把合并后的 TVL / 价格表逐行喂给在线计算器，用于与批量 pandas 结果对账。"""
+    calc = OnlineDivergence(window, z_threshold, max_position, robust)
+    rows = [calc.update(t, p) for t, p in zip(df['tvl_usd'], df['eth_price'])]
+    return pd.DataFrame(rows, index=df.index)
@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_data import bar_periods_per_year, load_merged, span_days
+from pntvl_rolling import compensated_cumsum, window_sum
+
+PERFORMANCE_LABELS = ['Annual Return', 'Sharpe Ratio', 'Calmar Ratio',
+                      'Max Drawdown', 'Win Rate', 'Trade Count']
+
+
+# =========================================================
+# 1. 组装面板：多条链的 (tvl, price) 按日期对齐成 (days × assets)
+# =========================================================
+def align_panel(frames):
+    """
+    frames = {asset: merged df}，按日期并集外连接成 (days × assets)。
+    某资产在某天没有 bar 时该格为 NaN；panel_backtest 会跳过这些格，
+    每个资产仍按自己的 bar 序列计算（与单资产 StrategyPipeline 一致）。
+    """
+    frames = {a: f.set_index('date') for a, f in frames.items()}
+    tvl = pd.DataFrame({a: f['tvl_usd'] for a, f in frames.items()}).sort_index()
+    price = pd.DataFrame({a: f['eth_price'] for a, f in frames.items()}).reindex(tvl.index)
+    return tvl.index, list(tvl.columns), tvl.to_numpy(), price.to_numpy()
+
+
+def load_panel(sources, **load_kwargs):
+    """sources = {asset: (tvl_path, price_path)}，返回 dates, assets, tvl, price。"""
+    return align_panel({asset: load_merged(tvl_path, price_path, **load_kwargs)
+                        for asset, (tvl_path, price_path) in sources.items()})
+
+
+def rolling_zscore_panel(x, window):
+    """按列滑动 Z-score（与 pandas rolling(window) 对齐：窗口内必须全部有效）。"""
+    valid = np.isfinite(x)
+    shift = np.nanmean(np.where(valid, x, np.nan), axis=0)
+    shift = np.where(np.isfinite(shift), shift, 0.0)
+    xc = np.where(valid, x - shift, 0.0)
+
+    pad = np.zeros((1, x.shape[1]))
+    cs = compensated_cumsum(xc)
+    cs2 = compensated_cumsum(xc * xc)
+    cnt = np.concatenate((pad, np.cumsum(valid, axis=0)))
+
+    s = window_sum(cs, window)
+    s2 = window_sum(cs2, window)
+    c = cnt[window:] - cnt[:-window]
+
+    z = np.full(x.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s / window
+        var = np.maximum((s2 - s * mean) / (window - 1), 0.0)
+        zz = (xc[window - 1:] - mean) / np.sqrt(var)
+    zz[(c != window) | ~valid[window - 1:]] = np.nan
+    z[window - 1:] = zz
+    return z
+
+
+def _pack(present):
+    """每列把有 bar 的行稳定地移到顶部：返回行序 order（take/put_along_axis 用）与打包后的有效掩码。"""
+    order = np.argsort(~present, axis=0, kind='stable')
+    packed = np.arange(present.shape[0])[:, None] < present.sum(axis=0)
+    return order, packed
+
+
+def _unpack(x, order):
+    out = np.empty_like(x)
+    np.put_along_axis(out, order, x, axis=0)
+    return out
+
+
+def _ffill(x, present, fill):
+    """缺 bar 的格沿日期向前填充；资产首个 bar 之前填 fill。"""
+    rows = np.arange(x.shape[0])[:, None]
+    last = np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+    out = np.take_along_axis(x, np.maximum(last, 0), axis=0)
+    out[last < 0] = fill
+    return out
+
+
+# =========================================================
+# 2. 批量回测：特征 / 信号 / T+1 / 成本 / 资金曲线，全部沿 assets 轴向量化
+# =========================================================
+def panel_backtest(tvl, price, window=75, z_threshold=1.1, max_position=1.0,
+                   fee_rate=0.0005, slippage_rate=0.0002, low_memory=False):
+    """
+    tvl / price 中的 NaN 格视为该资产当天没有 bar：计算前每列把有 bar 的行移到顶部，
+    收益、滑动窗口与 T+1 都沿资产自己的 bar 序列，结果再放回日期并集上。
+    缺 bar 的格：仓位 / 资金曲线 / 回撤沿用上一个 bar，收益与换手为 0，特征为 NaN；
+    result['present'] 标出有 bar 的格。
+
+    low_memory=True 时仍按 float64 计算，返回前丢弃中间量（pntvl_change /
+    divergence_strength / turnover）并把其余浮点结果存为 float32。
+    """
+    tvl = np.asarray(tvl, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+    cost_rate = fee_rate + slippage_rate
+
+    present = np.isfinite(tvl) & np.isfinite(price)
+    order, packed = _pack(present)
+    tvl = np.where(packed, np.take_along_axis(tvl, order, axis=0), np.nan)
+    price = np.where(packed, np.take_along_axis(price, order, axis=0), np.nan)
+
+    pntvl = np.round(tvl / price, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eth_return = np.full(price.shape, np.nan)
+        eth_return[1:] = price[1:] / price[:-1] - 1
+        pntvl_change = np.full(pntvl.shape, np.nan)
+        pntvl_change[1:] = pntvl[1:] / pntvl[:-1] - 1
+    divergence = eth_return - pntvl_change
+    z = rolling_zscore_panel(divergence, window)
+
+    signal = np.zeros(price.shape, dtype=np.int8)
+    signal[(eth_return < 0) & (pntvl_change > 0) & (z < -z_threshold)] = 1
+    signal[(eth_return > 0) & (pntvl_change < 0) & (z > z_threshold)] = -1
+
+    position = np.zeros(price.shape)
+    position[1:] = signal[:-1] * max_position
+    position[~packed] = 0.0
+    turnover = np.abs(np.diff(position, axis=0, prepend=0.0))
+
+    strategy_return = np.nan_to_num(position * eth_return - turnover * cost_rate, nan=0.0)
+    equity_curve = np.cumprod(1 + strategy_return, axis=0)
+    equity_peak = np.maximum.accumulate(equity_curve, axis=0)
+    drawdown = equity_curve / equity_peak - 1
+
+    packed_result = {
+        'eth_return': eth_return,
+        'pntvl_change': pntvl_change,
+        'divergence_strength': divergence,
+        'divergence_z': z,
+        'signal': signal,
+        'position': position,
+        'turnover': np.where(packed, turnover, 0.0),
+        'strategy_return': strategy_return,
+        'equity_curve': equity_curve,
+        'drawdown': drawdown,
+    }
+    result = {k: _unpack(v, order) for k, v in packed_result.items()}
+    for k, fill in (('position', 0.0), ('equity_curve', 1.0), ('drawdown', 0.0)):
+        result[k] = _ffill(result[k], present, fill)
+    result['present'] = present
+
+    if low_memory:
+        result = {k: v if v.dtype in (np.int8, np.bool_) else v.astype(np.float32)
+                  for k, v in result.items()
+                  if k not in ('pntvl_change', 'divergence_strength', 'turnover')}
+    return result
+
+
+def _panel_trades(position, strategy_return):
+    """按列切分交易段（一笔 = 一段同向同仓位持仓），返回每个资产的笔数与胜率。"""
+    t, n = position.shape
+    pad = np.zeros((1, n))
+    # 每列前补一行空仓，展平后交易段不会跨列
+    pos = np.concatenate((pad, position)).T.ravel()
+    equity = np.cumprod(1 + np.concatenate((pad, strategy_return)), axis=0).T.ravel()
+    asset = np.repeat(np.arange(n), t + 1)
+
+    prev = np.concatenate(([0.0], pos[:-1]))
+    change_idx = np.flatnonzero(pos != prev)
+    starts = change_idx[pos[change_idx] != 0]
+
+    nxt = np.searchsorted(change_idx, starts, side='right')
+    has_next = nxt < len(change_idx)
+    end_excl = np.where(has_next, change_idx[np.minimum(nxt, len(change_idx) - 1)], len(pos))
+    # 平仓到空仓时，次日的换手成本属于这笔交易（与 trade_ledger 一致）
+    to_flat = has_next & (pos[np.minimum(end_excl, len(pos) - 1)] == 0) \
+        & (asset[np.minimum(end_excl, len(pos) - 1)] == asset[starts])
+    pnl_end = np.where(to_flat, end_excl, end_excl - 1)
+    pnl = equity[pnl_end] / equity[starts - 1] - 1
+
+    trade_count = np.bincount(asset[starts], minlength=n)
+    wins = np.bincount(asset[starts], weights=(pnl > 0).astype(np.float64), minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        win_rate = wins / trade_count
+    return trade_count, win_rate
+
+
+# =========================================================
+# 3. 每个资产的绩效表（与 Level 4 打印项一致）
+# =========================================================
+def panel_performance(dates, assets, result, periods_per_year=None):
+    """年化因子、区间天数与 Sharpe 都只取各资产自己有 bar 的日期。"""
+    equity_curve = result['equity_curve']
+    strategy_return = result['strategy_return']
+    present = result.get('present')
+    if present is None:
+        present = np.ones(equity_curve.shape, dtype=bool)
+
+    dates = pd.DatetimeIndex(dates)
+    own = [dates[present[:, j]] for j in range(present.shape[1])]
+    if periods_per_year is None:
+        periods_per_year = np.array([bar_periods_per_year(d) for d in own])
+    total_days = np.array([span_days(d) for d in own])
+
+    max_drawdown = result['drawdown'].min(axis=0)
+    annual_return = equity_curve[-1] ** (365 / total_days) - 1
+
+    r = np.where(present, strategy_return, np.nan)
+    std = np.nanstd(r, axis=0, ddof=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe_ratio = np.nanmean(r, axis=0) / std * np.sqrt(periods_per_year)
+        calmar_ratio = np.where(max_drawdown != 0, annual_return / np.abs(max_drawdown), np.nan)
+
+    trade_count, win_rate = _panel_trades(result['position'], strategy_return)
+
+    return pd.DataFrame({
+        'Annual Return': annual_return,
+        'Sharpe Ratio': sharpe_ratio,
+        'Calmar Ratio': calmar_ratio,
+        'Max Drawdown': max_drawdown,
+        'Win Rate': win_rate,
+        'Trade Count': trade_count,
+    }, index=pd.Index(assets, name='asset'))
+
+
+def format_performance(row, title="Strategy Performance Level 4"):
+    return "\n".join([
+        f"\n========== {title} ==========",
+        f"Annual Return    : {row['Annual Return']:.2%}",
+        f"Sharpe Ratio     : {row['Sharpe Ratio']:.2f}",
+        f"Calmar Ratio     : {row['Calmar Ratio']:.2f}",
+        f"Max Drawdown     : {row['Max Drawdown']:.2%}",
+        f"Win Rate         : {row['Win Rate']:.2%}",
+        f"Trade Count      : {int(row['Trade Count'])}",
+        "==========================================\n",
+    ])
+
+
+def print_panel_performance(table):
+    for asset, row in table.iterrows():
+        print(format_performance(row, title=f"Strategy Performance Level 4 [{asset}]"))
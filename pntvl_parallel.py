@@ -0,0 +1,138 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from pntvl_profile import stage
+from pntvl_regime import filter_signal, ma_regime_matrix
+from pntvl_rolling import rolling_zscore_matrix
+from pntvl_sweep import sharpe_from_returns, signal_grid, strategy_returns_grid
+
+SHARED_COLUMNS = ['eth_return', 'pntvl_change', 'divergence_strength', 'eth_price']
+PARAM_LEVELS = ['cost_rate', 'max_position', 'ma_window', 'dd_threshold', 'window']
+
+
+# =========================================================
+# 1. 共享内存：主进程写一次，worker 只读映射
+# =========================================================
+def _to_shared(arrays):
+    blocks, meta = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+        blocks.append(shm)
+        meta[name] = (shm.name, arr.shape)
+    return blocks, meta
+
+
+_WORKER = {}
+
+
+def _init_worker(meta, z_values, periods_per_year, ma_windows, mode):
+    for name, (shm_name, shape) in meta.items():
+        # worker 与主进程共用 resource_tracker，unlink 统一由主进程负责
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _WORKER[name] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        _WORKER.setdefault('_blocks', []).append(shm)
+    _WORKER['z_values'] = z_values
+    _WORKER['periods_per_year'] = periods_per_year
+    _WORKER['skip_first'] = mode == 'capital'
+    _WORKER['z_cache'] = {}
+    # 所有 ma_window 的 regime 一次前缀和算完（ma_windows × days，int8）
+    windows = [m for m in ma_windows if m]
+    regimes = ma_regime_matrix(_WORKER['eth_price'], windows) if windows else []
+    _WORKER['regime'] = dict(zip(windows, regimes))
+
+
+# =========================================================
+# 2. 单个分片：(window, 扩展参数) → 一整行 z 阈值的 Sharpe
+# =========================================================
+def _run_shard(key):
+    cost_rate, max_position, ma_window, dd_threshold, window = key
+    w = _WORKER
+
+    z_row = w['z_cache'].get(window)
+    if z_row is None:
+        z_row = rolling_zscore_matrix(w['divergence_strength'], [window])
+        w['z_cache'][window] = z_row
+
+    signal = signal_grid(w['eth_return'], w['pntvl_change'], z_row, w['z_values'])[0]
+
+    # Level 6 Regime Filter：只做与 MA 方向一致的信号
+    if ma_window:
+        signal = filter_signal(signal, w['regime'][ma_window])
+
+    strategy_return = strategy_returns_grid(
+        signal, w['eth_return'],
+        max_position=max_position,
+        cost_rate=cost_rate,
+        dd_threshold=dd_threshold,
+    )
+    return key, sharpe_from_returns(strategy_return, w['periods_per_year'],
+                                    skip_first=w['skip_first'])
+
+
+# =========================================================
+# 3. 并行扫描入口
+# =========================================================
+def parallel_sweep(df_base, window_values, z_values,
+                   cost_rates=(0.0,), max_positions=(1.0,),
+                   ma_windows=(None,), dd_thresholds=(None,),
+                   periods_per_year=365, max_workers=None, mode='compound'):
+    """
+    把参数网格分片到进程池，输入序列走 shared_memory 而不是 pickle DataFrame。
+    返回热力图：MultiIndex (cost_rate, max_position, ma_window, dd_threshold, window) × z，
+    ma_window / dd_threshold 为 None（索引中显示为 NaN）表示不启用该规则；
+    heatmap_at 取出其中一组扩展参数，得到与 sweep_heatmap 相同的 window × z 表。
+    mode 为 Sharpe 口径，同 StrategyPipeline：'compound'（Level 3 / 4，含首行，
+    默认参数下与 sweep_heatmap 逐位一致）或 'capital'（Level 5 / 6，去掉首行）。
+    """
+    if mode not in ('compound', 'capital'):
+        raise ValueError(f"unknown mode: {mode!r}")
+    z_values = np.asarray(z_values, dtype=np.float64)
+    keys = list(itertools.product(cost_rates, max_positions, ma_windows,
+                                  dd_thresholds, window_values))
+
+    heatmap = pd.DataFrame(
+        np.nan,
+        index=pd.MultiIndex.from_tuples(keys, names=PARAM_LEVELS),
+        columns=z_values,
+    )
+
+    blocks, meta = _to_shared({c: df_base[c].to_numpy() for c in SHARED_COLUMNS})
+    try:
+        with stage('sweep.parallel', shards=len(keys)), ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(meta, z_values, periods_per_year, ma_windows, mode),
+        ) as pool:
+            # 按 window 排序提交，同一 worker 更容易命中 z_cache
+            order = sorted(range(len(keys)), key=lambda i: keys[i][-1])
+            futures = {pool.submit(_run_shard, keys[i]): i for i in order}
+            for fut in as_completed(futures):
+                _, row = fut.result()
+                heatmap.iloc[futures[fut]] = row
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    return heatmap
+
+
+def heatmap_at(heatmap, cost_rate=0.0, max_position=1.0, ma_window=None, dd_threshold=None):
+    """parallel_sweep 结果中一组扩展参数的切片：index = window，columns = z（sweep_heatmap 的结构）。"""
+    keep = np.ones(len(heatmap), dtype=bool)
+    for name, value in zip(PARAM_LEVELS[:-1], (cost_rate, max_position, ma_window, dd_threshold)):
+        level = heatmap.index.get_level_values(name)
+        keep &= level.isna() if value is None else np.asarray(level == value)
+    if not keep.any():
+        raise KeyError(f"no cells for cost_rate={cost_rate}, max_position={max_position}, "
+                       f"ma_window={ma_window}, dd_threshold={dd_threshold}")
+    part = heatmap[keep]
+    return pd.DataFrame(part.to_numpy(), index=list(part.index.get_level_values('window')),
+                        columns=heatmap.columns)
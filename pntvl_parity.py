@@ -0,0 +1,94 @@
+"""
+对账：逐个运行 Level 1–6 脚本（不画图），把脚本里的 df 与绩效变量
+和 StrategyPipeline 的结果逐列比较。
+
+用法：在放有 CSV 的目录下运行  python pntvl_parity.py
+"""
+import contextlib
+import io
+import os
+import runpy
+import sys
+
+import numpy as np
+
+import pntvl_plot
+from pntvl_data import load_merged
+from pntvl_strategy import LEVEL_PARAMS, StrategyPipeline
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    1: "Price Neutral TVL Level 1.py",
+    2: "Price Neutral TVL Level 2.py",
+    3: "Price Neutral TVL Level 3.py",
+    4: "Price Neutral TVL Level 4.py",
+    5: "Price Neutral TVL Level 5.py",
+    6: "Price Neutral TVL Level 6.py",
+}
+
+METRICS = ['annual_return', 'sharpe_ratio', 'calmar_ratio',
+           'max_drawdown', 'win_rate', 'trade_count']
+
+
+def run_script(level):
+    mode = pntvl_plot.PLOT_MODE
+    pntvl_plot.PLOT_MODE = 'none'
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return runpy.run_path(os.path.join(HERE, SCRIPTS[level]), run_name='__main__')
+    finally:
+        pntvl_plot.PLOT_MODE = mode
+
+
+def _close(a, b, rtol=1e-9, atol=1e-12):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return a.shape == b.shape and np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+
+
+def check_level(level, rtol=1e-9):
+    """返回不一致项列表，空列表表示完全对齐。"""
+    g = run_script(level)
+    script_df = g['df']
+
+    pipeline = StrategyPipeline(load_merged(g['tvl_path'], g['price_path'],
+                                            start=g.get('start'), end=g.get('end'),
+                                            join=g.get('join', 'date'),
+                                            tvl_lag=g.get('tvl_lag'),
+                                            source=g.get('source', 'csv')))
+    params = dict(LEVEL_PARAMS.get(level, {}))
+    trade_rule = params.pop('trade_rule', 'turnover')
+    lib_df = pipeline.frame(trade_rule=trade_rule, **params) if params else pipeline.frame()
+
+    mismatches = []
+    for col in script_df.columns:
+        if col not in lib_df.columns or script_df[col].dtype == object:
+            continue
+        if col == 'date':
+            ok = (script_df[col].to_numpy() == lib_df[col].to_numpy()).all()
+        else:
+            ok = _close(script_df[col], lib_df[col], rtol=rtol)
+        if not ok:
+            mismatches.append(col)
+
+    if params:
+        metrics = pipeline.metrics(trade_rule=trade_rule, **params)
+        for name in METRICS:
+            if name in g and not _close(g[name], metrics[name], rtol=rtol):
+                mismatches.append(name)
+
+    return mismatches
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, HERE)
+    failed = False
+    for level in SCRIPTS:
+        try:
+            bad = check_level(level)
+        except Exception as exc:  # 脚本本身运行失败
+            bad = [f"{type(exc).__name__}: {exc}"]
+        failed |= bool(bad)
+        print(f"Level {level}: {'OK' if not bad else 'MISMATCH ' + ', '.join(bad)}")
+    sys.exit(1 if failed else 0)
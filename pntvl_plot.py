@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+
+from pntvl_profile import stage
+
+# 输出方式：html（默认，写到 PLOT_DIR，不打开浏览器）/ png / browser / none（脚本跳过整个画图段）
+PLOT_MODE = os.environ.get('PNTVL_PLOT', 'html')
+PLOT_DIR = os.environ.get('PNTVL_PLOT_DIR', 'plots')
+MAX_POINTS = 4000
+
+
+def plots_enabled(mode=None):
+    """脚本的画图段包在 if plots_enabled(): 里，none 时不建图、不降采样。"""
+    return (mode or PLOT_MODE) != 'none'
+
+
+# =========================================================
+# 1. 降采样：min/max（M4，完全向量化）与 LTTB
+# =========================================================
+def _numeric(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[s]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def minmax_indices(y, n_out):
+    """每个桶保留首 / 尾 / 最小 / 最大四个点，峰谷与回撤低点不会被抹平。"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = max(1, n_out // 4)
+    size = -(-n // buckets)
+    pad = buckets * size - n
+
+    lo = np.concatenate((np.where(np.isnan(y), np.inf, y), np.full(pad, np.inf)))
+    hi = np.concatenate((np.where(np.isnan(y), -np.inf, y), np.full(pad, -np.inf)))
+    offset = np.arange(buckets) * size
+    idx = np.concatenate((
+        offset,
+        np.minimum(offset + size - 1, n - 1),
+        offset + lo.reshape(buckets, size).argmin(axis=1),
+        offset + hi.reshape(buckets, size).argmax(axis=1),
+    ))
+    return np.unique(np.minimum(idx, n - 1))
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets：每桶选与前一选中点、后一桶均值围成三角形面积最大的点。"""
+    x = _numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:nxt_end].mean() if nxt_end > end else x[-1]
+        avg_y = np.nanmean(y[end:nxt_end]) if nxt_end > end else y[-1]
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        out[i + 1] = prev
+    return np.unique(out)
+
+
+def decimate(x, y, max_points=MAX_POINTS, method='minmax'):
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= max_points:
+        return x, y
+    if method == 'lttb':
+        idx = lttb_indices(x, y, max_points)
+    elif method == 'minmax':
+        idx = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"unknown decimation method: {method!r}")
+    return x[idx], y[idx]
+
+
+# =========================================================
+# 2. Trace：折线先降采样，散点标记用 WebGL
+# =========================================================
+def line_trace(x, y, max_points=MAX_POINTS, method='minmax', **kwargs):
+    import plotly.graph_objects as go
+
+    with stage('plot.decimate', points=len(y)):
+        x, y = decimate(x, y, max_points, method)
+    return go.Scatter(x=x, y=y, mode='lines', **kwargs)
+
+
+def marker_trace(x, y, **kwargs):
+    import plotly.graph_objects as go
+
+    return go.Scattergl(x=np.asarray(x), y=np.asarray(y), mode='markers', **kwargs)
+
+
+# =========================================================
+# 3. 输出：浏览器 / 静态 HTML / PNG / 不输出
+# =========================================================
+def render(fig, name, mode=None, out_dir=None):
+    """按 PNTVL_PLOT（或 mode）输出图表，返回写出的文件路径（browser / none 返回 None）。"""
+    mode = mode or PLOT_MODE
+    if mode == 'none':
+        return None
+    with stage('plot.render', figure=name, mode=mode):
+        return _render(fig, name, mode, out_dir)
+
+
+def _render(fig, name, mode, out_dir):
+    if mode == 'browser':
+        fig.show()
+        return None
+
+    out_dir = out_dir or PLOT_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    if mode == 'png':
+        path = os.path.join(out_dir, f"{name}.png")
+        try:
+            fig.write_image(path)   # 需要 kaleido
+            return path
+        except (ImportError, ValueError, RuntimeError) as exc:
+            print(f"PNG export unavailable ({exc}); writing HTML instead")
+    elif mode != 'html':
+        raise ValueError(f"unknown plot mode: {mode!r}")
+
+    path = os.path.join(out_dir, f"{name}.html")
+    # plotly.js 走 CDN，单个文件只有数据本身
+    fig.write_html(path, include_plotlyjs='cdn', auto_open=False)
+    return path
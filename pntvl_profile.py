@@ -0,0 +1,264 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource：只记录耗时与 tracemalloc 峰值
+    resource = None
+
+# PNTVL_PROFILE：空 = 关闭；1 = 写到 PROFILE_DIR/<脚本名>_<时间>.json；其它值 = 输出文件路径
+# PNTVL_PROFILE_MEMORY=1 时额外用 tracemalloc 统计每个阶段的分配峰值（有一定开销）
+PROFILE_DIR = os.environ.get('PNTVL_PROFILE_DIR', 'profiles')
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def _maxrss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+# =========================================================
+# 1. 记录器：嵌套阶段 → Chrome trace 的 "X"（complete）事件
+# =========================================================
+class _Stage:
+    __slots__ = ('profiler', 'name', 'args', 'start', 'peak')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.profiler._begin(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._end(self)
+        return False
+
+
+class Profiler:
+    """
+    stage(name) 为上下文管理器（库函数内部用）；checkpoint(name) 结束上一个检查点并开始新的，
+    适合脚本按段落打点。关闭时两者都直接返回，不计时。
+    """
+
+    def __init__(self, enabled=False, memory=False, run_name=None):
+        self.enabled = enabled
+        self.memory = memory
+        run_name = run_name or os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        self.run_name = run_name.replace(' ', '_')
+        self.events = []
+        self._stack = []
+        self._checkpoint = None
+        self._t0 = time.perf_counter_ns()
+        self.started = time.time()
+        if enabled and memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, **args):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, args)
+
+    def checkpoint(self, name, **args):
+        if not self.enabled:
+            return
+        if self._checkpoint is not None:
+            self._end(self._checkpoint)
+        self._checkpoint = _Stage(self, name, args)
+        self._begin(self._checkpoint)
+
+    def _begin(self, st):
+        if self.memory:
+            # 外层阶段先记下到目前为止的峰值，再为内层重置
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            st.peak = current
+        self._stack.append(st)
+        st.start = time.perf_counter_ns()
+
+    def _end(self, st):
+        end = time.perf_counter_ns()
+        if st in self._stack:
+            self._stack.remove(st)
+        if st is self._checkpoint:
+            self._checkpoint = None
+
+        args = dict(st.args)
+        if self.memory:
+            peak = max(st.peak, tracemalloc.get_traced_memory()[1])
+            args['peak_bytes'] = peak
+            if self._stack:
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+        rss = _maxrss_bytes()
+        if rss is not None:
+            args['maxrss_bytes'] = rss
+
+        self.events.append({
+            'name': st.name,
+            'cat': st.name.split('.')[0],
+            'ph': 'X',
+            'ts': (st.start - self._t0) / 1000,
+            'dur': (end - st.start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+        if rss is not None:
+            self.events.append({'name': 'memory', 'ph': 'C', 'ts': (end - self._t0) / 1000,
+                                'pid': os.getpid(), 'args': {'maxrss_mb': rss / 2**20}})
+
+    def close(self):
+        while self._stack:
+            self._end(self._stack[-1])
+
+    # =========================================================
+    # 2. 汇总与输出
+    # =========================================================
+    def summary(self):
+        """按阶段名汇总：调用次数、总耗时（秒）、峰值内存。"""
+        out = {}
+        for ev in self.events:
+            if ev['ph'] != 'X':
+                continue
+            row = out.setdefault(ev['name'], {'calls': 0, 'seconds': 0.0})
+            row['calls'] += 1
+            row['seconds'] += ev['dur'] / 1e6
+            for key in ('peak_bytes', 'maxrss_bytes'):
+                if key in ev['args']:
+                    row[key] = max(row.get(key, 0), ev['args'][key])
+        return out
+
+    def to_dict(self):
+        import numpy as np
+        import pandas as pd
+
+        return {
+            'traceEvents': sorted(self.events, key=lambda ev: ev['ts']),
+            'displayTimeUnit': 'ms',
+            'otherData': {
+                'run': self.run_name,
+                'argv': sys.argv,
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+            },
+            'summary': self.summary(),
+        }
+
+    def write(self, path=None):
+        self.close()
+        if path is None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started))
+            path = os.path.join(PROFILE_DIR, f"{self.run_name}_{stamp}_{os.getpid()}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1, default=float)
+        return path
+
+
+# =========================================================
+# 3. 进程级默认记录器（按环境变量开启，退出时自动写盘）
+# =========================================================
+def _from_env():
+    setting = os.environ.get('PNTVL_PROFILE', '')
+    enabled = setting not in ('', '0')
+    prof = Profiler(enabled, memory=os.environ.get('PNTVL_PROFILE_MEMORY', '') not in ('', '0'))
+    if enabled:
+        path = None if setting == '1' else setting
+        atexit.register(lambda: print(f"profile written to {prof.write(path)}", file=sys.stderr))
+    return prof
+
+
+profiler = _from_env()
+
+
+def stage(name, **args):
+    return profiler.stage(name, **args)
+
+
+def checkpoint(name, **args):
+    profiler.checkpoint(name, **args)
+
+
+def enable(path=None, memory=False):
+    """在代码里开启（等价于设置 PNTVL_PROFILE），返回默认记录器。"""
+    global profiler
+    if profiler.enabled:
+        return profiler
+    profiler = Profiler(True, memory=memory)
+    atexit.register(lambda: print(f"profile written to {profiler.write(path)}", file=sys.stderr))
+    return profiler
+
+
+# =========================================================
+# 4. 对比两次运行
+# =========================================================
+def load_profile(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def diff_profiles(before, after):
+    """逐阶段对比耗时与峰值内存，返回 DataFrame（按本次耗时从大到小排序）。"""
+    import pandas as pd
+
+    a = pd.DataFrame(before['summary']).T
+    b = pd.DataFrame(after['summary']).T
+    out = pd.DataFrame({
+        'seconds_before': a.get('seconds'),
+        'seconds_after': b.get('seconds'),
+    })
+    out['ratio'] = out['seconds_after'] / out['seconds_before']
+    for key in ('peak_bytes', 'maxrss_bytes'):
+        if key in a and key in b:
+            out[f"{key}_delta"] = b[key] - a[key]
+    return out.sort_values('seconds_after', ascending=False, key=lambda s: s.fillna(-1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print or diff pntvl profiles")
+    parser.add_argument('profile')
+    parser.add_argument('other', nargs='?', help="second profile to diff against the first")
+    args = parser.parse_args(argv)
+
+    first = load_profile(args.profile)
+    if args.other is None:
+        import pandas as pd
+
+        table = pd.DataFrame(first['summary']).T.sort_values('seconds', ascending=False)
+        print(f"run: {first['otherData']['run']}  started: {first['otherData']['started']}")
+        print(table.to_string())
+        return
+    print(diff_profiles(first, load_profile(args.other)).to_string())
+
+
+if __name__ == '__main__':
+    main()
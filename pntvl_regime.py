@@ -0,0 +1,153 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from pntvl_online import RollingWelford
+from pntvl_rolling import rolling_mean_matrix, rolling_std_matrix
+
+
+# =========================================================
+# 1. 批量：均线 regime（滑动统计见 pntvl_rolling）
+# =========================================================
+def crossover_regime(x, ma):
+    """1 = 在均线之上，-1 = 在均线之下，0 = 相等或均线未就绪；x 按最后一维广播。"""
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        regime = np.zeros(np.broadcast_shapes(x.shape, ma.shape), dtype=np.int8)
+        regime[x > ma] = 1
+        regime[x < ma] = -1
+    return regime
+
+
+def ma_regime_matrix(x, ma_windows):
+    """一次扫描得到多个 ma_window 的 regime（ma_windows × days，int8），供参数扫描使用。"""
+    return crossover_regime(x, rolling_mean_matrix(x, ma_windows))
+
+
+def filter_signal(signal, regime):
+    """Level 6 Regime Filter：只保留与 regime 同向的信号（按 numpy 规则广播）。"""
+    signal = np.asarray(signal)
+    keep = ((signal == 1) & (regime == 1)) | ((signal == -1) & (regime == -1))
+    return np.where(keep, signal, 0).astype(np.int8)
+
+
+# =========================================================
+# 2. 在线：O(1) 更新的滑动均值
+# =========================================================
+class RollingMean:
+    """固定窗口滑动均值，窗口未满返回 NaN（与 pandas rolling(window).mean() 一致）。"""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque()
+        self.total = 0.0
+        self._since_resync = 0
+
+    def update(self, x):
+        self.buffer.append(x)
+        self.total += x
+        if len(self.buffer) > self.window:
+            self.total -= self.buffer.popleft()
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            # 每 window 步重算一次，抵消浮点漂移
+            self.total = math.fsum(self.buffer)
+            self._since_resync = 0
+        if len(self.buffer) < self.window:
+            return math.nan
+        return self.total / self.window
+
+
+# =========================================================
+# 3. Regime 定义：同一对象既可批量（batch）也可逐 bar（update）
+# =========================================================
+class MACrossover:
+    """价格（或 TVL）相对其 window 日均线的位置：1 / -1 / 0。"""
+
+    def __init__(self, window=200, source='price'):
+        self.window = window
+        self.source = source
+        self.ma = RollingMean(window)
+        self.value = math.nan
+
+    def batch(self, price, tvl=None):
+        x = np.asarray(price if self.source == 'price' else tvl, dtype=np.float64)
+        return ma_regime_matrix(x, [self.window])[0]
+
+    def update(self, price, tvl=None):
+        x = price if self.source == 'price' else tvl
+        self.value = self.ma.update(x)
+        return 1 if x > self.value else -1 if x < self.value else 0
+
+
+class TVLTrend(MACrossover):
+    """TVL 自身的趋势：TVL 在其均线之上视为多头环境。"""
+
+    def __init__(self, window=30):
+        super().__init__(window, source='tvl')
+
+
+class VolatilityBucket:
+    """
+    收益率滑动标准差（年化）落在 thresholds 划分的哪一档：0, 1, ..., len(thresholds)；
+    窗口未满为 -1。只用于放行 / 屏蔽信号，不带方向。
+    """
+
+    def __init__(self, window=30, thresholds=(0.5, 1.0), periods_per_year=365):
+        self.window = window
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.scale = math.sqrt(periods_per_year)
+        self.stats = RollingWelford(window)
+        self.prev_price = math.nan
+
+    def _bucket(self, vol):
+        return np.where(np.isfinite(vol), np.searchsorted(self.thresholds, vol, side='right'), -1)
+
+    def batch(self, price, tvl=None):
+        price = np.asarray(price, dtype=np.float64)
+        ret = np.full(len(price), np.nan)
+        ret[1:] = price[1:] / price[:-1] - 1
+        vol = rolling_std_matrix(ret, [self.window])[0] * self.scale
+        return self._bucket(vol).astype(np.int8)
+
+    def update(self, price, tvl=None):
+        self.stats.update(price / self.prev_price - 1)
+        self.prev_price = price
+        return int(self._bucket(self.stats.std * self.scale))
+
+
+class RegimeFilter:
+    """
+    trend 中的方向性定义全部同向时才有方向（否则为 0），信号只保留与之同向的部分；
+    给出 volatility 时，波动率档位不在 allowed_buckets 中的信号也被屏蔽。
+    """
+
+    def __init__(self, trend=(), volatility=None, allowed_buckets=None):
+        self.trend = list(trend) if trend else [MACrossover(200)]
+        self.volatility = volatility
+        self.allowed_buckets = allowed_buckets
+
+    @staticmethod
+    def _combine(regimes):
+        first = regimes[0]
+        agree = np.all([r == first for r in regimes], axis=0)
+        return np.where(agree, first, 0).astype(np.int8)
+
+    def batch(self, signal, price, tvl=None):
+        regime = self._combine([d.batch(price, tvl) for d in self.trend])
+        out = filter_signal(signal, regime)
+        if self.volatility is not None and self.allowed_buckets is not None:
+            bucket = self.volatility.batch(price, tvl)
+            out[~np.isin(bucket, self.allowed_buckets)] = 0
+        return out
+
+    def update(self, signal, price, tvl=None):
+        regimes = [d.update(price, tvl) for d in self.trend]
+        regime = regimes[0] if all(r == regimes[0] for r in regimes) else 0
+        out = signal if signal == regime and signal != 0 else 0
+        if self.volatility is not None:
+            bucket = self.volatility.update(price, tvl)
+            if self.allowed_buckets is not None and bucket not in self.allowed_buckets:
+                out = 0
+        return out
@@ -0,0 +1,302 @@
+import math
+import types
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # 没有 numba 时批量走 sliding_window_view + np.median（按块）
+    njit = None
+
+# 正态分布下 1.4826 × MAD ≈ 标准差，稳健 Z 与原 Z-score 的阈值可以直接对照
+MAD_SCALE = 1.4826
+
+
+# =========================================================
+# 1. 有序窗口上的中位数 / MAD（MAD 用两路有序序列的第 k 小，O(log w)）
+# =========================================================
+def _median_sorted(s, size):
+    mid = size // 2
+    if size % 2:
+        return s[mid]
+    return (s[mid - 1] + s[mid]) / 2
+
+
+def _kth_deviation(s, size, m, p, k):
+    """
+    s[:size] 有序，p = 小于 m 的元素个数。|s - m| 的第 k 小（k 从 1 开始）
+    = 两路升序序列 A[i] = m - s[p-1-i] 与 B[j] = s[p+j] - m 合并后的第 k 个，二分取 A 的个数。
+    """
+    na = p
+    nb = size - p
+    lo = max(0, k - nb)
+    hi = min(k, na)
+    while lo < hi:
+        i = (lo + hi) // 2
+        if m - s[p - 1 - i] < s[p + k - i - 1] - m:
+            lo = i + 1
+        else:
+            hi = i
+    i = lo
+    j = k - i
+    a = m - s[p - i] if i > 0 else -math.inf
+    b = s[p + j - 1] - m if j > 0 else -math.inf
+    return max(a, b)
+
+
+def _mad_sorted(s, size, m, p):
+    half = size // 2
+    if size % 2:
+        return _kth_deviation(s, size, m, p, half + 1)
+    return (_kth_deviation(s, size, m, p, half) + _kth_deviation(s, size, m, p, half + 1)) / 2
+
+
+# =========================================================
+# 2. 批量：逐 bar 维护有序窗口，numba 编译
+#    小窗口：有序数组二分定位 + 平移（每 bar O(w)，连续内存平移很快）；
+#    大窗口：值域排名上的树状数组（插入 / 删除 / 第 k 小 O(log n)，MAD 为 O(log² n)）
+# =========================================================
+# 50 万根 bar 实测：w = 75 时平移 0.18 s、树状数组 1.0 s；w = 2000 时两者持平（约 1.6–2.0 s）；
+# w = 5000 / 20000 时平移 3.9 / 13.7 s、树状数组 1.8 / 2.1 s。两条路径结果逐位一致。
+TREE_MIN_WINDOW = 2048
+
+def _robust_loop(x, window, median, mad):
+    n = x.shape[0]
+    s = np.empty(window)
+    size = 0
+    nan_count = 0
+    for t in range(n):
+        # 先移出过期值再插入新值，有序窗口最多 window 个元素
+        if t >= window:
+            old = x[t - window]
+            if old == old:
+                pos = np.searchsorted(s[:size], old)
+                for k in range(pos, size - 1):
+                    s[k] = s[k + 1]
+                size -= 1
+            else:
+                nan_count -= 1
+        v = x[t]
+        if v == v:
+            pos = np.searchsorted(s[:size], v)
+            for k in range(size, pos, -1):
+                s[k] = s[k - 1]
+            s[pos] = v
+            size += 1
+        else:
+            nan_count += 1
+        if t >= window - 1 and nan_count == 0:
+            m = _median_sorted(s, size)
+            median[t] = m
+            mad[t] = _mad_sorted(s, size, m, np.searchsorted(s[:size], m))
+
+
+def _tree_add(tree, r, d):
+    i = r + 1
+    while i < tree.shape[0]:
+        tree[i] += d
+        i += i & -i
+
+
+def _tree_count(tree, r):
+    """排名 < r 的元素个数。"""
+    c = 0
+    while r > 0:
+        c += tree[r]
+        r -= r & -r
+    return c
+
+
+def _tree_select(tree, vals, top, k):
+    """第 k 小（k 从 1 开始）：自顶向下按 2 的幂跳跃。"""
+    pos = 0
+    step = top
+    while step:
+        nxt = pos + step
+        if nxt < tree.shape[0] and tree[nxt] < k:
+            pos = nxt
+            k -= tree[nxt]
+        step >>= 1
+    return vals[pos]
+
+
+def _tree_kth_deviation(tree, vals, top, size, m, p, k):
+    """与 _kth_deviation 相同的二分，s[i] 换成第 i + 1 小。"""
+    na = p
+    nb = size - p
+    lo = max(0, k - nb)
+    hi = min(k, na)
+    while lo < hi:
+        i = (lo + hi) // 2
+        if m - _tree_select(tree, vals, top, p - i) < _tree_select(tree, vals, top, p + k - i) - m:
+            lo = i + 1
+        else:
+            hi = i
+    i = lo
+    j = k - i
+    a = m - _tree_select(tree, vals, top, p - i + 1) if i > 0 else -math.inf
+    b = _tree_select(tree, vals, top, p + j) - m if j > 0 else -math.inf
+    return max(a, b)
+
+
+def _robust_tree_loop(x, rank, vals, window, median, mad):
+    n = x.shape[0]
+    tree = np.zeros(vals.shape[0] + 1, np.int32)
+    top = 1
+    while top * 2 <= vals.shape[0]:
+        top *= 2
+    size = 0
+    nan_count = 0
+    for t in range(n):
+        if t >= window:
+            if x[t - window] == x[t - window]:
+                _tree_add(tree, rank[t - window], -1)
+                size -= 1
+            else:
+                nan_count -= 1
+        if x[t] == x[t]:
+            _tree_add(tree, rank[t], 1)
+            size += 1
+        else:
+            nan_count += 1
+        if t >= window - 1 and nan_count == 0:
+            half = size // 2
+            if size % 2:
+                m = _tree_select(tree, vals, top, half + 1)
+            else:
+                m = (_tree_select(tree, vals, top, half) + _tree_select(tree, vals, top, half + 1)) / 2
+            median[t] = m
+            p = _tree_count(tree, np.searchsorted(vals, m))
+            if size % 2:
+                mad[t] = _tree_kth_deviation(tree, vals, top, size, m, p, half + 1)
+            else:
+                mad[t] = (_tree_kth_deviation(tree, vals, top, size, m, p, half)
+                          + _tree_kth_deviation(tree, vals, top, size, m, p, half + 1)) / 2
+
+
+def _robust_numpy(x, window, median, mad, max_cells=4_000_000):
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    view = sliding_window_view(x, window)
+    step = max(1, max_cells // window)
+    for lo in range(0, len(view), step):
+        win = view[lo:lo + step]
+        med = np.median(win, axis=1)
+        dev = np.median(np.abs(win - med[:, None]), axis=1)
+        # np.median 遇到 NaN 返回 NaN，与 pandas min_periods = window 一致
+        median[window - 1 + lo:window - 1 + lo + len(win)] = med
+        mad[window - 1 + lo:window - 1 + lo + len(win)] = dev
+
+
+def _jit(*funcs, **options):
+    """
+    在独立命名空间里编译一组互相调用的函数：模块里保留纯 Python 版本给在线计算（list 输入），
+    批量内核调用的是编译后的同一份代码。options 覆盖默认的 njit 参数（如 boundscheck=True）。
+    """
+    options = {'cache': True, 'nogil': True, **options}
+    ns = {'__name__': __name__, 'np': np, 'math': math}
+    for f in funcs:
+        ns[f.__name__] = njit(**options)(
+            types.FunctionType(f.__code__, ns, f.__name__))
+    return ns
+
+
+_robust_kernel = _jit(_median_sorted, _kth_deviation, _mad_sorted,
+                      _robust_loop)['_robust_loop'] if njit else _robust_numpy
+_robust_tree_kernel = _jit(_tree_add, _tree_count, _tree_select, _tree_kth_deviation,
+                           _robust_tree_loop)['_robust_tree_loop'] if njit else None
+
+
+def _robust_tree(x, window, median, mad):
+    finite = x == x
+    vals = np.unique(x[finite])
+    rank = np.searchsorted(vals, np.where(finite, x, 0.0))
+    _robust_tree_kernel(x, rank, vals, window, median, mad)
+
+
+def rolling_median_mad(x, window):
+    """滑动中位数与 MAD（未缩放）；窗口未满或含 NaN 时为 NaN，与 pandas rolling(window).median() 对齐。"""
+    x = np.asarray(x, dtype=np.float64)
+    # ±inf 与 NaN 一样视为无效值（与 rolling_zscore_matrix 一致）
+    x = np.ascontiguousarray(np.where(np.isfinite(x), x, np.nan))
+    median = np.full(len(x), np.nan)
+    mad = np.full(len(x), np.nan)
+    if 0 < window <= len(x):
+        kernel = _robust_tree if njit and window >= TREE_MIN_WINDOW else _robust_kernel
+        kernel(x, int(window), median, mad)
+    return median, mad
+
+
+def robust_zscore(x, window):
+    """稳健 Z-score：(x - 滑动中位数) / (1.4826 × 滑动 MAD)，可直接替换 divergence_z。"""
+    x = np.asarray(x, dtype=np.float64)
+    median, mad = rolling_median_mad(x, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (x - median) / (MAD_SCALE * mad)
+
+
+def robust_zscore_matrix(x, windows):
+    """多窗口稳健 Z-score（windows × days），与 rolling_zscore_matrix 形状一致，供参数扫描使用。"""
+    x = np.asarray(x, dtype=np.float64)
+    return np.stack([robust_zscore(x, w) for w in windows]) if len(windows) else \
+        np.empty((0, len(x)))
+
+
+# =========================================================
+# 3. 在线：与 RollingWelford 同接口（update / ready / zscore）
+# =========================================================
+class RollingMedianMAD:
+    """
+    固定窗口的在线中位数 / MAD：有序列表二分定位后插入删除（列表平移，每 bar O(w)），
+    中位数 O(1)，MAD 按第 k 小二分选取 O(log w)。list 平移是 C 层 memmove，
+    实测每 bar 维护有序列表 w = 75 / 2000 / 20000 时约 0.9 / 2.2 / 9.5 µs，
+    纯 Python 的 O(log w) 结构常数更大，在线计算不换。
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque()
+        self.sorted = []
+        self.nan_count = 0
+        self.median = math.nan
+        self.mad = math.nan
+
+    def update(self, x):
+        self.buffer.append(x)
+        if math.isfinite(x):
+            insort(self.sorted, x)
+        else:
+            self.nan_count += 1
+        if len(self.buffer) > self.window:
+            old = self.buffer.popleft()
+            if math.isfinite(old):
+                del self.sorted[bisect_left(self.sorted, old)]
+            else:
+                self.nan_count -= 1
+
+        if self.ready:
+            s, size = self.sorted, len(self.sorted)
+            self.median = _median_sorted(s, size)
+            self.mad = _mad_sorted(s, size, self.median, bisect_left(s, self.median))
+        else:
+            self.median = self.mad = math.nan
+
+    @property
+    def ready(self):
+        return len(self.buffer) == self.window and self.nan_count == 0
+
+    @property
+    def std(self):
+        """MAD 换算的标准差估计。"""
+        return MAD_SCALE * self.mad
+
+    def zscore(self, x):
+        if not self.ready or not math.isfinite(x):
+            return math.nan
+        scale = self.std
+        if scale == 0:
+            return math.nan if x == self.median else math.copysign(math.inf, x - self.median)
+        return (x - self.median) / scale
+
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+# =========================================================
+# 补偿前缀和 + 切片相减：一次扫描得到所有窗口的滑动均值 / 标准差 / Z-score
+# （windows × days）。参数扫描、regime 与多资产面板共用
+# =========================================================
+def compensated_cumsum(x, start=None):
+    """
+    补偿前缀和：TwoSum 逐步求出 np.cumsum 每次加法的舍入误差，误差再累加一次作为低位。
+    沿第 0 轴累加，返回首位补 0 的 (hi, lo)，窗口和 = (hi[j] - hi[i]) + (lo[j] - lo[i])。
+    start=(hi0, lo0)（形状同 x[:1]）时接着上一段的末行继续累加、首位为 start：
+    np.cumsum 逐个顺序相加，分段续算与整段一次算逐位一致。
+    """
+    if start is None:
+        hi = np.cumsum(x, axis=0)
+        pad = np.zeros_like(hi[:1])
+        prev = np.concatenate((pad, hi[:-1]))
+        b = hi - prev
+        err = (prev - (hi - b)) + (x - b)
+        lo = np.cumsum(err, axis=0)
+        return np.concatenate((pad, hi)), np.concatenate((pad, lo))
+    hi = np.cumsum(np.concatenate((start[0], x)), axis=0)
+    prev = hi[:-1]
+    b = hi[1:] - prev
+    err = (prev - (hi[1:] - b)) + (x - b)
+    lo = np.cumsum(np.concatenate((start[1], err)), axis=0)
+    return hi, lo
+
+
+def _prefix(x):
+    x = np.asarray(x, dtype=np.float64)
+    valid = np.isfinite(x)
+    # 先减去均值，降低前缀和的相消误差
+    shift = x[valid].mean() if valid.any() else 0.0
+    xc = np.where(valid, x - shift, 0.0)
+    cs = compensated_cumsum(xc)
+    cs2 = compensated_cumsum(xc * xc)
+    cnt = np.concatenate(([0], np.cumsum(valid)))
+    return shift, cs, cs2, cnt
+
+
+def window_sum(cs, w):
+    hi, lo = cs
+    return (hi[w:] - hi[:-w]) + (lo[w:] - lo[:-w])
+
+
+def _window_stats(x, windows, with_std, centered=False):
+    # 每个窗口只做一次前缀和相减（切片，无 gather）；窗口内必须全部有效（pandas min_periods）
+    shift, cs, cs2, cnt = _prefix(x)
+    n = len(cnt) - 1
+    mean = np.full((len(windows), n), np.nan)
+    std = np.full((len(windows), n), np.nan) if with_std else None
+    for i, w in enumerate(windows):
+        w = int(w)
+        if w > n:
+            continue
+        s = window_sum(cs, w)
+        full = (cnt[w:] - cnt[:-w]) == w
+        mean[i, w - 1:] = np.where(full, s / w + (0.0 if centered else shift), np.nan)
+        if with_std:
+            s2 = window_sum(cs2, w)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sd = np.sqrt(np.maximum((s2 - s * s / w) / (w - 1), 0.0))
+            std[i, w - 1:] = np.where(full, sd, np.nan)
+    return mean, std
+
+
+def rolling_zscore_matrix(x, windows):
+    """所有窗口的滑动 Z-score（windows × days），与 pandas (x - rolling mean) / rolling std 对齐。"""
+    x = np.asarray(x, dtype=np.float64)
+    valid = np.isfinite(x)
+    shift = x[valid].mean() if valid.any() else 0.0
+    mean_c, std = _window_stats(x, windows, with_std=True, centered=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = ((x - shift)[None, :] - mean_c) / std
+    z[:, ~valid] = np.nan
+    return z
+
+
+def rolling_mean_matrix(x, windows):
+    """所有窗口的滑动均值，与 pandas rolling(window).mean() 对齐（窗口未满为 NaN）。"""
+    return _window_stats(x, windows, with_std=False)[0]
+
+
+def rolling_std_matrix(x, windows):
+    """所有窗口的滑动样本标准差，与 pandas rolling(window).std() 对齐。"""
+    return _window_stats(x, windows, with_std=True)[1]
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from pntvl_strategy import LEVEL_PARAMS, StrategyPipeline
+from pntvl_sweep import sweep_heatmap
+
+try:
+    import pyarrow  # noqa: F401  （DataFrame.to_parquet 需要）
+    BLOB_EXT = 'parquet'
+except ImportError:  # 没有 pyarrow 时结果表用 pickle 存
+    BLOB_EXT = 'pkl'
+
+RESULT_DIR = ".pntvl_results"
+STORE_VERSION = 2
+# cells 表每行（含主键索引）在 SQLite 中约占 100 字节（实测 VACUUM 后 101 B/行）
+CELL_BYTES = 100
+
+
+# =========================================================
+# 1. 键：输入数据哈希 + 完整参数集
+# =========================================================
+def data_hash(df):
+    """按内容（不含索引）哈希，同一份数据无论来自 CSV 还是 Feather 缓存都得到同一个值。"""
+    h = hashlib.sha256()
+    h.update(json.dumps(list(map(str, df.columns))).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:24]
+
+
+def _canonical(value):
+    if isinstance(value, (np.floating, float)):
+        return float(value)
+    if isinstance(value, (np.integer, int)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def params_key(data_key, params):
+    payload = json.dumps([STORE_VERSION, data_key,
+                          sorted((k, _canonical(v)) for k, v in params.items())])
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+# =========================================================
+# 2. 存储：SQLite 记录元数据与指标，Parquet 存净值曲线 / 交易台账
+# =========================================================
+class ResultStore:
+    """
+    每次运行一行 runs 记录 + 若干结果表文件；sweep 每个 (window, z) 单元一行 cells 记录。
+    同一 (data_hash, periods_per_year) 的 cells 在 runs 中另记一行（params 为 {'cells': ppy}，
+    nbytes 按 CELL_BYTES × 单元数计），与普通运行一起计入 max_bytes / max_entries，
+    超限时按最近访问时间（LRU）淘汰；淘汰该行即删除对应的全部 cells。
+    """
+
+    def __init__(self, root=RESULT_DIR, max_bytes=2 * 2**30, max_entries=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'results.sqlite'))
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                key TEXT PRIMARY KEY,
+                data_hash TEXT,
+                params TEXT,
+                metrics TEXT,
+                blobs TEXT,
+                nbytes INTEGER,
+                created REAL,
+                last_access REAL
+            );
+            CREATE INDEX IF NOT EXISTS runs_lru ON runs (last_access);
+            CREATE TABLE IF NOT EXISTS cells (
+                data_hash TEXT,
+                periods_per_year REAL,
+                window INTEGER,
+                z REAL,
+                sharpe REAL,
+                PRIMARY KEY (data_hash, periods_per_year, window, z)
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def _blob_path(self, key, name):
+        return os.path.join(self.root, 'blobs', f"{key}_{name}.{BLOB_EXT}")
+
+    def get(self, data_key, params):
+        key = params_key(data_key, params)
+        row = self.db.execute("SELECT metrics, blobs FROM runs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        frames = {}
+        for name, dtypes in json.loads(row[1]).items():
+            path = self._blob_path(key, name)
+            if not os.path.exists(path):
+                # 文件被手动删掉：当作未命中
+                self._delete(key)
+                return None
+            frame = pd.read_parquet(path) if BLOB_EXT == 'parquet' else pd.read_pickle(path)
+            frames[name] = _restore_dtypes(frame, dtypes)
+        with self.db:
+            self.db.execute("UPDATE runs SET last_access = ? WHERE key = ?", (time.time(), key))
+        return {'metrics': json.loads(row[0]), **frames}
+
+    def put(self, data_key, params, metrics, frames):
+        key = params_key(data_key, params)
+        nbytes = 0
+        for name, frame in frames.items():
+            path = self._blob_path(key, name)
+            tmp = path + '.tmp'
+            if BLOB_EXT == 'parquet':
+                frame.to_parquet(tmp, index=False)
+            else:
+                frame.to_pickle(tmp)
+            os.replace(tmp, path)
+            nbytes += os.path.getsize(path)
+
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data_key, json.dumps({k: _canonical(v) for k, v in params.items()}),
+                 json.dumps({k: _canonical(v) for k, v in metrics.items()}),
+                 json.dumps({name: {c: str(t) for c, t in frame.dtypes.items()}
+                             for name, frame in frames.items()}),
+                 nbytes, now, now))
+        self.evict()
+        return key
+
+    def _delete(self, key):
+        row = self.db.execute("SELECT data_hash, params, blobs FROM runs WHERE key = ?",
+                              (key,)).fetchone()
+        if row:
+            for name in json.loads(row[2]):
+                path = self._blob_path(key, name)
+                if os.path.exists(path):
+                    os.remove(path)
+        with self.db:
+            if row and 'cells' in json.loads(row[1]):
+                self.db.execute("DELETE FROM cells WHERE data_hash = ? AND periods_per_year = ?",
+                                (row[0], json.loads(row[1])['cells']))
+            self.db.execute("DELETE FROM runs WHERE key = ?", (key,))
+
+    def evict(self):
+        """按 last_access 从旧到新删除，直到总字节数与条目数都在上限内。"""
+        total, count = self.db.execute("SELECT COALESCE(SUM(nbytes), 0), COUNT(*) FROM runs").fetchone()
+        if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+            return 0
+        removed = 0
+        for key, nbytes in self.db.execute(
+                "SELECT key, nbytes FROM runs ORDER BY last_access").fetchall():
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            self._delete(key)
+            total -= nbytes
+            count -= 1
+            removed += 1
+        return removed
+
+    def stats(self):
+        total, count = self.db.execute("SELECT COALESCE(SUM(nbytes), 0), COUNT(*) FROM runs").fetchone()
+        cells = self.db.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+        return {'runs': count, 'bytes': total, 'cells': cells}
+
+    # sweep 单元：每个 (window, z) 的 Sharpe 单独一行，新网格只补算缺的部分
+    def get_cells(self, data_key, periods_per_year):
+        ppy = float(periods_per_year)
+        rows = self.db.execute(
+            "SELECT window, z, sharpe FROM cells WHERE data_hash = ? AND periods_per_year = ?",
+            (data_key, ppy)).fetchall()
+        if rows:
+            with self.db:
+                self.db.execute("UPDATE runs SET last_access = ? WHERE key = ?",
+                                (time.time(), params_key(data_key, {'cells': ppy})))
+        return {(w, round(z, 10)): s for w, z, s in rows}
+
+    def put_cells(self, data_key, periods_per_year, heatmap):
+        ppy = float(periods_per_year)
+        rows = [(data_key, ppy, int(w), float(z), None if np.isnan(v) else float(v))
+                for w, row in heatmap.iterrows() for z, v in row.items()]
+        key = params_key(data_key, {'cells': ppy})
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?)", rows)
+            count = self.db.execute(
+                "SELECT COUNT(*) FROM cells WHERE data_hash = ? AND periods_per_year = ?",
+                (data_key, ppy)).fetchone()[0]
+            created = self.db.execute("SELECT created FROM runs WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data_key, json.dumps({'cells': ppy}), '{}', '{}',
+                 count * CELL_BYTES, created[0] if created else now, now))
+        self.evict()
+
+
+def _restore_dtypes(frame, dtypes):
+    """Parquet 会把 datetime64[s] 读回为 datetime64[ms]：按写入时记录的 dtype 还原。"""
+    changed = {c: t for c, t in dtypes.items() if c in frame and str(frame[c].dtype) != t}
+    return frame.astype(changed) if changed else frame
+
+
+# =========================================================
+# 3. 带缓存的 Level 回测与参数扫描
+# =========================================================
+def run_level(df, level, store=None, data_key=None, **overrides):
+    """
+    以 LEVEL_PARAMS[level] 为基础（可用关键字覆盖）跑一次回测，
+    返回 metrics / equity（净值、回撤、仓位等逐日序列）/ ledger（交易台账）。
+    同一数据 + 同一参数第二次调用直接从 store 读取。
+    供批量 / 交互调用；Level 4–6 脚本需要完整的逐日 df（打印与绘图），直接走 StrategyPipeline，
+    不经过这里。参数扫描（Level 3 Optimization）的缓存见 cached_sweep。
+    """
+    params = {**LEVEL_PARAMS[level], **overrides}
+    if store is not None:
+        data_key = data_key or data_hash(df)
+        hit = store.get(data_key, params)
+        if hit is not None:
+            return hit
+
+    exec_params = dict(params)
+    trade_rule = exec_params.pop('trade_rule', 'turnover')
+    pipeline = StrategyPipeline(df)
+    metrics = pipeline.metrics(trade_rule=trade_rule, **exec_params)
+    ex = pipeline.execution(**exec_params)
+
+    equity = pd.DataFrame({'date': df['date'].to_numpy()})
+    for name in ('position', 'strategy_return', 'equity_curve', 'drawdown', 'capital'):
+        if name in ex:
+            equity[name] = ex[name]
+    result = {
+        'metrics': {k: _canonical(v) for k, v in metrics.items()},
+        'equity': equity,
+        'ledger': pipeline.ledger(**exec_params),
+    }
+    if store is not None:
+        store.put(data_key, params, result['metrics'],
+                  {'equity': result['equity'], 'ledger': result['ledger']})
+    return result
+
+
+def cached_sweep(df_base, window_values, z_values, periods_per_year=365, store=None,
+                 data_key=None):
+    """与 sweep_heatmap 相同；已算过的 (window, z) 单元直接取出，只补算缺失的行列。"""
+    if store is None:
+        return sweep_heatmap(df_base, window_values, z_values, periods_per_year)
+
+    data_key = data_key or data_hash(df_base[['eth_return', 'pntvl_change', 'divergence_strength']])
+    known = store.get_cells(data_key, periods_per_year)
+    z_values = np.asarray(z_values, dtype=np.float64)
+    heatmap = pd.DataFrame(np.nan, index=list(window_values), columns=z_values)
+
+    missing_w, missing_z = set(), set()
+    for w in window_values:
+        for z in z_values:
+            cell = known.get((int(w), round(float(z), 10)), 'missing')
+            if cell == 'missing':
+                missing_w.add(w)
+                missing_z.add(float(z))
+            else:
+                heatmap.loc[w, z] = np.nan if cell is None else cell
+
+    if missing_w:
+        ws = [w for w in window_values if w in missing_w]
+        zs = np.array([z for z in z_values if float(z) in missing_z])
+        fresh = sweep_heatmap(df_base, ws, zs, periods_per_year)
+        store.put_cells(data_key, periods_per_year, fresh)
+        heatmap.loc[ws, zs] = fresh.to_numpy()
+    return heatmap
@@ -0,0 +1,340 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_data import bar_periods_per_year, span_days
+from pntvl_execution import simulate_execution
+from pntvl_kernel import simulate_capital
+from pntvl_memory import INTERMEDIATE_COLUMNS, compact_array
+from pntvl_profile import stage
+from pntvl_regime import crossover_regime, filter_signal, rolling_mean_matrix
+from pntvl_robust import MAD_SCALE, rolling_median_mad
+from pntvl_trades import ledger_stats, trade_ledger
+
+# 各 Level 脚本的参数（Level 1/2 只用到特征阶段）
+LEVEL_PARAMS = {
+    3: dict(window=75, z_threshold=1.1, mode='compound', trade_rule='exit'),
+    4: dict(window=75, z_threshold=1.1, fee_rate=0.0005, slippage_rate=0.0002,
+            mode='compound', trade_rule='ledger'),
+    5: dict(window=75, z_threshold=1.1, max_position=0.3, fee_rate=0.0005,
+            slippage_rate=0.0002, mode='capital', dd_threshold=0.15),
+    6: dict(window=75, z_threshold=1.1, ma_window=200, max_position=0.3,
+            fee_rate=0.0005, slippage_rate=0.0002, mode='capital'),
+}
+
+
+class StrategyPipeline:
+    """
+    特征 → 信号 → 执行（T+1 + 成本）→ 指标，每个阶段按自身参数缓存。
+    只改 z_threshold 会复用 Z-score；只改 fee_rate 会复用信号与仓位。
+    low_memory=True 时各阶段只缓存下游还要用的数组（不留 div_mean / div_std / prev_position /
+    equity_peak / 成本明细），frame() 逐列按 compact_array 压缩写入、跳过中间列，
+    不会先拼出整张 float64 表；计算仍是 float64，指标与 low_memory=False 完全相同。
+    robust=True 时 divergence_z 改用滑动中位数 / MAD（div_median / div_mad 代替 div_mean / div_std）。
+    """
+
+    def __init__(self, df, periods_per_year=None, low_memory=False, robust=False):
+        self.df = df
+        self.low_memory = low_memory
+        self.robust = robust
+        # 默认按 K 线频率推断：日线 365，1h 8760，5m 105120
+        self.periods_per_year = periods_per_year or bar_periods_per_year(df['date'])
+        self._cache = {}
+
+    def _memo(self, key, build):
+        if key not in self._cache:
+            with stage(f"pipeline.{key[0]}"):
+                self._cache[key] = build()
+        return self._cache[key]
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _lean(self, out, *names):
+        # low_memory：阶段结果里下游不再使用的中间量不进缓存
+        if self.low_memory:
+            for name in names:
+                del out[name]
+        return out
+
+    # =========================================================
+    # 1. 特征阶段
+    # =========================================================
+    def features(self):
+        return self._memo(('features',), self._build_features)
+
+    def _build_features(self):
+        price = self.df['eth_price']
+        pntvl = self.df['tvl_usd'] / price
+        pntvl_2dec = pntvl.round(2)
+        eth_return = price.pct_change()
+        pntvl_change = pntvl_2dec.pct_change()
+        return self._lean({
+            'price_neutral_tvl': pntvl.to_numpy(),
+            'price_neutral_tvl_2dec': pntvl_2dec.to_numpy(),
+            'eth_return': eth_return.to_numpy(),
+            'pntvl_change': pntvl_change.to_numpy(),
+            'divergence_strength': (eth_return - pntvl_change).to_numpy(),
+        }, 'price_neutral_tvl')
+
+    def zscore(self, window):
+        return self._memo(('zscore', window), lambda: self._build_zscore(window))
+
+    def _build_zscore(self, window):
+        if self.robust:
+            return self._build_robust_zscore(window)
+        div = pd.Series(self.features()['divergence_strength'])
+        div_mean = div.rolling(window).mean()
+        div_std = div.rolling(window).std()
+        divergence_z = ((div - div_mean) / div_std).to_numpy()
+        if self.low_memory:
+            return {'divergence_z': divergence_z}
+        return {
+            'div_mean': div_mean.to_numpy(),
+            'div_std': div_std.to_numpy(),
+            'divergence_z': divergence_z,
+        }
+
+    def _build_robust_zscore(self, window):
+        div = self.features()['divergence_strength']
+        div_median, div_mad = rolling_median_mad(div, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            divergence_z = (div - div_median) / (MAD_SCALE * div_mad)
+        if self.low_memory:
+            return {'divergence_z': divergence_z}
+        return {
+            'div_median': div_median,
+            'div_mad': div_mad,
+            'divergence_z': divergence_z,
+        }
+
+    def regime(self, ma_window):
+        return self._memo(('regime', ma_window), lambda: self._build_regime(ma_window))
+
+    def _build_regime(self, ma_window):
+        price = self.df['eth_price'].to_numpy()
+        ma = rolling_mean_matrix(price, [ma_window])[0]
+        return {'ma': ma, 'regime': crossover_regime(price, ma)}
+
+    # =========================================================
+    # 2. 信号阶段
+    # =========================================================
+    def signal(self, window, z_threshold, ma_window=None):
+        key = ('signal', window, z_threshold, ma_window)
+        return self._memo(key, lambda: self._build_signal(window, z_threshold, ma_window))
+
+    def _build_signal(self, window, z_threshold, ma_window):
+        if ma_window:
+            raw = self.signal(window, z_threshold)
+            return filter_signal(raw, self.regime(ma_window)['regime'])
+
+        f = self.features()
+        z = self.zscore(window)['divergence_z']
+        with np.errstate(invalid='ignore'):
+            long_mask = (f['eth_return'] < 0) & (f['pntvl_change'] > 0) & (z < -z_threshold)
+            short_mask = (f['eth_return'] > 0) & (f['pntvl_change'] < 0) & (z > z_threshold)
+        signal = np.zeros(len(z), dtype=np.int8)
+        signal[long_mask] = 1
+        signal[short_mask] = -1
+        return signal
+
+    # =========================================================
+    # 3. 执行阶段（T+1 + 手续费 / 滑点）
+    # =========================================================
+    def positions(self, window, z_threshold, ma_window=None, max_position=1.0):
+        key = ('positions', window, z_threshold, ma_window, max_position)
+        return self._memo(key, lambda: self._build_positions(
+            window, z_threshold, ma_window, max_position))
+
+    def _build_positions(self, window, z_threshold, ma_window, max_position):
+        signal = pd.Series(self.signal(window, z_threshold, ma_window))
+        position = signal.shift(1).fillna(0) * max_position
+        prev_position = position.shift(1).fillna(0)
+        return self._lean({
+            'position': position.to_numpy(),
+            'prev_position': prev_position.to_numpy(),
+            'turnover': (position - prev_position).abs().to_numpy(),
+        }, 'prev_position')
+
+    def execution(self, window, z_threshold, ma_window=None, max_position=1.0,
+                  fee_rate=0.0, slippage_rate=0.0, mode='compound',
+                  initial_capital=100000.0, dd_threshold=None, dd_scale=0.5,
+                  impact_coef=0.0, participation=None):
+        """
+        mode='compound'：turnover × (fee_rate + slippage_rate) 的成本，按收益率复利（Level 3/4）；
+        'bar'：同样复利，但按 K 线 OHLCV 撮合（simulate_execution 市价单，half_spread 取
+        slippage_rate，df 需有 open / high / low / volume 列）；
+        'capital'：以前一日资金为基数逐日复利，回撤超过 dd_threshold 时次日仓位乘 dd_scale（Level 5/6）。
+        """
+        key = ('execution', window, z_threshold, ma_window, max_position, fee_rate,
+               slippage_rate, mode, initial_capital, dd_threshold, dd_scale,
+               impact_coef, participation)
+        return self._memo(key, lambda: self._build_execution(
+            window, z_threshold, ma_window, max_position, fee_rate, slippage_rate, mode,
+            initial_capital, dd_threshold, dd_scale, impact_coef, participation))
+
+    def _build_execution(self, window, z_threshold, ma_window, max_position, fee_rate,
+                         slippage_rate, mode, initial_capital, dd_threshold, dd_scale,
+                         impact_coef, participation):
+        cost_rate = fee_rate + slippage_rate
+        eth_return = pd.Series(self.features()['eth_return'])
+        pos = self.positions(window, z_threshold, ma_window, max_position)
+        position = pd.Series(pos['position'])
+        turnover = pd.Series(pos['turnover'])
+
+        if mode in ('compound', 'bar'):
+            # Level 3/4：按收益率复利
+            if mode == 'bar':
+                df = self.df
+                fills = simulate_execution(
+                    pos['position'], df['open'], df['high'], df['low'], df['eth_price'],
+                    df['volume'], fee_rate=fee_rate, half_spread=slippage_rate,
+                    impact_coef=impact_coef, participation=participation)
+                position = pd.Series(fills['position'])
+                turnover = pd.Series(fills['turnover'])
+                cost_return = pd.Series(fills['cost_return'])
+                strategy_return = pd.Series(fills['strategy_return'])
+            else:
+                cost_return = turnover * cost_rate
+                strategy_return = (position * eth_return - cost_return).fillna(0)
+            equity_curve = (1 + strategy_return).cumprod()
+            equity_peak = equity_curve.cummax()
+            return self._lean({
+                'position': position.to_numpy(),
+                'turnover': turnover.to_numpy(),
+                'cost_return': cost_return.to_numpy(),
+                'strategy_return': strategy_return.to_numpy(),
+                'equity_curve': equity_curve.to_numpy(),
+                'equity_peak': equity_peak.to_numpy(),
+                'drawdown': (equity_curve / equity_peak - 1).to_numpy(),
+                'sharpe_return': strategy_return.to_numpy(),
+                'trade_pnl': strategy_return.to_numpy(),
+            }, 'cost_return', 'equity_peak')
+
+        if mode == 'capital':
+            # Level 5/6：以前一日资金为基数复利，回撤风控作用于次日仓位
+            sim = simulate_capital(pos['position'], self.features()['eth_return'],
+                                   cost_rate=cost_rate, initial_capital=initial_capital,
+                                   dd_threshold=dd_threshold, dd_scale=dd_scale)
+            capital = pd.Series(sim['capital'])
+            return self._lean({
+                'position': sim['position'],
+                'turnover': sim['turnover'],
+                'strategy_return': sim['strategy_return'],
+                'gross_pnl': sim['gross_pnl'],
+                'cost': sim['cost'],
+                'daily_pnl': sim['daily_pnl'],
+                'capital': sim['capital'],
+                'equity_curve': sim['capital'] / initial_capital,
+                'equity_peak': sim['equity_peak'],
+                'drawdown': sim['drawdown'],
+                'sharpe_return': capital.pct_change().dropna().to_numpy(),
+                'trade_pnl': sim['daily_pnl'],
+            }, 'gross_pnl', 'cost', 'equity_peak')
+
+        raise ValueError(f"unknown execution mode: {mode!r}")
+
+    # =========================================================
+    # 4. 指标阶段
+    # =========================================================
+    def metrics(self, trade_rule='turnover', **params):
+        key = ('metrics', trade_rule, tuple(sorted(params.items())))
+        return self._memo(key, lambda: self._build_metrics(trade_rule, params))
+
+    def trades(self, trade_rule, params):
+        pos = self.execution(**params)
+        if trade_rule == 'exit':
+            # Level 3：前一日有仓位且仓位发生变化（首行 prev 为 NaN，计为一次）
+            position = pd.Series(pos['position'])
+            prev = position.shift(1)
+            return ((prev != position) & (prev != 0)).to_numpy()
+        return pos['turnover'] > 0
+
+    def ledger(self, **params):
+        key = ('ledger', tuple(sorted(params.items())))
+        return self._memo(key, lambda: trade_ledger(
+            self.df['date'], self.df['eth_price'],
+            self.execution(**params)['position'],
+            self.execution(**params)['strategy_return']))
+
+    def _build_metrics(self, trade_rule, params):
+        ex = self.execution(**params)
+        equity_curve = ex['equity_curve']
+        max_drawdown = ex['drawdown'].min()
+        total_days = span_days(self.df['date'])
+        annual_return = equity_curve[-1] ** (365 / total_days) - 1
+
+        r = pd.Series(ex['sharpe_return'])
+        sharpe_ratio = r.mean() / r.std() * np.sqrt(self.periods_per_year)
+        calmar_ratio = annual_return / abs(max_drawdown) if max_drawdown != 0 else np.nan
+
+        if trade_rule == 'ledger':
+            # Level 4：按交易台账统计（一笔交易 = 一段同向持仓）
+            stats = ledger_stats(self.ledger(**params))
+            trade_count, win_rate = stats['trade_count'], stats['win_rate']
+        else:
+            # 每个交易行各自一个 trade_id，胜率即交易行当日盈亏 > 0 的比例
+            trade = self.trades(trade_rule, params)
+            trade_pnl = ex['trade_pnl'][trade]
+            win_rate = (trade_pnl > 0).mean() if trade.any() else np.nan
+            trade_count = trade.sum()
+
+        out = {
+            'annual_return': annual_return,
+            'sharpe_ratio': sharpe_ratio,
+            'calmar_ratio': calmar_ratio,
+            'max_drawdown': max_drawdown,
+            'win_rate': win_rate,
+            'trade_count': int(trade_count),
+        }
+        if 'capital' in ex:
+            out['final_capital'] = ex['capital'][-1]
+        return out
+
+    # =========================================================
+    # 5. 汇总为 DataFrame（列名与各 Level 脚本一致）
+    # =========================================================
+    def frame(self, trade_rule='turnover', **params):
+        out = self.df.copy()
+        put = self._put
+        if self.low_memory:
+            for name in out.columns:
+                put(out, name, out[name].to_numpy())
+        for name, col in self.features().items():
+            put(out, name, col)
+        if 'window' not in params:
+            return out
+
+        for name, col in self.zscore(params['window']).items():
+            put(out, name, col)
+        if params.get('ma_window'):
+            reg = self.regime(params['ma_window'])
+            put(out, f"ma{params['ma_window']}", reg['ma'])
+            put(out, 'regime', reg['regime'])
+            put(out, 'raw_signal', self.signal(params['window'], params['z_threshold']))
+        put(out, 'signal', self.signal(params['window'], params['z_threshold'],
+                                       params.get('ma_window')))
+        for name, col in self.execution(**params).items():
+            if name not in ('sharpe_return', 'trade_pnl'):
+                put(out, name, col)
+        if self.low_memory:
+            # 交易标记与 prev_position 只用于排查，low_memory 时不生成
+            return out
+        out['prev_position'] = out['position'].shift(1)
+        if trade_rule != 'exit':
+            out['prev_position'] = out['prev_position'].fillna(0)
+        out['trade'] = self.trades(trade_rule, params)
+        out['trade_id'] = out['trade'].cumsum()
+        return out
+
+    def _put(self, out, name, values):
+        # low_memory：中间列不写入，其余列写入前先压缩，避免先拼出整张 float64 表
+        if not self.low_memory:
+            out[name] = values
+        elif name not in INTERMEDIATE_COLUMNS:
+            out[name] = compact_array(name, values)
+
+
+def level_metrics(pipeline, level):
+    params = dict(LEVEL_PARAMS[level])
+    trade_rule = params.pop('trade_rule', 'turnover')
+    return pipeline.metrics(trade_rule=trade_rule, **params)
@@ -0,0 +1,257 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from pntvl_data import asof_join, clip_dates, merge_tvl_price, read_price_chunks, read_tvl
+from pntvl_kernel import simulate_capital
+from pntvl_market import market_chunks
+from pntvl_metrics import MetricsAccumulator
+from pntvl_robust import robust_zscore
+from pntvl_rolling import compensated_cumsum, window_sum
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # 没有 pyarrow 时只支持 CSV 输入 / 输出
+    pa = feather = pq = None
+
+
+# =========================================================
+# 1. 分块读取合并后的 TVL / 价格表（date, tvl_usd, eth_price）
+# =========================================================
+def read_chunks(path, chunksize=1_000_000):
+    if path.endswith('.feather'):
+        # 内存映射后按行切片，每次只物化一个分块
+        table = feather.read_table(path, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield table.slice(start, chunksize).to_pandas()
+        return
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    # round_trip 解析保证 CSV 中的浮点数逐位还原
+    yield from pd.read_csv(path, chunksize=chunksize, parse_dates=['date'],
+                           float_precision='round_trip')
+
+
+def read_merged_chunks(tvl_path, price_path, chunksize=1_000_000, price_columns=('close',),
+                       join='date', tvl_lag=None, start=None, end=None, source='csv'):
+    """
+    直接从原始 TVL / K 线读取并逐块连接，拼起来与 load_merged 的结果逐行一致。
+    TVL 为日频小表，整表读入；K 线每次只读 chunksize 行（CSV 分块解析，或行情库按分区读取）。
+    join / tvl_lag / start / end / source 的含义同 load_merged（要求两份文件按时间升序）。
+    """
+    if source not in ('auto', 'csv', 'market'):
+        raise ValueError(f"unknown source: {source!r}")
+    if join not in ('date', 'asof'):
+        raise ValueError(f"unknown join: {join!r}")
+    if source != 'csv':
+        chunks = market_chunks(tvl_path, price_path, start, end, price_columns, join, tvl_lag,
+                               required=source == 'market', chunksize=chunksize)
+        if chunks is not None:
+            yield from chunks
+            return
+
+    tvl = read_tvl(tvl_path)
+    for price in read_price_chunks(price_path, price_columns, intraday=join == 'asof',
+                                   chunksize=chunksize):
+        merged = (asof_join(tvl, price, tvl_lag) if join == 'asof'
+                  else merge_tvl_price(tvl, price))
+        yield clip_dates(merged, start, end)
+
+
+# =========================================================
+# 2. 跨块状态：滚动窗口尾部 + 上一行价格 / PNTVL / 信号 + 资金 / 峰值
+# =========================================================
+def _initial_state(window, initial_capital):
+    return {
+        'tail': np.full(window - 1, np.nan),
+        # divergence 与其平方的补偿前缀和、有效值计数：只保留最近 window 个前缀值
+        'prefix': {'sum': (np.zeros(1), np.zeros(1)), 'sq': (np.zeros(1), np.zeros(1)),
+                   'count': np.zeros(1, dtype=np.int64)},
+        'prev_price': np.nan,
+        'prev_pntvl': np.nan,
+        'prev_signal': 0.0,
+        'capital': initial_capital,
+        'peak': initial_capital,
+        'position': 0.0,
+        'bars': 0,
+        'max_drawdown': 0.0,
+        # 资金级口径：峰值含初始资金，Sharpe 与 capital.pct_change().dropna() 一致
+        'metrics': MetricsAccumulator(start_peak=1.0, skip_first_return=True),
+    }
+
+
+def _extend(carry, x):
+    # 接着上一块的末行续算前缀和，并拼在保留的前缀值后面
+    hi, lo = compensated_cumsum(x, start=(carry[0][-1:], carry[1][-1:]))
+    return np.concatenate((carry[0][:-1], hi)), np.concatenate((carry[1][:-1], lo))
+
+
+def _rolling_z(prefix, x, window):
+    """
+    O(n) 滑动 Z-score：补偿前缀和跨块续算（np.cumsum 顺序相加），
+    任意分块方式与整段一次算逐位一致。窗口内必须全部有效（pandas min_periods）。
+    """
+    valid = np.isfinite(x)
+    xv = np.where(valid, x, 0.0)
+    keep = len(prefix['count'])
+    cs = _extend(prefix['sum'], xv)
+    cs2 = _extend(prefix['sq'], xv * xv)
+    cnt = np.concatenate((prefix['count'], prefix['count'][-1] + np.cumsum(valid)))
+    prefix['sum'] = (cs[0][-window:], cs[1][-window:])
+    prefix['sq'] = (cs2[0][-window:], cs2[1][-window:])
+    prefix['count'] = cnt[-window:]
+
+    # 前缀下标 e（>= window）对应的窗口和在 window_sum 结果的第 e - window 个；本块第 i 行 e = keep + i
+    z = np.full(len(x), np.nan)
+    first = max(keep, window)
+    if first >= len(cnt):
+        return z
+    s = window_sum(cs, window)[first - window:]
+    s2 = window_sum(cs2, window)[first - window:]
+    full = (cnt[first:] - cnt[first - window:len(cnt) - window]) == window
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / window
+        std = np.sqrt(np.maximum((s2 - s * mean) / (window - 1), 0.0))
+        z[first - keep:] = np.where(full, (x[first - keep:] - mean) / std, np.nan)
+    return z
+
+
+def _run_chunk(chunk, state, window, z_threshold, max_position, cost_rate,
+               initial_capital, dd_threshold, dd_scale, robust):
+    price = chunk['eth_price'].to_numpy(dtype=np.float64)
+    pntvl = np.round(chunk['tvl_usd'].to_numpy(dtype=np.float64) / price, 2)
+
+    prev_price = np.concatenate(([state['prev_price']], price[:-1]))
+    prev_pntvl = np.concatenate(([state['prev_pntvl']], pntvl[:-1]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        eth_return = price / prev_price - 1
+        pntvl_change = pntvl / prev_pntvl - 1
+    divergence = eth_return - pntvl_change
+
+    if robust:
+        # 中位数 / MAD 同样只取决于窗口内容：在上一块尾部 + 本块上计算，分块方式不影响结果
+        z = robust_zscore(np.concatenate((state['tail'], divergence)), window)[window - 1:]
+    else:
+        z = _rolling_z(state['prefix'], divergence, window)
+
+    signal = np.zeros(len(price))
+    signal[(eth_return < 0) & (pntvl_change > 0) & (z < -z_threshold)] = 1
+    signal[(eth_return > 0) & (pntvl_change < 0) & (z > z_threshold)] = -1
+
+    # T+1：本块首行仓位来自上一块最后一行的信号
+    target = np.concatenate(([state['prev_signal']], signal[:-1])) * max_position
+
+    sim = simulate_capital(target, eth_return, cost_rate=cost_rate,
+                           initial_capital=state['capital'], dd_threshold=dd_threshold,
+                           dd_scale=dd_scale, start_peak=state['peak'],
+                           start_position=state['position'])
+
+    out = pd.DataFrame({
+        'date': chunk['date'].to_numpy(),
+        'eth_price': price,
+        'divergence_strength': divergence,
+        'divergence_z': z,
+        'signal': signal,
+        'position': sim['position'],
+        'turnover': sim['turnover'],
+        'strategy_return': sim['strategy_return'],
+        'capital': sim['capital'],
+        'equity_curve': sim['capital'] / initial_capital,
+        'equity_peak': sim['equity_peak'],
+        'drawdown': sim['drawdown'],
+    })
+
+    state['tail'] = np.concatenate((state['tail'], divergence))[len(divergence):]
+    state['prev_price'] = price[-1]
+    state['prev_pntvl'] = pntvl[-1]
+    state['prev_signal'] = signal[-1]
+    state['capital'] = sim['capital'][-1]
+    state['peak'] = sim['equity_peak'][-1]
+    state['position'] = sim['position'][-1]
+    state['bars'] += len(price)
+    state['max_drawdown'] = min(state['max_drawdown'], sim['drawdown'].min())
+    state['metrics'].update_many(sim['strategy_return'], out['date'].to_numpy(),
+                                 trade=sim['turnover'] > 0, trade_pnl=sim['daily_pnl'])
+    return out
+
+
+# =========================================================
+# 3. 增量写盘：CSV 追加，或 Parquet 逐块写 row group
+# =========================================================
+class _Sink:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.first = True
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, frame):
+        if self.path.endswith('.parquet'):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self.first else 'a',
+                         header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# =========================================================
+# 4. 入口
+# =========================================================
+def stream_backtest(chunks, out_path=None, window=75, z_threshold=1.1, max_position=1.0,
+                    fee_rate=0.0, slippage_rate=0.0, initial_capital=1.0,
+                    dd_threshold=None, dd_scale=0.5, periods_per_year=365, on_chunk=None,
+                    robust=False):
+    """
+    分块回测（Level 4 收益率复利 / Level 5 资金级 + 回撤减仓）。
+    chunks 来自 read_chunks（已合并的表）或 read_merged_chunks（原始 TVL / K 线逐块连接）。
+    峰值内存只与分块大小和窗口长度有关；任意分块方式的结果逐位一致。
+    divergence_z 由补偿前缀和得到，与 StrategyPipeline（pandas rolling）相差在 1e-12 相对误差内
+    （合成 5m 数据 100 万根实测最大 6e-13），信号与仓位一致。
+    out_path 以 .parquet 结尾写 Parquet，否则写 CSV；返回最终状态摘要，
+    其中 metrics 为逐块累积的绩效指标（不需要回读输出文件）。
+    robust=True 时 divergence_z 改用滑动中位数 / MAD（与 StrategyPipeline(robust=True) 一致）。
+    """
+    state = _initial_state(window, initial_capital)
+    sink = _Sink(out_path) if out_path else None
+    cost_rate = fee_rate + slippage_rate
+    try:
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            out = _run_chunk(chunk, state, window, z_threshold, max_position, cost_rate,
+                             initial_capital, dd_threshold, dd_scale, robust)
+            if sink:
+                sink.write(out)
+            if on_chunk:
+                on_chunk(out)
+    finally:
+        if sink:
+            sink.close()
+
+    return {
+        'bars': state['bars'],
+        'final_capital': state['capital'],
+        'equity': state['capital'] / initial_capital,
+        'max_drawdown': state['max_drawdown'],
+        'metrics': state['metrics'].result(periods_per_year) if state['bars'] else None,
+    }
+
+
+def backtest_in_memory(df, **params):
+    """整段作为一个分块跑 stream_backtest：与任意分块方式逐位对账用。"""
+    frames = []
+    stream_backtest([df], on_chunk=frames.append, **params)
+    return frames[0]
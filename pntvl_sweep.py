@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_kernel import simulate_capital
+from pntvl_profile import stage
+from pntvl_robust import robust_zscore_matrix
+from pntvl_rolling import rolling_zscore_matrix
+
+
+# =========================================================
+# 1. 信号张量（windows × z × days）
+# =========================================================
+def signal_grid(eth_return, pntvl_change, z_matrix, z_values):
+    """广播所有 Z 阈值，返回 int8 信号张量：1 做多 / -1 做空 / 0 空仓。"""
+    eth_return = np.asarray(eth_return, dtype=np.float64)
+    pntvl_change = np.asarray(pntvl_change, dtype=np.float64)
+    z_values = np.asarray(z_values, dtype=np.float64)
+
+    # 做多：ETH 跌 + PNTVL 涨；做空：ETH 涨 + PNTVL 跌
+    long_base = (eth_return < 0) & (pntvl_change > 0)
+    short_base = (eth_return > 0) & (pntvl_change < 0)
+
+    zm = z_matrix[:, None, :]
+    thr = z_values[None, :, None]
+
+    long_mask = long_base & (zm < -thr)
+    short_mask = short_base & (zm > thr)
+
+    signal = long_mask.astype(np.int8)
+    signal[short_mask] = -1
+    return signal
+
+
+# =========================================================
+# 2. 仓位 → 策略收益（T+1 + 成本 + 回撤减仓）
+# =========================================================
+def strategy_returns_grid(signal, eth_return, max_position=1.0, cost_rate=0.0,
+                          dd_threshold=None):
+    """signal 形状 (..., days)，返回同形状的每日策略收益（首日为 0）。"""
+    ret = np.nan_to_num(np.asarray(eth_return, dtype=np.float64), nan=0.0)
+
+    # T+1 执行：position[t] = signal[t - 1] * max_position
+    position = np.zeros(signal.shape, dtype=np.float64)
+    position[..., 1:] = signal[..., :-1] * max_position
+
+    if dd_threshold is None:
+        strategy_return = position * ret
+        if cost_rate:
+            turnover = np.abs(np.diff(position, axis=-1, prepend=0.0))
+            strategy_return -= turnover * cost_rate
+        return strategy_return
+
+    # 回撤超过阈值 → 次日仓位减半（路径依赖，交给资金路径内核）
+    flat = position.reshape(-1, position.shape[-1])
+    sim = simulate_capital(flat, ret, cost_rate=cost_rate, initial_capital=1.0,
+                           dd_threshold=dd_threshold)
+    return sim['strategy_return'].reshape(position.shape)
+
+
+def sharpe_from_returns(strategy_return, periods_per_year=365, skip_first=False):
+    """
+    沿最后一维计算年化 Sharpe；收益恒为 0（std == 0）时返回 NaN。
+    skip_first=True 时去掉首行，对齐资金级（Level 5 / 6）的 capital.pct_change().dropna() 口径。
+    """
+    if skip_first:
+        strategy_return = strategy_return[..., 1:]
+    mean = strategy_return.mean(axis=-1)
+    std = strategy_return.std(axis=-1, ddof=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = mean / std * np.sqrt(periods_per_year)
+    sharpe = np.asarray(sharpe, dtype=np.float64)
+    sharpe[std == 0] = np.nan
+    return sharpe
+
+
+# =========================================================
+# 3. 全网格 Sharpe（T+1 执行）
+# =========================================================
+def sharpe_grid(eth_return, pntvl_change, divergence_strength,
+                window_values, z_values, periods_per_year=365,
+                max_cells=50_000_000, robust=False):
+    """
+    整张参数网格的 Sharpe，按窗口分块以控制 (windows × z × days) 的内存占用。
+    robust=True 时 Z-score 改用滑动中位数 / MAD。
+    """
+    eth_return = np.asarray(eth_return, dtype=np.float64)
+    pntvl_change = np.asarray(pntvl_change, dtype=np.float64)
+    window_values = np.asarray(window_values, dtype=np.int64)
+    z_values = np.asarray(z_values, dtype=np.float64)
+
+    n = eth_return.shape[0]
+    with stage('sweep.zscore', windows=len(window_values)):
+        zscore = robust_zscore_matrix if robust else rolling_zscore_matrix
+        z_matrix = zscore(divergence_strength, window_values)
+
+    sharpe = np.full((len(window_values), len(z_values)), np.nan)
+    block = max(1, max_cells // max(1, len(z_values) * n))
+
+    for lo in range(0, len(window_values), block):
+        hi = min(lo + block, len(window_values))
+        with stage('sweep.signal'):
+            signal = signal_grid(eth_return, pntvl_change, z_matrix[lo:hi], z_values)
+        with stage('sweep.execution'):
+            strategy_return = strategy_returns_grid(signal, eth_return)
+        with stage('sweep.metrics'):
+            sharpe[lo:hi] = sharpe_from_returns(strategy_return, periods_per_year)
+
+    return sharpe
+
+
+def sweep_heatmap(df_base, window_values, z_values, periods_per_year=365, robust=False):
+    """返回与 Level 3 Optimization 相同结构的热力图：index = window，columns = z。"""
+    sharpe = sharpe_grid(
+        df_base['eth_return'].to_numpy(),
+        df_base['pntvl_change'].to_numpy(),
+        df_base['divergence_strength'].to_numpy(),
+        window_values,
+        z_values,
+        periods_per_year=periods_per_year,
+        robust=robust,
+    )
+    return pd.DataFrame(sharpe, index=list(window_values), columns=z_values)
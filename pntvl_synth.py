@@ -0,0 +1,265 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # 没有 pyarrow 时只能用 pandas 写 CSV
+    pa = pa_csv = ipc = pq = None
+
+# 频率 → (每根 K 线秒数, 文件名中的 K 线周期)
+FREQUENCIES = {
+    'D': (86400, 'D'),
+    '4h': (14400, '240'),
+    '1h': (3600, '60'),
+    '15m': (900, '15'),
+    '5m': (300, '5'),
+    '1m': (60, '1'),
+}
+CHAINS = {'ETH': 'ethereum', 'SOL': 'solana', 'AVAX': 'avalanche', 'BNB': 'bsc', 'BTC': 'bitcoin'}
+START_PRICE = {'ETH': 2000.0, 'SOL': 100.0, 'AVAX': 30.0, 'BNB': 300.0, 'BTC': 40000.0}
+
+# 市场状态：(日漂移, 日波动率, TVL 份额日漂移)，牛 / 熊 / 震荡
+REGIMES = np.array([
+    [0.0015, 0.030, 0.0008],
+    [-0.0015, 0.050, -0.0010],
+    [0.0, 0.035, 0.0],
+])
+MEAN_REGIME_DAYS = 120
+CHUNK_DAYS = 100_000
+
+
+# =========================================================
+# 1. 跨块状态：当前市场状态 / 剩余持续 K 线数 / 各资产最新价格与 TVL 份额
+# =========================================================
+def _initial_state(assets, rng):
+    return {
+        'regime': int(rng.integers(len(REGIMES))),
+        'remaining': 0,
+        'log_price': np.log([START_PRICE.get(a, 50.0) for a in assets]),
+        'log_units': np.log(np.full(len(assets), 3e7)),
+    }
+
+
+def _regime_path(rng, state, n, mean_bars):
+    """几何分布的持续时长 + 换到另一个状态，np.repeat 展开成逐 K 线的状态序列。"""
+    current = state['regime']
+    head = min(state['remaining'], n)
+    regimes = [np.full(head, current)]
+    remaining = state['remaining'] - head
+    filled = head
+    while filled < n:
+        k = int(2 * (n - filled) / mean_bars) + 4
+        durations = rng.geometric(1 / mean_bars, size=k)
+        steps = rng.integers(1, len(REGIMES), size=k)
+        seq = (current + np.cumsum(steps)) % len(REGIMES)
+        regimes.append(np.repeat(seq, durations))
+        filled += int(durations.sum())
+        current = int(seq[-1])
+        remaining = filled - n
+    state['regime'] = current
+    state['remaining'] = remaining
+    return np.concatenate(regimes)[:n]
+
+
+def _outage_mask(rng, n, rate, mean_len):
+    """缺失 K 线：逐根随机缺失 + 成段停机（差分 / 累加展开区间）。"""
+    drop = rng.random(n) < rate
+    starts = np.flatnonzero(rng.random(n) < rate / 50)
+    if len(starts):
+        edges = np.zeros(n + 1, dtype=np.int64)
+        np.add.at(edges, starts, 1)
+        np.add.at(edges, np.minimum(starts + rng.geometric(1 / mean_len, len(starts)), n), -1)
+        drop |= np.cumsum(edges[:-1]) > 0
+    return drop
+
+
+# =========================================================
+# 2. 一个分块：所有资产的 OHLCV + 日度 TVL，全部向量化生成
+# =========================================================
+def _chunk(rng, state, start, offset, n, bar_seconds, assets, gap_rate, correlation):
+    bars_per_day = max(1, 86400 // bar_seconds)
+    scale = bar_seconds / 86400
+    regime = _regime_path(rng, state, n, MEAN_REGIME_DAYS * bars_per_day)
+    drift, vol, unit_drift = (REGIMES[regime, j] for j in range(3))
+
+    # 共同因子 + 个体噪声，资产间相关系数 ≈ correlation
+    common = rng.standard_normal(n)[:, None]
+    shock = np.sqrt(correlation) * common \
+        + np.sqrt(1 - correlation) * rng.standard_normal((n, len(assets)))
+    log_ret = drift[:, None] * scale + vol[:, None] * np.sqrt(scale) * shock
+    log_close = state['log_price'] + np.cumsum(log_ret, axis=0)
+    log_open = np.vstack((state['log_price'], log_close[:-1]))
+
+    # TVL 份额：随机游走 + 稀疏跳变，制造与价格的背离
+    jumps = (rng.random((n, len(assets))) < scale / 200) * rng.normal(0, 0.05, (n, len(assets)))
+    unit_ret = unit_drift[:, None] * scale + 0.01 * np.sqrt(scale) \
+        * rng.standard_normal((n, len(assets))) + jumps
+    log_units = state['log_units'] + np.cumsum(unit_ret, axis=0)
+    state['log_price'] = log_close[-1]
+    state['log_units'] = log_units[-1]
+
+    close = np.exp(log_close)
+    open_ = np.exp(log_open)
+    wick = vol[:, None] * np.sqrt(scale) * 0.5
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.standard_normal(close.shape)) * wick)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.standard_normal(close.shape)) * wick)
+    volume = 3e5 * scale * np.exp(rng.normal(0, 0.3, close.shape)) * (1 + 20 * np.abs(log_ret))
+
+    seconds = start + (offset + np.arange(n, dtype=np.int64)) * bar_seconds
+    datetime = seconds.astype('datetime64[s]')
+    # 日度 TVL 取每天最后一根 K 线时刻的值
+    day_end = np.arange(bars_per_day - 1, n, bars_per_day)
+    day = (seconds[day_end] // 86400 * 86400).astype('datetime64[s]')
+    tvl = np.exp(log_close[day_end] + log_units[day_end])
+
+    out = {}
+    for j, asset in enumerate(assets):
+        keep = ~_outage_mask(rng, n, gap_rate, 6 * bars_per_day) if gap_rate else slice(None)
+        keep_day = rng.random(len(day)) >= gap_rate if gap_rate else slice(None)
+        out[asset] = (
+            pd.DataFrame({'date': day[keep_day], 'tvl_usd': tvl[keep_day, j]}),
+            pd.DataFrame({
+                'datetime': datetime[keep],
+                'open': open_[keep, j],
+                'high': high[keep, j],
+                'low': low[keep, j],
+                'close': close[keep, j],
+                'volume': volume[keep, j],
+            }),
+        )
+    return out
+
+
+def synth_chunks(n, freq='D', assets=('ETH',), seed=0, start='2023-01-01', gap_rate=0.0,
+                 correlation=0.6):
+    """
+    逐块生成 n 根 K 线，每块 yield {asset: (tvl_df, kline_df)}。
+    分块长度固定为 CHUNK_DAYS 天，同一 seed 的输出与调用方如何消费无关。
+    """
+    bar_seconds = FREQUENCIES[freq][0]
+    bars_per_day = max(1, 86400 // bar_seconds)
+    chunk_rows = CHUNK_DAYS * bars_per_day
+    rng = np.random.default_rng(seed)
+    state = _initial_state(assets, rng)
+    start = pd.Timestamp(start).normalize().value // 10**9
+
+    for offset in range(0, n, chunk_rows):
+        yield _chunk(rng, state, start, offset, min(chunk_rows, n - offset), bar_seconds,
+                     list(assets), gap_rate, correlation)
+
+
+def generate(n, freq='D', assets=('ETH',), **kwargs):
+    """一次性生成到内存：{asset: (tvl_df, kline_df)}。"""
+    parts = {a: ([], []) for a in assets}
+    for chunk in synth_chunks(n, freq, assets, **kwargs):
+        for a, (tvl_df, kline_df) in chunk.items():
+            parts[a][0].append(tvl_df)
+            parts[a][1].append(kline_df)
+    return {a: (pd.concat(t, ignore_index=True), pd.concat(k, ignore_index=True))
+            for a, (t, k) in parts.items()}
+
+
+# =========================================================
+# 3. 写盘：与脚本一致的文件名与列格式，CSV / Parquet / Feather 均逐块追加
+# =========================================================
+def dataset_paths(out_dir, n, freq='D', assets=('ETH',), start='2023-01-01', fmt='csv'):
+    bar_seconds, interval = FREQUENCIES[freq]
+    begin = pd.Timestamp(start).normalize()
+    end = begin + pd.Timedelta(seconds=n * bar_seconds)
+    paths = {}
+    for a in assets:
+        chain = CHAINS.get(a, a.lower())
+        paths[a] = (
+            os.path.join(out_dir, f"{chain}_tvl_{begin:%Y-%m-%d}_{end:%Y-%m-%d}.{fmt}"),
+            os.path.join(out_dir, f"kline_{a}USDT_{interval}_{begin:%Y%m%d}_{end:%Y%m%d}.{fmt}"),
+        )
+    return paths
+
+
+class _Writer:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+
+    def write(self, frame):
+        if self.fmt == 'csv' and pa is None:
+            frame = frame.copy()
+            for col in ('date', 'datetime'):
+                if col in frame:
+                    fmt = '%Y-%m-%d' if col == 'date' else '%Y-%m-%d %H:%M:%S'
+                    frame[col] = frame[col].dt.strftime(fmt)
+            frame.to_csv(self.path, mode='a' if self.writer else 'w',
+                         header=self.writer is None, index=False)
+            self.writer = True
+            return
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if 'date' in frame:
+            # 日度 TVL 的日期按 date32 写出，CSV 中为 YYYY-MM-DD
+            table = table.set_column(0, 'date', table.column('date').cast(pa.date32()))
+        if self.writer is None:
+            if self.fmt == 'csv':
+                self.writer = pa_csv.CSVWriter(self.path, table.schema,
+                                               write_options=pa_csv.WriteOptions(quoting_style='none'))
+            elif self.fmt == 'parquet':
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            elif self.fmt == 'feather':
+                self.writer = ipc.new_file(self.path, table.schema)
+            else:
+                raise ValueError(f"unknown format: {self.fmt!r}")
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer not in (None, True):
+            self.writer.close()
+
+
+def write_dataset(out_dir, n, freq='D', assets=('ETH',), seed=0, start='2023-01-01',
+                  gap_rate=0.0, fmt='csv', correlation=0.6):
+    """写出 {asset: (tvl_path, kline_path)}；峰值内存只与一个分块有关。"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = dataset_paths(out_dir, n, freq, assets, start, fmt)
+    writers = {a: (_Writer(t, fmt), _Writer(k, fmt)) for a, (t, k) in paths.items()}
+    try:
+        for chunk in synth_chunks(n, freq, assets, seed=seed, start=start, gap_rate=gap_rate,
+                                  correlation=correlation):
+            for a, (tvl_df, kline_df) in chunk.items():
+                writers[a][0].write(tvl_df)
+                writers[a][1].write(kline_df)
+    finally:
+        for tvl_writer, kline_writer in writers.values():
+            tvl_writer.close()
+            kline_writer.close()
+    return paths
+
+
+# =========================================================
+# 4. 命令行
+# =========================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic TVL / kline data generator")
+    parser.add_argument('rows', type=int, help="每个资产的 K 线根数")
+    parser.add_argument('--freq', choices=list(FREQUENCIES), default='D')
+    parser.add_argument('--assets', nargs='+', default=['ETH'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2023-01-01')
+    parser.add_argument('--gap-rate', type=float, default=0.0)
+    parser.add_argument('--format', choices=['csv', 'parquet', 'feather'], default='csv')
+    parser.add_argument('--out-dir', default='.')
+    args = parser.parse_args(argv)
+
+    paths = write_dataset(args.out_dir, args.rows, args.freq, args.assets, seed=args.seed,
+                          start=args.start, gap_rate=args.gap_rate, fmt=args.format)
+    for asset, (tvl_path, kline_path) in paths.items():
+        print(f"{asset}: {tvl_path}, {kline_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+# =========================================================
+# 交易台账：一次向量化扫描仓位序列，得到开仓 / 平仓 / 反转事件
+# =========================================================
+def trade_ledger(dates, price, position, strategy_return=None):
+    """
+    position[t] 为第 t 日持有的仓位（已 T+1），对应收益 close[t-1] → close[t]，
+    所以一笔从第 s 日持有到第 e 日的交易在 close[s-1] 成交、close[e] 平仓。
+    strategy_return 给出时按其复利计算 pnl（含成本，平仓到空仓当日的成本计入该笔）；
+    否则按成交价计算。
+    """
+    dates = pd.Series(dates).reset_index(drop=True)
+    price = np.asarray(price, dtype=np.float64)
+    pos = np.asarray(position, dtype=np.float64)
+    n = len(pos)
+
+    prev = np.empty(n)
+    prev[0] = 0.0
+    prev[1:] = pos[:-1]
+    change_idx = np.flatnonzero(pos != prev)
+
+    # 每笔交易：从非零仓位的变化点开始，到下一个变化点前一日结束
+    starts = change_idx[pos[change_idx] != 0]
+    nxt = np.searchsorted(change_idx, starts, side='right')
+    has_next = nxt < len(change_idx)
+    end_excl = np.where(has_next, change_idx[np.minimum(nxt, len(change_idx) - 1)], n)
+    ends = end_excl - 1
+
+    entry_idx = np.maximum(starts - 1, 0)
+    exit_idx = ends
+    side = np.sign(pos[starts])
+
+    next_pos = np.where(has_next, pos[np.minimum(end_excl, n - 1)], np.nan)
+    exit_type = np.select(
+        [~has_next, next_pos == 0, np.sign(next_pos) == side],
+        ['open', 'exit', 'resize'],
+        default='reversal',
+    )
+
+    entry_price = price[entry_idx]
+    exit_price = price[exit_idx]
+
+    if strategy_return is None:
+        pnl = side * np.abs(pos[starts]) * (exit_price / entry_price - 1)
+    else:
+        equity = np.cumprod(1 + np.nan_to_num(np.asarray(strategy_return, dtype=np.float64)))
+        equity = np.concatenate(([1.0], equity))
+        # 平仓到空仓时，次日的换手成本属于这笔交易
+        pnl_end = np.where(exit_type == 'exit', end_excl, ends)
+        pnl = equity[pnl_end + 1] / equity[starts] - 1
+
+    entry_date = dates.iloc[entry_idx].reset_index(drop=True)
+    exit_date = dates.iloc[exit_idx].reset_index(drop=True)
+
+    return pd.DataFrame({
+        'trade_id': np.arange(1, len(starts) + 1),
+        'side': np.where(side > 0, 'Long', 'Short'),
+        'size': np.abs(pos[starts]),
+        'entry_index': entry_idx,
+        'exit_index': exit_idx,
+        'entry_date': entry_date,
+        'exit_date': exit_date,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'holding_days': (exit_date - entry_date).dt.days,
+        'bars': ends - starts + 1,
+        'exit_type': exit_type,
+        'pnl': pnl,
+    })
+
+
+def ledger_stats(ledger):
+    """基于台账的交易统计：笔数、胜率、平均盈亏与平均持仓天数。"""
+    if ledger.empty:
+        return {'trade_count': 0, 'win_rate': np.nan,
+                'avg_pnl': np.nan, 'avg_holding_days': np.nan}
+    return {
+        'trade_count': len(ledger),
+        'win_rate': (ledger['pnl'] > 0).mean(),
+        'avg_pnl': ledger['pnl'].mean(),
+        'avg_holding_days': ledger['holding_days'].mean(),
+    }
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_data import bar_periods_per_year
+from pntvl_rolling import rolling_zscore_matrix
+from pntvl_sweep import signal_grid, strategy_returns_grid
+
+
+# =========================================================
+# 1. 折（fold）划分：滚动或锚定（扩张）训练区间 + 紧随其后的样本外区间
+# =========================================================
+def make_folds(n, train_size, test_size, step=None, anchored=False):
+    step = step or test_size
+    folds = []
+    start = 0
+    while start + train_size + test_size <= n:
+        train_start = 0 if anchored else start
+        train_end = start + train_size
+        folds.append((train_start, train_end, train_end, train_end + test_size))
+        start += step
+    return np.array(folds, dtype=np.int64).reshape(-1, 4)
+
+
+# =========================================================
+# 2. 全网格收益的前缀和：只算一次，之后每个 fold 的 Sharpe 都是 O(1) 差分
+# =========================================================
+def _grid_prefix(df_base, window_values, z_values, max_position, cost_rate):
+    eth_return = df_base['eth_return'].to_numpy()
+    z_matrix = rolling_zscore_matrix(df_base['divergence_strength'].to_numpy(), window_values)
+    signal = signal_grid(eth_return, df_base['pntvl_change'].to_numpy(), z_matrix, z_values)
+    signal = signal.reshape(-1, signal.shape[-1])
+
+    sr = strategy_returns_grid(signal, eth_return, max_position=max_position,
+                               cost_rate=cost_rate)
+    pad = np.zeros((sr.shape[0], 1))
+    s1 = np.concatenate((pad, np.cumsum(sr, axis=1)), axis=1)
+    s2 = np.concatenate((pad, np.cumsum(sr * sr, axis=1)), axis=1)
+    return signal, s1, s2
+
+
+def _span_sharpe(s1, s2, start, end, periods_per_year):
+    # start / end 为 (folds,) 数组，返回 (cells × folds)
+    n = (end - start).astype(np.float64)
+    total = s1[:, end] - s1[:, start]
+    total2 = s2[:, end] - s2[:, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        var = np.maximum((total2 - total * mean) / (n - 1), 0.0)
+        sharpe = mean / np.sqrt(var) * np.sqrt(periods_per_year)
+    sharpe[var <= 0] = np.nan
+    return sharpe
+
+
+# =========================================================
+# 3. Walk-forward 主流程
+# =========================================================
+def walk_forward(df_base, window_values, z_values, train_size, test_size, step=None,
+                 anchored=False, max_position=1.0, fee_rate=0.0, slippage_rate=0.0,
+                 periods_per_year=None):
+    """
+    每个 fold 在训练区间选 Sharpe 最高的 (window, z)，在下一段样本外区间执行，
+    最后拼接样本外收益。滚动统计与收益前缀和对所有 fold 只计算一次。
+    step 不能大于 test_size：否则相邻样本外区间之间的 bar 不属于任何 fold，
+    拼接后的收益与净值会把不连续的区间当作连续计算。
+    """
+    if step is not None and step > test_size:
+        raise ValueError(f"step ({step}) > test_size ({test_size}) leaves bars between "
+                         "out-of-sample windows; use step <= test_size")
+    window_values = list(window_values)
+    z_values = np.asarray(z_values, dtype=np.float64)
+    periods_per_year = periods_per_year or bar_periods_per_year(df_base['date'])
+    cost_rate = fee_rate + slippage_rate
+
+    signal, s1, s2 = _grid_prefix(df_base, window_values, z_values, max_position, cost_rate)
+    folds = make_folds(signal.shape[1], train_size, test_size, step, anchored)
+    if len(folds) == 0:
+        raise ValueError("not enough rows for a single train/test fold")
+
+    train_sharpe = _span_sharpe(s1, s2, folds[:, 0], folds[:, 1], periods_per_year)
+    test_sharpe = _span_sharpe(s1, s2, folds[:, 2], folds[:, 3], periods_per_year)
+
+    filled = np.where(np.isnan(train_sharpe), -np.inf, train_sharpe)
+    best = filled.argmax(axis=0)
+    fold_idx = np.arange(len(folds))
+
+    # 拼接样本外收益（step < test_size 时后一个 fold 覆盖重叠部分）
+    oos = np.full(signal.shape[1], np.nan)
+    prev_cell = None
+    for f, (_, _, test_start, test_end) in enumerate(folds):
+        cell = best[f]
+        oos[test_start:test_end] = s1[cell, test_start + 1:test_end + 1] - s1[cell, test_start:test_end]
+
+        # 换参数时，首日换手应相对上一个 fold 实际持有的仓位计算
+        if prev_cell is not None and prev_cell != cell and cost_rate and test_start >= 2:
+            pos = signal[cell, test_start - 1] * max_position
+            own_prev = signal[cell, test_start - 2] * max_position
+            held = signal[prev_cell, test_start - 2] * max_position
+            oos[test_start] += (abs(pos - own_prev) - abs(pos - held)) * cost_rate
+        prev_cell = cell
+
+    n_z = len(z_values)
+    summary = pd.DataFrame({
+        'train_start': df_base['date'].iloc[folds[:, 0]].to_numpy(),
+        'train_end': df_base['date'].iloc[folds[:, 1] - 1].to_numpy(),
+        'test_start': df_base['date'].iloc[folds[:, 2]].to_numpy(),
+        'test_end': df_base['date'].iloc[folds[:, 3] - 1].to_numpy(),
+        'window': np.asarray(window_values)[best // n_z],
+        'z_threshold': z_values[best % n_z],
+        'train_sharpe': train_sharpe[best, fold_idx],
+        'test_sharpe': test_sharpe[best, fold_idx],
+    })
+    summary.index.name = 'fold'
+
+    oos_return = pd.Series(oos, index=df_base['date']).dropna()
+    return {
+        'folds': summary,
+        'oos_return': oos_return,
+        'equity_curve': (1 + oos_return).cumprod(),
+    }
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pntvl_market  # noqa: E402
+from pntvl_data import load_merged  # noqa: E402
+from pntvl_market import MarketStore, ingest_kline_csv, ingest_tvl_csv, series_symbol  # noqa: E402
+from pntvl_parity import run_script  # noqa: E402
+from pntvl_strategy import StrategyPipeline  # noqa: E402
+from pntvl_synth import write_dataset  # noqa: E402
+
+
+# 与 Level 脚本同名的合成日线 CSV（2022-01-01 → 2025-01-01，带 1% 缺失），
+# 冻结的基线指标就是在这份数据上运行 44d440c 版本的脚本得到的
+SYNTH = dict(n=1096, start='2022-01-01', seed=7, gap_rate=0.01)
+
+
+@pytest.fixture(scope='session')
+def synth_paths(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp('synth')
+    return write_dataset(str(out_dir), SYNTH['n'], start=SYNTH['start'], seed=SYNTH['seed'],
+                         gap_rate=SYNTH['gap_rate'])['ETH']
+
+
+@pytest.fixture(scope='session')
+def merged(synth_paths):
+    return load_merged(*synth_paths, use_cache=False, source='csv')
+
+
+@pytest.fixture
+def pipeline(merged):
+    return StrategyPipeline(merged)
+
+
+@pytest.fixture
+def store(synth_paths, tmp_path, monkeypatch):
+    root = str(tmp_path / 'market')
+    monkeypatch.setattr(pntvl_market, 'MARKET_DIR', root)
+    store = MarketStore(root)
+    tvl_path, price_path = synth_paths
+    ingest_tvl_csv(store, series_symbol(tvl_path), tvl_path)
+    ingest_kline_csv(store, series_symbol(price_path), price_path)
+    return store
+
+
+@pytest.fixture(scope='session')
+def scripts(synth_paths):
+    # 合成 CSV 与脚本里的文件名相同：在其目录下直接运行 Level 3–6 脚本
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(synth_paths[0]))
+    try:
+        return {level: run_script(level) for level in (3, 4, 5, 6)}
+    finally:
+        os.chdir(cwd)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_bench import STAGES, _Data, compare, run_benchmarks, speedups
+
+
+def test_reference_and_engine_do_the_same_work():
+    data = _Data(3_000, seed=1)
+    ref_setup, ref_func, _ = STAGES['capital']['reference']
+    eng_setup, eng_func, _ = STAGES['capital']['engine']
+    ref = ref_func(ref_setup(data))
+    out = eng_func(eng_setup(data))
+    # 回撤减仓必须真的触发，否则比较的只是不带风控的路径
+    assert (out['position'] != np.nan_to_num(ref['signal'].shift(1) * 0.3)).any()
+    np.testing.assert_array_equal(out['position'], ref['position'])
+    np.testing.assert_allclose(out['capital'], ref['capital'], rtol=1e-12)
+
+    for stage in ('rolling_zscore', 'signal', 'execution'):
+        ref = STAGES[stage]['reference'][1](STAGES[stage]['reference'][0](data))
+        out = STAGES[stage]['engine'][1](STAGES[stage]['engine'][0](data))
+        if stage == 'rolling_zscore':
+            np.testing.assert_allclose(out[0], ref, rtol=1e-9, atol=1e-12, equal_nan=True)
+        else:
+            pd.testing.assert_frame_equal(out, ref, check_dtype=False)
+
+
+def test_run_benchmarks_and_compare():
+    report = run_benchmarks(sizes=[500], stages=['csv_load', 'capital', 'sweep'],
+                            repeat=1, verbose=False)
+    assert set(report['results']) == {
+        'csv_load/engine/500', 'capital/reference/500', 'capital/engine/500',
+        'sweep/reference/500', 'sweep/engine/500'}
+    assert report['meta']['sizes'] == [500]
+
+    table = speedups(report)
+    assert sorted(table['stage']) == ['capital', 'sweep']
+    assert (table['speedup'] > 0).all()
+
+    assert compare(report, report) == []
+    slow = {'results': {k: {**v, 'min': v['min'] / 2} for k, v in report['results'].items()}}
+    regressions = compare(report, slow, threshold=0.5)
+    assert {r['benchmark'] for r in regressions} == set(report['results'])
+    assert all(r['ratio'] == 2.0 for r in regressions)
+    assert compare(report, slow, threshold=1.5) == []
@@ -0,0 +1,56 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_bootstrap import bootstrap_metrics
+
+
+@pytest.fixture(scope='module')
+def returns():
+    return np.random.default_rng(11).normal(0.001, 0.02, 1000)
+
+
+def test_iid_bootstrap_sharpe_distribution(returns):
+    # block_size = 1 即 i.i.d. 有放回重抽样：Sharpe 的抽样分布以点估计为中心，
+    # 标准误 ≈ sqrt(ppy × (1 + SR_bar² / 2) / n)（SR_bar 为单 bar Sharpe）
+    out = bootstrap_metrics(returns, 1000, n_paths=4000, block_size=1, seed=3)
+    sharpe = out.loc['Sharpe Ratio']
+    sr_bar = returns.mean() / returns.std(ddof=1)
+    se = np.sqrt(365 * (1 + sr_bar ** 2 / 2) / len(returns))
+    assert sharpe['point'] == pytest.approx(sr_bar * np.sqrt(365), rel=1e-12)
+    assert abs(sharpe['mean'] - sharpe['point']) < 4 * se / np.sqrt(4000) + 0.02 * se
+    assert sharpe['ci_high'] - sharpe['ci_low'] == pytest.approx(2 * 1.96 * se, rel=0.08)
+
+
+def test_permutation_keeps_product_and_sharpe(returns):
+    # 置换不改变收益的乘积、均值与标准差：年化收益与 Sharpe 的区间退化为点，回撤仍有分布
+    out = bootstrap_metrics(returns, 1000, n_paths=500, method='permute', seed=1)
+    for name in ('Annual Return', 'Sharpe Ratio'):
+        row = out.loc[name]
+        assert row['ci_low'] == pytest.approx(row['point'], rel=1e-9)
+        assert row['ci_high'] == pytest.approx(row['point'], rel=1e-9)
+    mdd = out.loc['Max Drawdown']
+    assert mdd['ci_low'] < mdd['ci_high'] <= 0
+
+
+@pytest.mark.parametrize('method', ['block', 'permute'])
+def test_tiling_does_not_change_draws(returns, method):
+    pnl = np.random.default_rng(2).normal(0, 1, 80)
+    whole = bootstrap_metrics(returns, 1000, n_paths=300, method=method, seed=5, trade_pnl=pnl)
+    tiled = bootstrap_metrics(returns, 1000, n_paths=300, method=method, seed=5, trade_pnl=pnl,
+                              max_bytes=len(returns) * 8 * 3 * 7)
+    pd.testing.assert_frame_equal(tiled, whole, check_exact=True)
+
+
+def test_peak_memory_within_budget(returns):
+    max_bytes = 4 * 2**20
+    bootstrap_metrics(returns, 1000, n_paths=50, max_bytes=max_bytes)
+    n_paths = 5000
+    tracemalloc.start()
+    bootstrap_metrics(returns, 1000, n_paths=n_paths, max_bytes=max_bytes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # 预算 + 每条路径 5 个指标的结果数组 + 少量常数开销
+    assert peak < 1.1 * max_bytes + n_paths * 5 * 8
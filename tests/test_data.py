@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from pntvl_data import bar_periods_per_year
+
+
+@pytest.mark.parametrize('freq, expected', [('D', 365), ('1h', 8760), ('5min', 105120)])
+def test_bar_periods_per_year(freq, expected):
+    assert bar_periods_per_year(pd.date_range('2024-01-01', periods=50, freq=freq)) == expected
+
+
+def test_repeated_timestamps_are_ignored():
+    dates = pd.date_range('2024-01-01', periods=50, freq='1h')
+    # 超过一半的间隔为 0（同一时间戳重复多次）时，中位数不能取到 0
+    repeated = dates.repeat(3)
+    assert bar_periods_per_year(repeated) == 8760
+
+
+def test_identical_timestamps_raise():
+    with pytest.raises(ValueError, match='identical'):
+        bar_periods_per_year(pd.DatetimeIndex(['2024-01-01'] * 5))
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from pntvl_execution import simulate_execution
+from pntvl_kernel import simulate_capital
+
+
+def _bars(n=300, seed=0, volume=1e6):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([100.0], close[:-1])) * (1 + rng.normal(0, 0.002, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, n))
+    return dict(open_=open_, high=high, low=low, close=close, volume=np.full(n, volume))
+
+
+def _step_target(n, t, size):
+    target = np.zeros(n)
+    target[t:] = size
+    return target
+
+
+def test_flat_cost_matches_simulate_capital():
+    bars = _bars()
+    rng = np.random.default_rng(1)
+    target = np.concatenate(([0.0], rng.choice([-0.3, 0.0, 0.3], len(bars['close']) - 1)))
+    ex = simulate_execution(target, **bars, fee_rate=0.0007, initial_capital=1e5)
+    ret = np.concatenate(([0.0], bars['close'][1:] / bars['close'][:-1] - 1))
+    sim = simulate_capital(target, ret, cost_rate=0.0007, initial_capital=1e5)
+    np.testing.assert_array_equal(ex['position'], target)
+    np.testing.assert_allclose(ex['turnover'], sim['turnover'], rtol=1e-12)
+    np.testing.assert_allclose(ex['strategy_return'], sim['strategy_return'],
+                               rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(ex['capital'], sim['capital'], rtol=1e-12)
+
+
+def test_market_order_pays_half_spread_and_taker_fee():
+    bars = _bars()
+    ex = simulate_execution(_step_target(300, 10, 0.5), **bars, fee_rate=0.001,
+                            half_spread=0.002)
+    fills = ex['fills'].to_frame()
+    assert len(fills) == 1 and fills.loc[0, 'bar'] == 10
+    assert fills.loc[0, 'price'] == pytest.approx(bars['close'][9] * 1.002, rel=1e-15)
+    assert fills.loc[0, 'fee'] == pytest.approx(0.5 * 0.001, rel=1e-15)
+    # 当根收益：持仓从成交价到收盘价，再扣手续费
+    expected = 0.5 * (bars['close'][10] / (bars['close'][9] * 1.002) - 1) - 0.0005
+    assert ex['strategy_return'][10] == pytest.approx(expected, rel=1e-12)
+
+    sell = simulate_execution(-_step_target(300, 10, 0.5), **bars, fee_rate=0.0,
+                              half_spread=0.002, fill_at='open')
+    assert sell['fills'].price[0] == pytest.approx(bars['open_'][10] * 0.998, rel=1e-15)
+
+
+def test_market_impact_scales_with_size_over_volume():
+    bars = _bars(volume=2000.0)
+    ex = simulate_execution(_step_target(300, 5, 0.8), **bars, fee_rate=0.0,
+                            half_spread=0.0005, impact_coef=0.1, impact_exp=0.5,
+                            initial_capital=1e5)
+    ref = bars['close'][4]
+    shares = 0.8 * 1e5 / ref
+    slip = 0.0005 + 0.1 * (shares / 2000.0) ** 0.5
+    assert ex['fills'].price[0] == pytest.approx(ref * (1 + slip), rel=1e-12)
+
+
+def test_participation_cap_spreads_fill_over_bars():
+    bars = _bars(volume=100.0)
+    target = _step_target(300, 20, 1.0)
+    ex = simulate_execution(target, **bars, fee_rate=0.0, participation=0.1,
+                            initial_capital=1e5)
+    fills = ex['fills'].to_frame()
+    assert len(fills) > 1 and (fills['order_id'] == 0).all()
+    # 每根 K 线的成交不超过 participation × volume（按成交时的权益折算成仓位比例）
+    equity_before = np.concatenate(([1e5], ex['capital'][:-1]))
+    ref = bars['close'][fills['bar'] - 1]
+    cap = 0.1 * 100.0 * ref / equity_before[fills['bar']]
+    assert (fills['qty'].to_numpy() <= cap + 1e-15).all()
+    assert fills['qty'].sum() == pytest.approx(1.0, rel=1e-12)
+    done = fills['bar'].iloc[-1]
+    assert ex['position'][done] == pytest.approx(1.0, rel=1e-12)
+    assert (ex['position'][20:done] < 1.0).all()
+
+
+def test_limit_order_fills_only_when_touched():
+    bars = _bars()
+    ex = simulate_execution(_step_target(300, 30, 0.5), **bars, order_type='limit',
+                            limit_offset=0.01, fee_rate=0.001, maker_fee_rate=0.0002)
+    limit = bars['close'][29] * 0.99
+    touched = 30 + np.flatnonzero(bars['low'][30:] <= limit)[0]
+    fills = ex['fills'].to_frame()
+    assert fills.loc[0, 'bar'] == touched
+    assert fills.loc[0, 'price'] == min(limit, bars['open_'][touched])
+    assert fills.loc[0, 'fee'] == pytest.approx(0.5 * 0.0002, rel=1e-15)
+    assert (ex['position'][30:touched] == 0).all()
+    assert ex['orders'].to_frame().loc[0, 'limit_price'] == limit
+
+
+def test_limit_order_expires_after_ttl():
+    bars = _bars()
+    # 限价远低于市价：limit_ttl 根 K 线后撤单，之后不再成交
+    ex = simulate_execution(_step_target(300, 30, 0.5), **bars, order_type='limit',
+                            limit_offset=0.5, limit_ttl=5)
+    assert ex['fills'].count == 0
+    assert (ex['position'] == 0).all()
+
+
+def test_new_target_replaces_working_order():
+    bars = _bars(volume=50.0)
+    target = _step_target(300, 10, 1.0)
+    target[12:] = -0.2
+    ex = simulate_execution(target, **bars, fee_rate=0.0, participation=0.05,
+                            initial_capital=1e5)
+    orders = ex['orders'].to_frame()
+    assert list(orders['bar']) == [10, 12]
+    # 第二张单的数量 = 新目标 - 当时已成交的仓位
+    assert orders.loc[1, 'qty'] == pytest.approx(-0.2 - ex['position'][11], rel=1e-12)
+    assert ex['position'][-1] == pytest.approx(-0.2, rel=1e-12)
+
+
+def test_unknown_fill_at():
+    with pytest.raises(ValueError):
+        simulate_execution(np.zeros(3), *np.ones((5, 3)), fill_at='close')
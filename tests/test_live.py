@@ -0,0 +1,105 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from pntvl_live import FileTailFeed, LiveRunner, OnlineRegimeFilter, QueueFeed, replay_live
+
+
+def _params(g):
+    return {k: g[k] for k in ('window', 'z_threshold', 'ma_window', 'max_position')}
+
+
+def test_replay_live_matches_level6(scripts):
+    g = scripts[6]
+    batch = g['df']
+    live, latencies = replay_live(batch, **_params(g))
+    assert len(live) == len(batch) == len(latencies)
+    np.testing.assert_array_equal(live.index, batch['date'])
+    for col in ('raw_signal', 'regime', 'signal', 'position'):
+        np.testing.assert_array_equal(live[col], batch[col], err_msg=col)
+    np.testing.assert_allclose(live['ma200'], batch['ma200'], rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(live['divergence_z'], batch['divergence_z'],
+                               rtol=1e-8, atol=1e-10, equal_nan=True)
+    # 每日发布的 next_position 就是批量回测次日的仓位
+    np.testing.assert_array_equal(live['next_position'].to_numpy()[:-1],
+                                  batch['position'].to_numpy()[1:])
+
+
+def test_runner_inner_joins_out_of_order_feeds(merged):
+    df = merged.iloc[:260].reset_index(drop=True)
+    dates, tvl, close = df['date'].tolist(), df['tvl_usd'].tolist(), df['eth_price'].tolist()
+    missing_kline = {5, 100}
+    missing_tvl = {150}
+
+    async def main():
+        tvl_feed, kline_feed = QueueFeed(), QueueFeed()
+        rows = []
+
+        async def publish(row):
+            rows.append(row)
+
+        runner = LiveRunner(tvl_feed, kline_feed, OnlineRegimeFilter(ma_window=50),
+                            publish=publish)
+        task = asyncio.create_task(runner.run())
+        for i in range(len(df)):
+            # K 线比 TVL 晚到一根；迟到的旧日期（早于已发布的 bar）被丢弃
+            if i not in missing_tvl:
+                tvl_feed.put(dates[i], tvl[i])
+            if i >= 1 and i - 1 not in missing_kline:
+                kline_feed.put(dates[i - 1], close[i - 1])
+            if i == 120:
+                kline_feed.put(dates[100], close[100])
+            await asyncio.sleep(0)
+        kline_feed.put(dates[-1], close[-1])
+        tvl_feed.close()
+        kline_feed.close()
+        await task
+        return rows
+
+    rows = asyncio.run(main())
+    keep = [i for i in range(len(df)) if i not in missing_kline | missing_tvl]
+    assert [r['date'] for r in rows] == [dates[i] for i in keep]
+
+    direct = OnlineRegimeFilter(ma_window=50)
+    for row, i in zip(rows, keep):
+        expected = direct.update(tvl[i], close[i])
+        assert row['position'] == expected['position']
+        assert row['next_position'] == direct.next_position
+        np.testing.assert_equal(row['divergence_z'], expected['divergence_z'])
+
+
+def test_online_regime_filter_gates_signals():
+    strategy = OnlineRegimeFilter(window=3, z_threshold=0.0, ma_window=2, max_position=0.5)
+    rows = [strategy.update(t, p) for t, p in
+            zip([100, 100, 100, 120, 90, 130, 80], [10, 10, 10, 9, 11, 8, 12])]
+    for prev, row in zip(rows, rows[1:]):
+        assert row['position'] == prev['signal'] * 0.5
+    for row in rows:
+        if row['signal']:
+            assert row['signal'] == row['raw_signal'] == row['regime']
+    assert any(r['raw_signal'] and not r['signal'] for r in rows)
+
+
+def test_file_tail_feed_waits_for_complete_lines(tmp_path):
+    path = tmp_path / 'tvl.csv'
+    path.write_text("date,tvl_usd\n2024-01-01,1.5\n2024-01-02,2")
+
+    async def main():
+        out = []
+
+        async def writer():
+            await asyncio.sleep(0.05)
+            with open(path, 'a') as f:
+                f.write(".5\n2024-01-03,3.5\n")
+
+        feed = FileTailFeed(str(path), 'tvl_usd', poll_interval=0.01, idle_timeout=0.15)
+        task = asyncio.create_task(writer())
+        async for item in feed:
+            out.append(item)
+        await task
+        return out
+
+    assert asyncio.run(main()) == [(pd.Timestamp('2024-01-01'), 1.5),
+                                   (pd.Timestamp('2024-01-02'), 2.5),
+                                   (pd.Timestamp('2024-01-03'), 3.5)]
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import pntvl_market
+from pntvl_data import load_merged
+from pntvl_market import MarketStore, ingest_kline_csv, ingest_tvl_csv, series_symbol
+
+
+def test_series_symbol():
+    assert series_symbol('data/ethereum_tvl_2022-01-01_2025-01-01.csv') == 'ethereum'
+    assert series_symbol('kline_ETHUSDT_D_20230101_20260101_spot.csv') == 'ETHUSDT_D_spot'
+
+
+@pytest.mark.parametrize('start, end', [(None, None), ('2023-03-01', '2023-03-08'),
+                                        ('2022-06-15', '2024-02-01')])
+def test_load_merged_from_store_matches_csv(store, synth_paths, start, end):
+    csv = load_merged(*synth_paths, use_cache=False, start=start, end=end, source='csv')
+    market = load_merged(*synth_paths, start=start, end=end, source='market')
+    auto = load_merged(*synth_paths, use_cache=False, start=start, end=end, source='auto')
+    pd.testing.assert_frame_equal(market, csv, check_exact=True)
+    pd.testing.assert_frame_equal(auto, csv, check_exact=True)
+
+
+def test_asof_join_from_store_matches_csv(store, synth_paths):
+    kwargs = dict(start='2023-05-01', end='2023-06-01', join='asof', tvl_lag=pd.Timedelta(days=1))
+    csv = load_merged(*synth_paths, use_cache=False, source='csv', **kwargs)
+    market = load_merged(*synth_paths, source='market', **kwargs)
+    pd.testing.assert_frame_equal(market, csv, check_exact=True)
+
+
+def test_append_is_idempotent(store, synth_paths):
+    tvl_path = synth_paths[0]
+    before = store.info('tvl', 'ethereum')
+    assert ingest_tvl_csv(store, 'ethereum', tvl_path) == 0
+    assert store.info('tvl', 'ethereum') == before
+
+
+def test_missing_series(synth_paths, tmp_path, monkeypatch):
+    monkeypatch.setattr(pntvl_market, 'MARKET_DIR', str(tmp_path / 'empty'))
+    with pytest.raises(FileNotFoundError):
+        load_merged(*synth_paths, source='market')
+    # auto：库里没有时退回读 CSV
+    assert len(load_merged(*synth_paths, use_cache=False, source='auto')) > 0
+
+
+def test_partially_ingested_store(synth_paths, tmp_path, monkeypatch):
+    root = str(tmp_path / 'partial')
+    monkeypatch.setattr(pntvl_market, 'MARKET_DIR', root)
+    store = MarketStore(root)
+    tvl_path, price_path = synth_paths
+    # 只导入 2023 年以前的 K 线，TVL 完整
+    kline = pd.read_csv(price_path)
+    kline[kline['datetime'] < '2023-01-01'].to_csv(tmp_path / 'part.csv', index=False)
+    ingest_tvl_csv(store, series_symbol(tvl_path), tvl_path)
+    ingest_kline_csv(store, series_symbol(price_path), str(tmp_path / 'part.csv'))
+
+    inside = dict(start='2022-03-01', end='2022-09-01')
+    csv = load_merged(*synth_paths, use_cache=False, source='csv', **inside)
+    pd.testing.assert_frame_equal(load_merged(*synth_paths, source='market', **inside), csv)
+
+    for window in [dict(start='2022-06-01', end='2024-01-01'), dict(start=None, end=None)]:
+        csv = load_merged(*synth_paths, use_cache=False, source='csv', **window)
+        auto = load_merged(*synth_paths, use_cache=False, source='auto', **window)
+        # 库只覆盖一部分（或区间未给定）时自动模式退回 CSV，而不是返回被截断的数据
+        pd.testing.assert_frame_equal(auto, csv, check_exact=True)
+        assert csv['date'].max() >= pd.Timestamp('2023-06-01')
+    with pytest.raises(ValueError, match='do not cover'):
+        load_merged(*synth_paths, source='market', start='2022-06-01', end='2024-01-01')
+    # 默认只读 CSV
+    pd.testing.assert_frame_equal(load_merged(*synth_paths, use_cache=False), csv)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from pntvl_metrics import MetricsAccumulator, merge_all
+from pntvl_strategy import LEVEL_PARAMS, level_metrics
+from pntvl_trades import ledger_stats
+
+LEVEL4 = {k: v for k, v in LEVEL_PARAMS[4].items() if k != 'trade_rule'}
+
+
+def _ledger_accumulators(ex, dates, cuts):
+    bounds = [0, *cuts, len(dates)]
+    parts = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        acc = MetricsAccumulator(trade_rule='ledger')
+        acc.update_many(ex['strategy_return'][lo:hi], dates[lo:hi],
+                        positions=ex['position'][lo:hi])
+        parts.append(acc)
+    return parts
+
+
+@pytest.mark.parametrize('cuts', [[], [1], [75, 76, 77], [100, 333, 500, 800], list(range(50, 1000, 37))])
+def test_split_merged_ledger_matches_trade_ledger(pipeline, merged, cuts):
+    ex = pipeline.execution(**LEVEL4)
+    dates = merged['date'].to_numpy()
+    result = merge_all(_ledger_accumulators(ex, dates, cuts)).result(pipeline.periods_per_year)
+
+    stats = ledger_stats(pipeline.ledger(**LEVEL4))
+    assert result['trade_count'] == stats['trade_count']
+    assert result['win_rate'] == pytest.approx(stats['win_rate'], rel=1e-12)
+
+    expected = level_metrics(pipeline, 4)
+    for name in ['annual_return', 'sharpe_ratio', 'calmar_ratio', 'max_drawdown']:
+        assert result[name] == pytest.approx(expected[name], rel=1e-9), name
+
+
+def test_scalar_updates_match_chunked(pipeline, merged):
+    ex = pipeline.execution(**LEVEL4)
+    dates = merged['date'].to_numpy()
+    scalar = MetricsAccumulator(trade_rule='ledger')
+    for r, d, p in zip(ex['strategy_return'], dates, ex['position']):
+        scalar.update(r, d, position=p)
+    chunked = merge_all(_ledger_accumulators(ex, dates, [300, 600]))
+    a, b = scalar.result(), chunked.result()
+    assert a['trade_count'] == b['trade_count']
+    for name in ['annual_return', 'sharpe_ratio', 'max_drawdown', 'win_rate']:
+        assert a[name] == pytest.approx(b[name], rel=1e-9), name
+
+
+def test_turnover_rule_matches_level3(pipeline, merged):
+    params = {k: v for k, v in LEVEL_PARAMS[3].items() if k != 'trade_rule'}
+    ex = pipeline.execution(**params)
+    trade = pipeline.trades('exit', params)
+    dates = merged['date'].to_numpy()
+    parts = []
+    for lo, hi in [(0, 400), (400, 401), (401, len(dates))]:
+        acc = MetricsAccumulator()
+        acc.update_many(ex['strategy_return'][lo:hi], dates[lo:hi], trade=trade[lo:hi],
+                        trade_pnl=ex['trade_pnl'][lo:hi])
+        parts.append(acc)
+    result = merge_all(parts).result()
+    expected = level_metrics(pipeline, 3)
+    for name in expected:
+        assert result[name] == pytest.approx(expected[name], rel=1e-9), name
+    assert np.isfinite(result['sharpe_ratio'])
@@ -0,0 +1,27 @@
+import numpy as np
+
+from pntvl_online import RollingWelford, replay
+
+
+def test_replay_matches_batch(pipeline, merged):
+    online = replay(merged, window=75, z_threshold=1.1, max_position=0.3)
+    frame = pipeline.frame(window=75, z_threshold=1.1, max_position=0.3)
+    for col in ['eth_return', 'pntvl_change', 'divergence_strength']:
+        np.testing.assert_allclose(online[col], frame[col], rtol=1e-12, equal_nan=True)
+    np.testing.assert_allclose(online['divergence_z'], frame['divergence_z'],
+                               rtol=1e-8, atol=1e-10, equal_nan=True)
+    np.testing.assert_array_equal(online['signal'], frame['signal'])
+    np.testing.assert_array_equal(online['position'], frame['position'])
+
+
+def test_rolling_welford_nan_window():
+    x = np.arange(20, dtype=np.float64)
+    x[7] = np.nan
+    stats = RollingWelford(5)
+    ready = []
+    for v in x:
+        stats.update(v)
+        ready.append(stats.ready)
+    # 与 pandas rolling(5) 一致：窗口内含 NaN 时不可用
+    assert ready == [t >= 4 and not 7 <= t <= 11 for t in range(20)]
+    assert stats.mean == np.mean(x[-5:])
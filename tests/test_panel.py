@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_data import merge_tvl_price, parse_dates
+from pntvl_panel import align_panel, panel_backtest, panel_performance
+from pntvl_strategy import StrategyPipeline
+from pntvl_synth import generate
+
+ASSETS = ('ETH', 'SOL', 'AVAX')
+PARAMS = dict(window=40, z_threshold=1.1, fee_rate=0.0005, slippage_rate=0.0002)
+
+
+@pytest.fixture(scope='module')
+def frames():
+    out = {}
+    for asset, (tvl, kline) in generate(600, assets=ASSETS, seed=3).items():
+        price = pd.DataFrame({'date': parse_dates(kline['datetime']), 'eth_price': kline['close']})
+        out[asset] = merge_tvl_price(tvl.assign(date=parse_dates(tvl['date'])), price)
+    return out
+
+
+def test_panel_matches_per_asset(frames):
+    tvl = np.column_stack([frames[a]['tvl_usd'] for a in ASSETS])
+    price = np.column_stack([frames[a]['eth_price'] for a in ASSETS])
+    result = panel_backtest(tvl, price, **PARAMS)
+    table = panel_performance(frames['ETH']['date'], list(ASSETS), result)
+
+    for j, asset in enumerate(ASSETS):
+        pipeline = StrategyPipeline(frames[asset])
+        ex = pipeline.execution(**PARAMS)
+        np.testing.assert_allclose(result['divergence_z'][:, j],
+                                   pipeline.zscore(PARAMS['window'])['divergence_z'],
+                                   rtol=1e-8, atol=1e-10, equal_nan=True)
+        np.testing.assert_array_equal(result['position'][:, j], ex['position'])
+        np.testing.assert_allclose(result['equity_curve'][:, j], ex['equity_curve'], rtol=1e-12)
+
+        metrics = pipeline.metrics(trade_rule='ledger', **PARAMS)
+        row = table.loc[asset]
+        assert row['Sharpe Ratio'] == pytest.approx(metrics['sharpe_ratio'], rel=1e-9)
+        assert row['Max Drawdown'] == pytest.approx(metrics['max_drawdown'], rel=1e-12)
+        assert row['Trade Count'] == metrics['trade_count']
+        assert row['Win Rate'] == pytest.approx(metrics['win_rate'], rel=1e-12)
+
+
+def _check_per_asset(dates, tvl, price, frames):
+    result = panel_backtest(tvl, price, **PARAMS)
+    table = panel_performance(dates, list(ASSETS), result)
+    for j, asset in enumerate(ASSETS):
+        rows = result['present'][:, j]
+        assert rows.sum() == len(frames[asset])
+        pipeline = StrategyPipeline(frames[asset])
+        ex = pipeline.execution(**PARAMS)
+        np.testing.assert_allclose(result['divergence_z'][rows, j],
+                                   pipeline.zscore(PARAMS['window'])['divergence_z'],
+                                   rtol=1e-8, atol=1e-10, equal_nan=True)
+        np.testing.assert_array_equal(result['position'][rows, j], ex['position'])
+        np.testing.assert_allclose(result['equity_curve'][rows, j], ex['equity_curve'],
+                                   rtol=1e-12)
+
+        metrics = pipeline.metrics(trade_rule='ledger', **PARAMS)
+        row = table.loc[asset]
+        for label, name in [('Annual Return', 'annual_return'), ('Sharpe Ratio', 'sharpe_ratio'),
+                            ('Max Drawdown', 'max_drawdown'), ('Win Rate', 'win_rate')]:
+            assert row[label] == pytest.approx(metrics[name], rel=1e-9), (asset, label)
+        assert row['Trade Count'] == metrics['trade_count']
+
+
+def test_outer_aligned_dates_follow_each_assets_own_bars(frames):
+    # 每个资产缺不同的日期，SOL 晚 100 天上线：并集上会出现大量 NaN 格
+    rng = np.random.default_rng(11)
+    ragged = {}
+    for asset, frame in frames.items():
+        keep = rng.random(len(frame)) >= 0.05
+        if asset == 'SOL':
+            keep[:100] = False
+        ragged[asset] = frame[keep].reset_index(drop=True)
+    dates, assets, tvl, price = align_panel(ragged)
+    assert assets == list(ASSETS)
+    assert np.isnan(tvl).any(axis=1).sum() > 100
+    _check_per_asset(dates, tvl, price, ragged)
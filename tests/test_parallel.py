@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_parallel import heatmap_at, parallel_sweep
+from pntvl_strategy import StrategyPipeline
+from pntvl_sweep import sweep_heatmap
+
+WINDOWS = [30, 75]
+Z_VALUES = np.array([0.8, 1.1, 1.6])
+
+
+@pytest.fixture(scope='module')
+def df_base(merged):
+    return pd.DataFrame({**StrategyPipeline(merged).features(),
+                         'eth_price': merged['eth_price'].to_numpy()})
+
+
+def test_default_grid_equals_serial_sweep(df_base):
+    heatmap = parallel_sweep(df_base, WINDOWS, Z_VALUES, max_workers=2)
+    assert heatmap.index.names == ['cost_rate', 'max_position', 'ma_window', 'dd_threshold',
+                                   'window']
+    pd.testing.assert_frame_equal(heatmap_at(heatmap), sweep_heatmap(df_base, WINDOWS, Z_VALUES),
+                                  check_exact=True)
+
+
+def test_capital_cells_match_pipeline(merged, df_base):
+    # Level 5（回撤减仓）与 Level 6（MA regime）的格点：与 StrategyPipeline 逐个回测的 Sharpe 一致
+    heatmap = parallel_sweep(df_base, WINDOWS, Z_VALUES, cost_rates=(0.0007,),
+                             max_positions=(0.3,), ma_windows=(None, 200),
+                             dd_thresholds=(None, 0.15), max_workers=2, mode='capital')
+    pipeline = StrategyPipeline(merged)
+    for ma_window, dd_threshold in [(None, 0.15), (200, None)]:
+        cells = heatmap_at(heatmap, cost_rate=0.0007, max_position=0.3, ma_window=ma_window,
+                           dd_threshold=dd_threshold)
+        for window in WINDOWS:
+            for z in Z_VALUES:
+                params = dict(window=window, z_threshold=z, max_position=0.3, fee_rate=0.0007,
+                              mode='capital', dd_threshold=dd_threshold)
+                if ma_window:
+                    params['ma_window'] = ma_window
+                expected = pipeline.metrics(**params)['sharpe_ratio']
+                assert cells.loc[window, z] == pytest.approx(expected, rel=1e-9), \
+                    (ma_window, dd_threshold, window, z)
+
+
+def test_heatmap_at_missing_combination(df_base):
+    heatmap = parallel_sweep(df_base, WINDOWS, Z_VALUES, max_workers=1)
+    with pytest.raises(KeyError):
+        heatmap_at(heatmap, cost_rate=0.001)
+    with pytest.raises(ValueError):
+        parallel_sweep(df_base, WINDOWS, Z_VALUES, mode='ledger')
@@ -0,0 +1,27 @@
+import importlib
+
+import numpy as np
+import pytest
+
+import pntvl_plot
+from pntvl_plot import decimate, plots_enabled
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_keeps_extremes(method):
+    rng = np.random.default_rng(0)
+    x = np.arange('2020-01-01', '2020-06-01', dtype='datetime64[m]')[:200_000]
+    y = np.cumsum(rng.standard_normal(len(x)))
+    dx, dy = decimate(x, y, max_points=2000, method=method)
+    assert len(dx) <= 2000
+    assert dx[0] == x[0] and dx[-1] == x[-1]
+    if method == 'minmax':
+        assert dy.min() == y.min() and dy.max() == y.max()
+
+
+def test_headless_by_default(monkeypatch):
+    monkeypatch.delenv('PNTVL_PLOT', raising=False)
+    # 默认只写 HTML 文件，批量运行不会打开浏览器
+    assert importlib.reload(pntvl_plot).PLOT_MODE == 'html'
+    assert not plots_enabled('none')
+    assert pntvl_plot.render(object(), 'unused', mode='none') is None
@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pntvl_robust
+from pntvl_online import replay
+from pntvl_robust import (MAD_SCALE, RollingMedianMAD, robust_zscore, robust_zscore_matrix,
+                          rolling_median_mad)
+
+
+def _pandas_median_mad(x, window):
+    s = pd.Series(x)
+    median = s.rolling(window).median()
+    mad = s.rolling(window).apply(lambda w: np.median(np.abs(w - np.median(w))), raw=True)
+    return median.to_numpy(), mad.to_numpy()
+
+
+def _series(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal(n)
+    x[::7] = 0.5   # 重复值
+    x[[30, 31, n // 2]] = np.nan
+    x[n * 5 // 8] = np.inf
+    return x
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 10, 75, 400])
+def test_rolling_median_mad_matches_pandas(window):
+    x = _series()
+    median, mad = rolling_median_mad(x, window)
+    exp_median, exp_mad = _pandas_median_mad(np.where(np.isfinite(x), x, np.nan), window)
+    np.testing.assert_array_equal(median, exp_median)
+    np.testing.assert_allclose(mad, exp_mad, rtol=1e-15, atol=0, equal_nan=True)
+
+
+@pytest.mark.parametrize('window', [1, 2, 5, 75])
+def test_kernel_with_boundscheck(window):
+    pytest.importorskip('numba')
+    # 有序窗口缓冲区只有 window 个元素，越界写入在关闭 boundscheck 时不会报错
+    kernel = pntvl_robust._jit(pntvl_robust._median_sorted, pntvl_robust._kth_deviation,
+                               pntvl_robust._mad_sorted, pntvl_robust._robust_loop,
+                               cache=False, boundscheck=True)['_robust_loop']
+    x = np.ascontiguousarray(np.where(np.isfinite(_series()), _series(), np.nan))
+    median = np.full(len(x), np.nan)
+    mad = np.full(len(x), np.nan)
+    kernel(x, window, median, mad)
+    exp_median, exp_mad = _pandas_median_mad(x, window)
+    np.testing.assert_array_equal(median, exp_median)
+    np.testing.assert_allclose(mad, exp_mad, rtol=1e-15, atol=0, equal_nan=True)
+
+
+@pytest.mark.parametrize('window', [1, 2, 3, 10, 75, 400])
+def test_tree_kernel_matches_sorted_window(window):
+    pytest.importorskip('numba')
+    # 大窗口走树状数组，小窗口走有序数组平移：同一窗口两条路径逐位一致
+    x = np.ascontiguousarray(np.where(np.isfinite(_series()), _series(), np.nan))
+    expected = [np.full(len(x), np.nan) for _ in range(2)]
+    got = [np.full(len(x), np.nan) for _ in range(2)]
+    pntvl_robust._robust_kernel(x, window, *expected)
+    pntvl_robust._robust_tree(x, window, *got)
+    np.testing.assert_array_equal(got[0], expected[0])
+    np.testing.assert_array_equal(got[1], expected[1])
+
+
+@pytest.mark.parametrize('offset', [0, 1])
+def test_large_window_matches_pandas(offset):
+    window = pntvl_robust.TREE_MIN_WINDOW + offset
+    x = _series(window + 300, seed=3)
+    x[x.size // 2] = np.nan
+    median, mad = rolling_median_mad(x, window)
+    exp_median, exp_mad = _pandas_median_mad(np.where(np.isfinite(x), x, np.nan), window)
+    np.testing.assert_array_equal(median, exp_median)
+    np.testing.assert_allclose(mad, exp_mad, rtol=1e-15, atol=0, equal_nan=True)
+
+
+def test_window_longer_than_series():
+    median, mad = rolling_median_mad(np.arange(5.0), 10)
+    assert np.isnan(median).all() and np.isnan(mad).all()
+
+
+def test_online_matches_batch():
+    x = _series(300, seed=1)
+    median, mad = rolling_median_mad(x, 20)
+    stats = RollingMedianMAD(20)
+    for t, v in enumerate(x):
+        stats.update(v)
+        assert stats.median == median[t] or math.isnan(median[t]) and math.isnan(stats.median)
+        assert stats.mad == mad[t] or math.isnan(mad[t]) and math.isnan(stats.mad)
+
+
+def test_robust_zscore_matrix_rows():
+    x = _series(200, seed=2)
+    m = robust_zscore_matrix(x, [5, 20])
+    np.testing.assert_array_equal(m[1], robust_zscore(x, 20))
+    median, mad = rolling_median_mad(x, 5)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np.testing.assert_array_equal(m[0], (x - median) / (MAD_SCALE * mad))
+
+
+def test_robust_pipeline_and_replay(merged):
+    from pntvl_strategy import StrategyPipeline
+
+    frame = StrategyPipeline(merged, robust=True).frame(window=75, z_threshold=1.1)
+    online = replay(merged, window=75, z_threshold=1.1, robust=True)
+    np.testing.assert_allclose(online['divergence_z'], frame['divergence_z'],
+                               rtol=1e-12, equal_nan=True)
+    np.testing.assert_array_equal(online['signal'], frame['signal'])
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from pntvl_rolling import rolling_mean_matrix, rolling_std_matrix, rolling_zscore_matrix
+
+WINDOWS = [2, 20, 75, 500]
+
+
+def _series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    # 大均值 + 小波动：朴素前缀和（以及 pandas 的滑动方差）在这里有明显的相消误差
+    x = 1e6 + rng.standard_normal(n)
+    x[[10, 11, n * 3 // 5]] = np.nan
+    return x
+
+
+def _two_pass(x, w):
+    # 逐窗口两遍法作为精确参照；窗口内有 NaN 时结果为 NaN（与 pandas min_periods 一致）。
+    # 减去 1e6 是精确的，参照本身不受大均值影响
+    x = x - 1e6
+    mean = np.full(len(x), np.nan)
+    std = np.full(len(x), np.nan)
+    for t in range(w - 1, len(x)):
+        win = x[t - w + 1:t + 1]
+        mean[t] = win.mean()
+        std[t] = win.std(ddof=1)
+    return mean, std
+
+
+def test_matrices_match_two_pass():
+    x = _series()
+    mean = rolling_mean_matrix(x, WINDOWS)
+    std = rolling_std_matrix(x, WINDOWS)
+    z = rolling_zscore_matrix(x, WINDOWS)
+    for i, w in enumerate(WINDOWS):
+        exp_mean, exp_std = _two_pass(x, w)
+        np.testing.assert_allclose(mean[i] - 1e6, exp_mean, atol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(std[i], exp_std, rtol=1e-10, equal_nan=True)
+        np.testing.assert_allclose(z[i], (x - 1e6 - exp_mean) / exp_std, rtol=1e-9, atol=1e-9,
+                                   equal_nan=True)
+
+
+@pytest.mark.parametrize('window', [1, 10])
+def test_window_rows_are_independent(window):
+    x = _series(200, seed=1)
+    np.testing.assert_array_equal(rolling_zscore_matrix(x, [window, 30])[0],
+                                  rolling_zscore_matrix(x, [window])[0])
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_data import span_days
+from test_strategy import BASELINE_METRICS, _reference_capital
+
+# 44d440c 的 Level 5 / 6 按初始资金做单利累加（daily_pnl 以 initial_capital 为基数），
+# 回撤风控只写回了 position 列、没有影响资金。下面按原公式由脚本的 signal 列重算，
+# 钉住信号路径；复利与风控规则由 _reference_capital 逐行对账。
+BASELINE_CAPITAL = {
+    5: {'annual_return': -0.1923533657472487, 'sharpe_ratio': -1.7244161326302936,
+        'calmar_ratio': -0.37593639214137814, 'max_drawdown': -0.5116646586183934},
+    6: {'annual_return': -0.04290942814158549, 'sharpe_ratio': -0.6934985766866815,
+        'calmar_ratio': -0.2766621908089853, 'max_drawdown': -0.15509682770932465},
+}
+BASELINE_TRADES = {5: {'win_rate': 0.22442244224422442, 'trade_count': 303},
+                   6: {'trade_count': 144}}
+
+
+def _baseline_additive(df, max_position=0.3, cost_rate=0.0007, initial_capital=100000.0):
+    """44d440c Level 5 / 6 第 6–9 节（逐行照抄，风控不回写资金）。"""
+    position = pd.Series(df['signal']).astype(float).shift(1).fillna(0) * max_position
+    turnover = (position - position.shift(1).fillna(0)).abs()
+    ret = pd.Series(df['eth_return'])
+    daily_pnl = initial_capital * position * ret - initial_capital * turnover * cost_rate
+    capital = (initial_capital + daily_pnl.cumsum()).fillna(initial_capital)
+    drawdown = capital / capital.cummax() - 1
+    annual_return = (capital.iloc[-1] / initial_capital) ** (365 / span_days(df['date'])) - 1
+    daily_return = capital.pct_change().dropna()
+    return {
+        'annual_return': annual_return,
+        'sharpe_ratio': daily_return.mean() / daily_return.std() * np.sqrt(365),
+        'calmar_ratio': annual_return / abs(drawdown.min()),
+        'max_drawdown': drawdown.min(),
+    }
+
+
+@pytest.mark.parametrize('level', [3, 4])
+def test_compound_levels_match_baseline(scripts, level):
+    g = scripts[level]
+    for name, value in BASELINE_METRICS[level].items():
+        assert g[name] == pytest.approx(value, rel=1e-9), name
+
+
+def test_level4_trades_use_ledger(scripts):
+    g = scripts[4]
+    assert g['trade_count'] == len(g['ledger'])
+    assert g['win_rate'] == pytest.approx((g['ledger']['pnl'] > 0).mean(), rel=1e-12)
+
+
+@pytest.mark.parametrize('level', [5, 6])
+def test_capital_levels_pin_baseline_signals(scripts, level):
+    g = scripts[level]
+    for name, value in _baseline_additive(g['df']).items():
+        assert value == pytest.approx(BASELINE_CAPITAL[level][name], rel=1e-9), name
+    for name, value in BASELINE_TRADES[level].items():
+        assert g[name] == pytest.approx(value, rel=1e-12), name
+
+
+@pytest.mark.parametrize('level', [5, 6])
+def test_capital_levels_match_reference(scripts, merged, level):
+    g = scripts[level]
+    capital = _reference_capital(merged, g['z_threshold'], g['max_position'],
+                                 g['fee_rate'] + g['slippage_rate'],
+                                 dd_threshold=g.get('dd_threshold'),
+                                 ma_window=g.get('ma_window'))
+    np.testing.assert_allclose(g['df']['capital'], capital, rtol=1e-12)
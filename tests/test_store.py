@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_store import CELL_BYTES, ResultStore, cached_sweep, data_hash, run_level
+from pntvl_strategy import LEVEL_PARAMS, StrategyPipeline
+from pntvl_sweep import sweep_heatmap
+
+
+@pytest.mark.parametrize('level', [4, 5])
+def test_cached_result_identical_to_fresh(merged, tmp_path, level):
+    store = ResultStore(str(tmp_path / 'results'))
+    fresh = run_level(merged, level, store=store)
+    cached = run_level(merged, level, store=store)
+    store.close()
+
+    assert cached is not fresh
+    assert cached['metrics'] == fresh['metrics']
+    for name in ('equity', 'ledger'):
+        # dtype 也必须一致（包括 entry_date / exit_date 的 datetime64[s]）
+        pd.testing.assert_frame_equal(cached[name], fresh[name], check_exact=True)
+    assert cached['ledger']['entry_date'].dtype == np.dtype('datetime64[s]')
+
+
+def test_lru_eviction(merged, tmp_path):
+    store = ResultStore(str(tmp_path / 'results'), max_entries=2)
+    for z in (1.0, 1.1, 1.2):
+        run_level(merged, 4, store=store, z_threshold=z)
+    assert store.stats()['runs'] == 2
+    # 最早写入的一条被淘汰
+    assert store.get(data_hash(merged), {**LEVEL_PARAMS[4], 'z_threshold': 1.0}) is None
+    assert store.get(data_hash(merged), {**LEVEL_PARAMS[4], 'z_threshold': 1.2}) is not None
+    store.close()
+
+
+def test_sweep_cells_counted_and_evicted(merged, tmp_path):
+    df_base = pd.DataFrame(StrategyPipeline(merged).features())
+    windows, zs = [30, 60], np.array([1.0, 1.5])
+    store = ResultStore(str(tmp_path / 'results'), max_entries=2)
+    heatmap = cached_sweep(df_base, windows, zs, store=store)
+    pd.testing.assert_frame_equal(heatmap, sweep_heatmap(df_base, windows, zs),
+                                  check_exact=True, check_column_type=False,
+                                  check_index_type=False)
+    assert store.stats() == {'runs': 1, 'bytes': 4 * CELL_BYTES, 'cells': 4}
+
+    # 两次新运行把最久未访问的 sweep 单元挤出去，cells 表随之清空
+    for z in (1.0, 1.1):
+        run_level(merged, 4, store=store, z_threshold=z)
+    assert store.stats()['cells'] == 0
+    assert store.get_cells(data_hash(df_base[['eth_return', 'pntvl_change',
+                                              'divergence_strength']]), 365) == {}
+    store.close()
+
+
+def test_sweep_cells_respect_max_bytes(merged, tmp_path):
+    df_base = pd.DataFrame(StrategyPipeline(merged).features())
+    store = ResultStore(str(tmp_path / 'results'), max_bytes=6 * CELL_BYTES)
+    cached_sweep(df_base, [30, 60], np.array([1.0, 1.5]), store=store)
+    assert store.stats()['cells'] == 4
+    cached_sweep(df_base, [30, 60, 90], np.array([1.0, 1.5, 2.0]), store=store)
+    assert store.stats()['cells'] == 0
+    store.close()
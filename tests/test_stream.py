@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_data import load_merged
+from pntvl_stream import backtest_in_memory, read_chunks, read_merged_chunks, stream_backtest
+
+PARAMS = dict(window=75, z_threshold=1.1, max_position=0.3, fee_rate=0.0005,
+              slippage_rate=0.0002, initial_capital=100000.0, dd_threshold=0.15)
+
+
+def _split(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+@pytest.mark.parametrize('size', [1, 74, 75, 300])
+def test_chunked_equals_in_memory(merged, size):
+    whole = backtest_in_memory(merged, **PARAMS)
+    frames = []
+    summary = stream_backtest(_split(merged, size), on_chunk=frames.append, **PARAMS)
+    chunked = pd.concat(frames, ignore_index=True)
+    # 分块方式不影响任何一位
+    pd.testing.assert_frame_equal(chunked, whole, check_exact=True)
+    assert summary['final_capital'] == whole['capital'].iloc[-1]
+    assert summary['bars'] == len(merged)
+
+
+def test_stream_matches_pipeline(pipeline, merged):
+    whole = backtest_in_memory(merged, **PARAMS)
+    # 补偿前缀和 vs pandas rolling：Z-score 只差舍入，NaN 位置、信号、仓位一致
+    np.testing.assert_allclose(whole['divergence_z'], pipeline.zscore(75)['divergence_z'],
+                               rtol=1e-12, atol=1e-13, equal_nan=True)
+    ex = pipeline.execution(window=75, z_threshold=1.1, max_position=0.3, fee_rate=0.0005,
+                            slippage_rate=0.0002, mode='capital', dd_threshold=0.15)
+    np.testing.assert_allclose(whole['capital'], ex['capital'], rtol=1e-12)
+    np.testing.assert_array_equal(whole['position'], ex['position'])
+
+
+def test_zscore_window_sums_across_chunks():
+    # 窗口跨越多个分块、NaN 落在分块边界上
+    rng = np.random.default_rng(5)
+    price = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 600)))
+    tvl = price * np.exp(np.cumsum(rng.normal(0, 0.01, 600))) * 1e6
+    df = pd.DataFrame({'date': pd.date_range('2022-01-01', periods=600), 'tvl_usd': tvl,
+                       'eth_price': price})
+    df.loc[[199, 200, 401], 'eth_price'] = np.nan
+    whole = backtest_in_memory(df, window=30)
+    for size in (7, 200):
+        frames = []
+        stream_backtest(_split(df, size), window=30, on_chunk=frames.append)
+        pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), whole,
+                                      check_exact=True)
+    div = whole['divergence_strength']
+    expected = (div - div.rolling(30).mean()) / div.rolling(30).std()
+    np.testing.assert_allclose(whole['divergence_z'], expected, rtol=1e-12, atol=1e-13,
+                               equal_nan=True)
+
+
+def test_stream_metrics_match_pipeline(pipeline, merged):
+    summary = stream_backtest(_split(merged, 200), **PARAMS)
+    expected = pipeline.metrics(window=75, z_threshold=1.1, max_position=0.3,
+                                fee_rate=0.0005, slippage_rate=0.0002, mode='capital',
+                                dd_threshold=0.15)
+    for name in ['annual_return', 'sharpe_ratio', 'max_drawdown', 'win_rate', 'trade_count']:
+        assert summary['metrics'][name] == pytest.approx(expected[name], rel=1e-9), name
+
+
+def test_csv_round_trip(merged, tmp_path):
+    path = str(tmp_path / 'merged.csv')
+    merged[['date', 'tvl_usd', 'eth_price']].to_csv(path, index=False)
+    out_path = str(tmp_path / 'out.csv')
+    summary = stream_backtest(read_chunks(path, chunksize=128), out_path=out_path, **PARAMS)
+    assert summary['final_capital'] == backtest_in_memory(merged, **PARAMS)['capital'].iloc[-1]
+    assert len(pd.read_csv(out_path)) == len(merged)
+
+
+@pytest.mark.parametrize('size', [1, 74, 300])
+def test_robust_chunked_matches_pipeline(merged, size):
+    from pntvl_strategy import StrategyPipeline
+
+    whole = backtest_in_memory(merged, robust=True, **PARAMS)
+    frames = []
+    stream_backtest(_split(merged, size), on_chunk=frames.append, robust=True, **PARAMS)
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), whole, check_exact=True)
+
+    ex = StrategyPipeline(merged, robust=True).execution(
+        window=75, z_threshold=1.1, max_position=0.3, fee_rate=0.0005,
+        slippage_rate=0.0002, mode='capital', dd_threshold=0.15)
+    np.testing.assert_array_equal(whole['position'], ex['position'])
+    np.testing.assert_allclose(whole['capital'], ex['capital'], rtol=1e-9)
+
+
+@pytest.mark.parametrize('chunksize', [7, 97, 5000])
+@pytest.mark.parametrize('kwargs', [
+    {},
+    dict(start='2022-06-15', end='2024-02-01'),
+    dict(join='asof', tvl_lag=pd.Timedelta(days=1), start='2023-05-01', end='2023-06-01'),
+])
+def test_merged_chunks_match_load_merged(synth_paths, chunksize, kwargs):
+    expected = load_merged(*synth_paths, use_cache=False, source='csv', **kwargs)
+    got = pd.concat(read_merged_chunks(*synth_paths, chunksize=chunksize, **kwargs),
+                    ignore_index=True)
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(start='2022-06-15', end='2024-02-01'),
+    dict(join='asof', tvl_lag=pd.Timedelta(days=1), start='2023-05-01', end='2023-06-01'),
+])
+def test_market_chunks_match_load_merged(store, synth_paths, kwargs):
+    expected = load_merged(*synth_paths, use_cache=False, source='csv', **kwargs)
+    chunks = list(read_merged_chunks(*synth_paths, chunksize=10, source='market', **kwargs))
+    assert len(chunks) > 1
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected,
+                                  check_exact=True)
+
+
+def test_stream_from_csv_matches_level5(scripts, synth_paths):
+    g = scripts[5]
+    frames = []
+    summary = stream_backtest(read_merged_chunks(*synth_paths, chunksize=100),
+                              on_chunk=frames.append, window=g['window'],
+                              z_threshold=g['z_threshold'], max_position=g['max_position'],
+                              fee_rate=g['fee_rate'], slippage_rate=g['slippage_rate'],
+                              initial_capital=g['initial_capital'],
+                              dd_threshold=g['dd_threshold'], dd_scale=g['dd_scale'])
+    out = pd.concat(frames, ignore_index=True)
+    np.testing.assert_array_equal(out['date'], g['df']['date'])
+    np.testing.assert_array_equal(out['position'], g['df']['position'])
+    np.testing.assert_allclose(out['capital'], g['df']['capital'], rtol=1e-12)
+    for name in ['annual_return', 'sharpe_ratio', 'max_drawdown', 'win_rate', 'trade_count']:
+        assert summary['metrics'][name] == pytest.approx(g[name], rel=1e-9), name
+
+
+def test_stream_from_csv_matches_level4(scripts, synth_paths):
+    # Level 4：满仓复利、无风控，资金 = 净值
+    g = scripts[4]
+    frames = []
+    stream_backtest(read_merged_chunks(*synth_paths, chunksize=100), on_chunk=frames.append,
+                    window=g['window'], z_threshold=g['z_threshold'], fee_rate=g['fee_rate'],
+                    slippage_rate=g['slippage_rate'])
+    out = pd.concat(frames, ignore_index=True)
+    np.testing.assert_array_equal(out['position'], g['df']['position'])
+    np.testing.assert_allclose(out['equity_curve'], g['df']['equity_curve'], rtol=1e-12)
+    np.testing.assert_allclose(out['drawdown'], g['df']['drawdown'], rtol=1e-9, atol=1e-15)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from pntvl_sweep import sweep_heatmap
+
+WINDOWS = [30, 75, 120]
+Z_VALUES = np.arange(0.6, 3.0, 0.4)
+
+
+def _loop_heatmap(df_base, window_values, z_values):
+    """44d440c 的 Level 3 Optimization 双重循环（逐个 window / z 用 pandas 重算）。"""
+    heatmap = pd.DataFrame(index=window_values, columns=z_values, dtype=float)
+    for window in window_values:
+        div = df_base['divergence_strength']
+        z_score = (div - div.rolling(window).mean()) / div.rolling(window).std()
+        for z in z_values:
+            signal = pd.Series(0, index=df_base.index)
+            signal[(df_base['eth_return'] < 0) & (df_base['pntvl_change'] > 0)
+                   & (z_score < -z)] = 1
+            signal[(df_base['eth_return'] > 0) & (df_base['pntvl_change'] < 0)
+                   & (z_score > z)] = -1
+            position = signal.shift(1).fillna(0)
+            strategy_return = (position * df_base['eth_return']).fillna(0)
+            if strategy_return.std() == 0:
+                heatmap.loc[window, z] = np.nan
+            else:
+                heatmap.loc[window, z] = (strategy_return.mean() / strategy_return.std()
+                                          * np.sqrt(365))
+    return heatmap
+
+
+def test_sweep_matches_loop(pipeline):
+    df_base = pd.DataFrame(pipeline.features())
+    expected = _loop_heatmap(df_base, WINDOWS, Z_VALUES)
+    got = sweep_heatmap(df_base, WINDOWS, Z_VALUES)
+    np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), rtol=1e-12,
+                               equal_nan=True)
+    assert list(got.index) == WINDOWS
+    np.testing.assert_array_equal(got.columns, Z_VALUES)
+
+
+def test_constant_returns_give_nan():
+    # 阈值高到从不开仓：收益恒为 0，Sharpe 为 NaN
+    rng = np.random.default_rng(0)
+    df_base = pd.DataFrame({'eth_return': rng.normal(0, 0.02, 300),
+                            'pntvl_change': rng.normal(0, 0.02, 300)})
+    df_base['divergence_strength'] = df_base['eth_return'] - df_base['pntvl_change']
+    assert np.isnan(sweep_heatmap(df_base, [30], [50.0]).iloc[0, 0])
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pntvl_strategy import StrategyPipeline
+from pntvl_walkforward import make_folds, walk_forward
+
+WINDOWS = [20, 40]
+Z_VALUES = np.array([0.8, 1.2, 1.6])
+PARAMS = dict(train_size=200, test_size=60, max_position=0.5, fee_rate=0.0005,
+              slippage_rate=0.0002)
+
+
+@pytest.fixture(scope='module')
+def df_base(merged):
+    return pd.DataFrame({'date': merged['date'], **StrategyPipeline(merged).features()})
+
+
+def test_fold_boundaries():
+    np.testing.assert_array_equal(make_folds(10, 4, 2),
+                                  [[0, 4, 4, 6], [2, 6, 6, 8], [4, 8, 8, 10]])
+    np.testing.assert_array_equal(make_folds(10, 4, 2, anchored=True),
+                                  [[0, 4, 4, 6], [0, 6, 6, 8], [0, 8, 8, 10]])
+    np.testing.assert_array_equal(make_folds(9, 4, 2, step=1)[[0, -1]],
+                                  [[0, 4, 4, 6], [3, 7, 7, 9]])
+    assert make_folds(5, 4, 2).shape == (0, 4)
+
+
+def test_step_larger_than_test_size_rejected(df_base):
+    with pytest.raises(ValueError, match='step'):
+        walk_forward(df_base, WINDOWS, Z_VALUES, step=90, **PARAMS)
+
+
+def _cell_positions(df_base, window, z, max_position):
+    div = df_base['divergence_strength']
+    z_score = (div - div.rolling(window).mean()) / div.rolling(window).std()
+    signal = pd.Series(0.0, index=df_base.index)
+    signal[(df_base['eth_return'] < 0) & (df_base['pntvl_change'] > 0) & (z_score < -z)] = 1
+    signal[(df_base['eth_return'] > 0) & (df_base['pntvl_change'] < 0) & (z_score > z)] = -1
+    return (signal.shift(1).fillna(0) * max_position).to_numpy()
+
+
+@pytest.mark.parametrize('step, anchored', [(None, False), (None, True), (30, False)])
+def test_matches_per_fold_loop(df_base, step, anchored):
+    result = walk_forward(df_base, WINDOWS, Z_VALUES, step=step, anchored=anchored, **PARAMS)
+    folds = make_folds(len(df_base), PARAMS['train_size'], PARAMS['test_size'], step, anchored)
+    cost = PARAMS['fee_rate'] + PARAMS['slippage_rate']
+    ret = df_base['eth_return'].fillna(0).to_numpy()
+
+    # 逐 fold、逐参数直接在训练切片上算 Sharpe
+    cells = [(w, z) for w in WINDOWS for z in Z_VALUES]
+    position = {c: _cell_positions(df_base, *c, PARAMS['max_position']) for c in cells}
+    returns = {c: p * ret - np.abs(np.diff(p, prepend=0.0)) * cost for c, p in position.items()}
+    for f, (a, b, c, d) in enumerate(folds):
+        train = [pd.Series(returns[cell][a:b]) for cell in cells]
+        sharpe = [r.mean() / r.std() * np.sqrt(365) if r.std() > 0 else np.nan for r in train]
+        row = result['folds'].iloc[f]
+        assert row['train_sharpe'] == pytest.approx(np.nanmax(sharpe), rel=1e-9)
+        assert row['train_start'] == df_base['date'].iloc[a]
+        assert row['test_end'] == df_base['date'].iloc[d - 1]
+        chosen = (row['window'], row['z_threshold'])
+        test = pd.Series(returns[chosen][c:d])
+        assert row['test_sharpe'] == pytest.approx(test.mean() / test.std() * np.sqrt(365),
+                                                   rel=1e-9)
+
+    # 拼接样本外收益：每根 bar 归最后覆盖它的 fold，换手相对上一根 bar 实际持有的仓位
+    owner = np.full(len(df_base), -1)
+    for f, (_, _, c, d) in enumerate(folds):
+        owner[c:d] = f
+    chosen = [(w, z) for w, z in zip(result['folds']['window'], result['folds']['z_threshold'])]
+    expected = []
+    for t in np.flatnonzero(owner >= 0):
+        pos = position[chosen[owner[t]]]
+        held = position[chosen[owner[t - 1]]][t - 1] if owner[t - 1] >= 0 else pos[t - 1]
+        expected.append(pos[t] * ret[t] - abs(pos[t] - held) * cost)
+
+    oos = result['oos_return']
+    np.testing.assert_array_equal(oos.index, df_base['date'].to_numpy()[owner >= 0])
+    np.testing.assert_allclose(oos.to_numpy(), expected, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(result['equity_curve'], np.cumprod(1 + np.array(expected)),
+                               rtol=1e-9)